@@ -0,0 +1,236 @@
+# app/analytics.py
+# วิเคราะห์แนวโน้มรายรับ/รายจ่าย (รวม และแยกตามแท็ก) จาก month_results + ยอดรวมรายเดือนของแต่ละแท็ก
+#
+# โหลดข้อมูลแบบ columnar ด้วย query เดียว แล้วคำนวณทุก series พร้อมกันด้วย NumPy (ไม่มี loop ต่อ user/เดือน):
+#   - ค่าเฉลี่ยเคลื่อนที่ 3/6/12 เดือน
+#   - การเปลี่ยนแปลงเทียบเดือนก่อน (month-over-month)
+#   - เดือนผิดปกติ: |z-score| เทียบ 12 เดือนก่อนหน้า > ANOMALY_Z (ต้องมีประวัติอย่างน้อย 3 เดือน)
+#   - คาดการณ์เดือนถัดไปด้วย linear regression ของ PROJECTION_MONTHS เดือนล่าสุด
+#
+# batch ทุก user (รันตอนกลางคืน):  python -m app.analytics --out trends.ndjson
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.money import SATANG_PER_BAHT
+
+WINDOWS = (3, 6, 12)
+ANOMALY_WINDOW = 12
+ANOMALY_MIN_HISTORY = 3
+ANOMALY_Z = 2.0
+PROJECTION_MONTHS = 6
+
+METRICS = ("income", "expense")
+
+# series ภาพรวม (tag_id = NULL) มาจาก month_results, series ต่อแท็กมาจาก tag_month_results
+_SERIES_SQL = '''
+    SELECT user_id, NULL::bigint AS tag_id, NULL::text AS tag, 'income' AS metric, year, month, income AS value
+    FROM "month_results" WHERE user_id BETWEEN :lo AND :hi
+    UNION ALL
+    SELECT user_id, NULL::bigint, NULL::text, 'expense', year, month, expense
+    FROM "month_results" WHERE user_id BETWEEN :lo AND :hi
+    UNION ALL
+    SELECT m.user_id, m.tag_id, tg.tag, tg.type, m.year, m.month, m.total
+    FROM "tag_month_results" m JOIN "tags" tg ON tg.id = m.tag_id
+    WHERE m.user_id BETWEEN :lo AND :hi AND m.tx_count > 0
+'''
+
+
+def load_columns(db: Session, lo: int, hi: int) -> dict[str, np.ndarray]:
+    """ดึงข้อมูลของ user_id ในช่วง [lo, hi] เป็น array ต่อคอลัมน์"""
+    rows = db.execute(text(_SERIES_SQL), {"lo": lo, "hi": hi}).fetchall()
+    if not rows:
+        return {}
+    user_id, tag_id, tag, metric, year, month, value = zip(*rows)
+    return {
+        "user_id": np.asarray(user_id, dtype=np.int64),
+        "tag_id": np.asarray([-1 if t is None else t for t in tag_id], dtype=np.int64),
+        "tag": np.asarray(tag, dtype=object),
+        "metric": np.asarray([METRICS.index(m) for m in metric], dtype=np.int8),
+        "month_idx": np.asarray(year, dtype=np.int64) * 12 + np.asarray(month, dtype=np.int64) - 1,
+        "value": np.asarray(value, dtype=np.float64) / SATANG_PER_BAHT,  # สตางค์ → บาท (ผลทุก series เป็นบาท)
+    }
+
+
+# ----------------- vectorized core -----------------
+def _window_sums(X: np.ndarray, w: int):
+    """ผลรวม, ผลรวมกำลังสอง และจำนวนค่าที่ valid ของหน้าต่างยาว w ที่จบที่แต่ละคอลัมน์"""
+    valid = ~np.isnan(X)
+    x0 = np.where(valid, X, 0.0)
+    pad = np.zeros((X.shape[0], 1))
+    c1 = np.concatenate([pad, np.cumsum(x0, axis=1)], axis=1)
+    c2 = np.concatenate([pad, np.cumsum(x0 * x0, axis=1)], axis=1)
+    cn = np.concatenate([pad, np.cumsum(valid, axis=1)], axis=1)
+    hi = np.arange(1, X.shape[1] + 1)
+    lo = np.maximum(hi - w, 0)
+    return c1[:, hi] - c1[:, lo], c2[:, hi] - c2[:, lo], cn[:, hi] - cn[:, lo]
+
+
+def _shift_right(A: np.ndarray) -> np.ndarray:
+    return np.concatenate([np.full((A.shape[0], 1), np.nan), A[:, :-1]], axis=1)
+
+
+def compute(cols: dict[str, np.ndarray]) -> dict:
+    """
+    คืน dict ของ array 2 มิติ (series × เดือน) + metadata ของแต่ละ series
+    ช่องก่อนเดือนแรกของ series เป็น NaN, เดือนที่ไม่มีรายการถือเป็น 0
+    """
+    keys = np.stack([cols["user_id"], cols["tag_id"], cols["metric"].astype(np.int64)], axis=1)
+    uniq, inv = np.unique(keys, axis=0, return_inverse=True)
+    inv = inv.reshape(-1)
+    start = int(cols["month_idx"].min())
+    end = int(cols["month_idx"].max())
+    col = cols["month_idx"] - start
+    S, M = len(uniq), end - start + 1
+
+    X = np.zeros((S, M))
+    np.add.at(X, (inv, col), cols["value"])
+    first = np.full(S, M, dtype=np.int64)
+    np.minimum.at(first, inv, col)
+    X[np.arange(M)[None, :] < first[:, None]] = np.nan
+
+    out: dict[str, np.ndarray] = {"value": X}
+    for w in WINDOWS:
+        s, _, n = _window_sums(X, w)
+        out[f"rolling_{w}"] = np.where(n == w, s / w, np.nan)
+
+    prev = _shift_right(X)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["mom_change"] = np.where(prev > 0, (X - prev) / prev, np.nan)
+
+        s, s2, n = (_shift_right(a) for a in _window_sums(X, ANOMALY_WINDOW))
+        mean = s / n
+        std = np.sqrt(np.maximum(s2 / n - mean * mean, 0.0))
+        z = np.where((n >= ANOMALY_MIN_HISTORY) & (std > 0), (X - mean) / std, np.nan)
+    out["zscore"] = z
+    out["anomaly"] = np.abs(np.nan_to_num(z)) > ANOMALY_Z
+
+    # linear regression ของ k เดือนล่าสุด (ข้ามช่อง NaN) → ค่าที่ตำแหน่ง k
+    k = min(PROJECTION_MONTHS, M)
+    Y = X[:, -k:]
+    valid = ~np.isnan(Y)
+    x = np.broadcast_to(np.arange(k, dtype=np.float64), Y.shape)
+    y0 = np.where(valid, Y, 0.0)
+    x0 = np.where(valid, x, 0.0)
+    n = valid.sum(axis=1)
+    sx, sy = x0.sum(axis=1), y0.sum(axis=1)
+    sxx, sxy = (x0 * x0).sum(axis=1), (x0 * y0).sum(axis=1)
+    denom = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denom > 0, (n * sxy - sx * sy) / denom, 0.0)
+        intercept = np.where(n > 0, (sy - slope * sx) / n, np.nan)
+    out["projection_next"] = np.maximum(intercept + slope * k, 0.0)
+
+    # metadata: ชื่อแท็กของแต่ละ series (แถวแรกที่เจอ)
+    first_row = np.full(S, len(inv), dtype=np.int64)
+    np.minimum.at(first_row, inv, np.arange(len(inv)))
+    return {
+        "start": start,
+        "months": M,
+        "first": first,
+        "user_id": uniq[:, 0],
+        "tag_id": uniq[:, 1],
+        "metric": uniq[:, 2],
+        "tag": cols["tag"][first_row],
+        "series": out,
+    }
+
+
+# ----------------- formatting -----------------
+def _month_label(idx: int) -> str:
+    return f"{idx // 12:04d}-{idx % 12 + 1:02d}"
+
+
+def _num(v) -> float | None:
+    return None if np.isnan(v) else round(float(v), 4)
+
+
+def series_to_dict(res: dict, i: int, last_months: int | None = None) -> dict:
+    ser = res["series"]
+    lo = int(res["first"][i])
+    if last_months:
+        lo = max(lo, res["months"] - last_months)
+    cols = range(lo, res["months"])
+    return {
+        "tag_id": None if res["tag_id"][i] < 0 else int(res["tag_id"][i]),
+        "tag": res["tag"][i],
+        "metric": METRICS[int(res["metric"][i])],
+        "months": [_month_label(res["start"] + c) for c in cols],
+        "value": [_num(ser["value"][i, c]) for c in cols],
+        **{f"rolling_{w}": [_num(ser[f"rolling_{w}"][i, c]) for c in cols] for w in WINDOWS},
+        "mom_change": [_num(ser["mom_change"][i, c]) for c in cols],
+        "anomaly_months": [_month_label(res["start"] + c) for c in cols if ser["anomaly"][i, c]],
+        "next_month": _month_label(res["start"] + res["months"]),
+        "projection_next": _num(ser["projection_next"][i]),
+    }
+
+
+def user_trends(db: Session, user_id: int, last_months: int | None = None) -> dict:
+    cols = load_columns(db, user_id, user_id)
+    if not cols:
+        return {"user_id": user_id, "overall": {}, "tags": []}
+    res = compute(cols)
+    overall, tags = {}, []
+    for i in range(len(res["user_id"])):
+        d = series_to_dict(res, i, last_months)
+        if d["tag_id"] is None:
+            overall[d.pop("metric")] = d
+            d.pop("tag_id"), d.pop("tag")
+        else:
+            tags.append(d)
+    return {"user_id": user_id, "overall": overall, "tags": tags}
+
+
+def batch_all_users(db: Session, chunk_users: int = 5000):
+    """
+    คำนวณทุก user ทีละช่วง user_id (คุมขนาด matrix) แล้ว yield สรุปต่อ series
+    (ค่าเดือนล่าสุด, rolling, mom, anomaly ของเดือนล่าสุด, projection)
+    """
+    bounds = db.execute(text('SELECT MIN(id), MAX(id) FROM "users"')).fetchone()
+    if not bounds or bounds[0] is None:
+        return
+    lo, top = int(bounds[0]), int(bounds[1])
+    while lo <= top:
+        hi = lo + chunk_users - 1
+        cols = load_columns(db, lo, hi)
+        if cols:
+            res = compute(cols)
+            ser = res["series"]
+            last = res["months"] - 1
+            for i in range(len(res["user_id"])):
+                yield {
+                    "user_id": int(res["user_id"][i]),
+                    "tag_id": None if res["tag_id"][i] < 0 else int(res["tag_id"][i]),
+                    "metric": METRICS[int(res["metric"][i])],
+                    "month": _month_label(res["start"] + last),
+                    "value": _num(ser["value"][i, last]),
+                    **{f"rolling_{w}": _num(ser[f"rolling_{w}"][i, last]) for w in WINDOWS},
+                    "mom_change": _num(ser["mom_change"][i, last]),
+                    "anomaly": bool(ser["anomaly"][i, last]),
+                    "projection_next": _num(ser["projection_next"][i]),
+                }
+        lo = hi + 1
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+    import time
+
+    from app.database import shards
+
+    p = argparse.ArgumentParser(description="nightly spending-trend batch for all users")
+    p.add_argument("--out", help="ไฟล์ NDJSON (ไม่ระบุ = stdout)")
+    p.add_argument("--chunk-users", type=int, default=5000)
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    n = 0
+    with (open(args.out, "w", encoding="utf-8") if args.out else sys.stdout) as fh:
+        for sh in shards:
+            with sh.ReadSession() as db:
+                for rec in batch_all_users(db, args.chunk_users):
+                    fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    n += 1
+    print(f"{n} series in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
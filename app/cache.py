@@ -0,0 +1,205 @@
+# app/cache.py
+# read-through cache ต่อ user ใน process (LRU + TTL) สำหรับ users / tags / month_results
+#
+# entry ถูกแยกตาม (user_id, scope) เพื่อให้ write handler ล้างเฉพาะส่วนที่เปลี่ยนได้
+#   scope "user"          → require_user
+#   scope "tags"          → read_tag
+#   scope "month_results" → read_month_result, read_month_results_by_year
+#   scope "tag_month_results" → read_tag_breakdown
+# การล้างทำผ่าน record_write(db, user_id, *scopes) หลัง commit สำเร็จ
+#
+# ถ้าตั้ง SHARED_CACHE_URL จะมี cache ชั้นที่ 2 ร่วมกันทุก worker (ดู app/shared_cache.py)
+#   อ่าน: cache ใน process → shared cache (ตามเวอร์ชันล่าสุด) → DB
+#   เขียน: เพิ่มเวอร์ชันใน shared cache + publish ให้ worker อื่นล้าง cache ใน process
+#         + marker read-your-writes ที่ทุก worker เห็น (get_read_db ของ worker อื่นก็อ่านจาก primary)
+#
+# WEB_CONCURRENCY > 1 แต่ไม่มี shared cache ข้าม process (ไม่ตั้ง หรือเป็น memory://):
+#   การล้าง cache เกิดแค่ใน worker ที่เขียน → worker อื่นเสิร์ฟ tags / month_results / require_user เก่า
+#   ได้นานเท่า TTL → ปิด cache ใน process (และ memory://) แล้ว log เตือนตอนเริ่ม
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app import config
+from app.database import add_recent_write_check, add_write_listener
+from app.shared_cache import SharedCache, InvalidationListener, connect
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._data: OrderedDict = OrderedDict()      # (uid, scope, key) -> (expires_at, value)
+        self._index: dict[tuple, set] = {}           # (uid, scope) -> {key, ...}
+        # (uid, scope) -> generation (กัน stale write-back) — LRU จำกัดขนาด; ค่ามาจาก _tick ที่เพิ่มอย่างเดียว
+        # ตัวที่ถูกทิ้งยก _floor ขึ้นแทน (ค่าเริ่มต้นของ key ที่ไม่มี) → load ที่ค้างอยู่ไม่มีทางเห็นเลขเดิมซ้ำ
+        self._gen: OrderedDict = OrderedDict()
+        self._tick = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get_or_load(self, user_id: int, scope: str, key, loader):
+        """คืนค่าจาก cache ถ้ามีและยังไม่หมดอายุ ไม่งั้นเรียก loader() แล้วเก็บไว้"""
+        if not self.enabled:
+            return loader()
+        full = (int(user_id), scope, key)
+        with self._lock:
+            hit = self._data.get(full)
+            if hit is not None:
+                if hit[0] > time.monotonic():
+                    self._data.move_to_end(full)
+                    self.hits += 1
+                    return hit[1]
+                self._remove(full)
+                self.expirations += 1
+            self.misses += 1
+            gen = self._gen.get(full[:2], self._floor)
+
+        value = loader()
+
+        with self._lock:
+            # ถ้ามี write มาล้างระหว่างที่เราโหลด ค่าที่ได้อาจเก่าแล้ว → ไม่เก็บ
+            if self._gen.get(full[:2], self._floor) == gen:
+                self._data[full] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(full)
+                self._index.setdefault(full[:2], set()).add(key)
+                while len(self._data) > self.maxsize:
+                    oldest = next(iter(self._data))
+                    self._remove(oldest)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, user_id: int, scopes):
+        with self._lock:
+            for scope in scopes:
+                us = (int(user_id), scope)
+                self._tick += 1
+                self._gen[us] = self._tick
+                self._gen.move_to_end(us)
+                for key in self._index.pop(us, ()):
+                    if self._data.pop((us[0], scope, key), None) is not None:
+                        self.invalidations += 1
+            while len(self._gen) > self.maxsize * 4:
+                _, g = self._gen.popitem(last=False)
+                self._floor = max(self._floor, g)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._index.clear()
+            self._gen.clear()
+            self._floor = self._tick
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, full: tuple):
+        self._data.pop(full, None)
+        keys = self._index.get(full[:2])
+        if keys is not None:
+            keys.discard(full[2])
+            if not keys:
+                del self._index[full[:2]]
+
+
+log = logging.getLogger(__name__)
+
+_SHARED_URL = config.SHARED_CACHE_URL
+_local_enabled = config.READ_CACHE_ENABLED
+if config.WEB_CONCURRENCY > 1 and (not _SHARED_URL or _SHARED_URL.startswith("memory://")):
+    if _SHARED_URL:
+        log.warning("SHARED_CACHE_URL=%s is per-process; ignored with WEB_CONCURRENCY=%d", _SHARED_URL,
+                    config.WEB_CONCURRENCY)
+        _SHARED_URL = None
+    if _local_enabled:
+        log.warning("read cache disabled: WEB_CONCURRENCY=%d without a shared cache (set SHARED_CACHE_URL=redis://...);"
+                    " read-your-writes only holds within the worker that wrote", config.WEB_CONCURRENCY)
+        _local_enabled = False
+
+read_cache = UserCache(config.READ_CACHE_MAXSIZE, config.READ_CACHE_TTL_SECONDS, _local_enabled)
+add_write_listener(read_cache.invalidate)
+
+shared_cache: SharedCache | None = None
+if _SHARED_URL:
+    shared_cache = SharedCache(connect(_SHARED_URL), config.SHARED_CACHE_TTL_SECONDS)
+
+# ใช้แยกข้อความ invalidation ที่ worker นี้ส่งเอง
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+WORKER_ID = _worker_id()
+
+def reset_after_fork():
+    global WORKER_ID
+    WORKER_ID = _worker_id()
+
+
+def cached(user_id: int, scope: str, key, loader):
+    """อ่านผ่าน cache ทุกชั้นที่เปิดอยู่"""
+    if shared_cache is None:
+        return read_cache.get_or_load(user_id, scope, key, loader)
+    return read_cache.get_or_load(
+        user_id, scope, key, lambda: shared_cache.get_or_load(user_id, scope, key, loader)
+    )
+
+
+def _bump_shared(user_id: int, scopes):
+    if shared_cache is None or not scopes:
+        return
+    shared_cache.bump(user_id, scopes, WORKER_ID)
+    # ล้างซ้ำหลังเพิ่มเวอร์ชัน: กัน request ที่แทรกเข้ามาระหว่างล้างรอบแรกกับ INCR แล้วเก็บค่าเวอร์ชันเก่า
+    read_cache.invalidate(user_id, scopes)
+
+add_write_listener(_bump_shared)
+
+
+def _mark_shared_write(user_id: int, scopes):
+    try:
+        shared_cache.mark_write(user_id, config.READ_YOUR_WRITES_SECONDS)
+    except Exception:
+        log.warning("shared read-your-writes marker failed", exc_info=True)
+
+if shared_cache is not None:
+    add_write_listener(_mark_shared_write)
+    add_recent_write_check(shared_cache.wrote_recently)
+
+
+_listener: InvalidationListener | None = None
+
+def start():
+    global _listener
+    if shared_cache is not None and _listener is None:
+        _listener = InvalidationListener(shared_cache.client, WORKER_ID, read_cache.invalidate)
+        _listener.start()
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats() -> dict:
+    return {
+        "local": read_cache.stats(),
+        "shared": shared_cache.stats() if shared_cache is not None else None,
+    }
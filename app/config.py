@@ -0,0 +1,110 @@
+# app/config.py
+# โหลด .env ครั้งเดียวที่นี่ แล้วโมดูลอื่น import ค่าจากไฟล์นี้
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+# ----------------- Database -----------------
+DATABASE_URL = os.getenv("DATABASE_URL")  # ควรมาจาก Dashboard ตรง ๆ
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")  # read replica (ไม่บังคับ)
+# จำนวน web worker process (app.serve / gunicorn.conf.py)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# connection รวมทุก web worker ที่ pooler ให้ได้ (0 = ไม่แบ่ง ใช้ DB_POOL_SIZE ต่อ worker)
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+
+def _pool_size() -> int:
+    if os.getenv("DB_POOL_SIZE"):
+        return int(os.getenv("DB_POOL_SIZE"))
+    if DB_CONNECTION_BUDGET:
+        return max(1, DB_CONNECTION_BUDGET // WEB_CONCURRENCY)
+    return 2
+
+DB_POOL_SIZE = _pool_size()  # ต่อ process; อย่าตั้งใหญ่ ถ้าใช้ pooler
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+# หลัง user เขียนข้อมูล ให้อ่านจาก primary ต่ออีกกี่วินาที (กัน replica lag)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# เปิด connection ให้ครบ pool ก่อนรับ request แรก
+DB_WARMUP = _bool("DB_WARMUP", "true")
+
+# ----------------- Shards -----------------
+# shard 0 = DATABASE_URL (+ DATABASE_READ_URL); shard 1.. = DATABASE_SHARD_URLS (คั่นด้วย ,)
+# ไม่ตั้ง = ฐานข้อมูลเดียวเหมือนเดิม; แต่ละ shard มี engine / pool ของตัวเอง (ขนาด DB_POOL_SIZE)
+DATABASE_SHARD_URLS = [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+# replica ของ shard 1.. เรียงตาม DATABASE_SHARD_URLS (ช่องว่าง = อ่านจาก primary ของ shard นั้น)
+DATABASE_SHARD_READ_URLS = [u.strip() for u in os.getenv("DATABASE_SHARD_READ_URLS", "").split(",")]
+# ตาราง user_shards (ผู้ใช้ที่ถูกย้าย shard) ถูกโหลดใหม่ทุกกี่วินาที
+SHARD_MAP_REFRESH_SECONDS = float(os.getenv("SHARD_MAP_REFRESH_SECONDS", "5"))
+
+# ----------------- Group commit (POST /transactions/add/) -----------------
+# รวมรายการที่เข้ามาพร้อมกันเป็นก้อนเดียว → INSERT หลายแถว + commit ครั้งเดียว (ดู app/group_commit.py)
+GROUP_COMMIT = _bool("GROUP_COMMIT", "false")
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))     # รอรวมรายการนานสุดกี่ ms (latency ที่เพิ่ม)
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))      # ครบเท่านี้เขียนทันทีไม่ต้องรอ
+GROUP_COMMIT_TIMEOUT_SECONDS = float(os.getenv("GROUP_COMMIT_TIMEOUT_SECONDS", "30"))
+
+# ----------------- Auth -----------------
+SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-prod")  # ใส่ env จริงในโปรดักชัน
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# user id ที่เรียก endpoint ของผู้ดูแลได้ (คั่นด้วย ,) เช่น ADMIN_USER_IDS=1,2
+ADMIN_USER_IDS = {int(x) for x in os.getenv("ADMIN_USER_IDS", "").split(",") if x.strip()}
+# POST /users/bulk/: จำนวน user สูงสุดต่อ request และจำนวน process ที่ใช้ hash รหัสผ่าน
+BULK_PROVISION_MAX = int(os.getenv("BULK_PROVISION_MAX", "1000"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+
+# ----------------- OCR -----------------
+OCR_SPACE_API_KEY = os.getenv("OCR_SPACE_API_KEY")
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))  # เกิน → 413 ระหว่างรับข้อมูล
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))  # ไฟล์ใหญ่กว่านี้พักลงดิสก์แทนหน่วยความจำ
+
+# ----------------- Events (SSE) -----------------
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "local")  # local | postgres (LISTEN/NOTIFY ข้าม worker)
+EVENTS_LISTEN_URL = os.getenv("EVENTS_LISTEN_URL") or DATABASE_URL  # ต้องเป็น direct/session URL
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# ----------------- Read cache -----------------
+READ_CACHE_ENABLED = _bool("READ_CACHE_ENABLED", "true")  # ปิดได้ตอน debug
+READ_CACHE_MAXSIZE = int(os.getenv("READ_CACHE_MAXSIZE", "10000"))  # จำนวน entry สูงสุด (LRU)
+READ_CACHE_TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", "60"))
+
+# ----------------- Shared cache (ข้าม worker) -----------------
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL")  # ไม่ตั้ง = ปิด; memory://name หรือ redis://host:port
+SHARED_CACHE_TTL_SECONDS = float(os.getenv("SHARED_CACHE_TTL_SECONDS", "300"))
+
+# ----------------- Recurring transactions -----------------
+RECURRING_SCHEDULER_ENABLED = _bool("RECURRING_SCHEDULER_ENABLED", "true")
+RECURRING_INTERVAL_SECONDS = float(os.getenv("RECURRING_INTERVAL_SECONDS", "300"))
+RECURRING_BATCH_SIZE = int(os.getenv("RECURRING_BATCH_SIZE", "500"))  # จำนวน template ต่อ batch
+
+# ----------------- Background jobs (app.worker) -----------------
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))            # ไม่มีงาน → รอเท่านี้แล้วค่อยถามใหม่
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "10"))  # backoff = base * 2^(attempt-1)
+JOBS_RETRY_MAX_SECONDS = float(os.getenv("JOBS_RETRY_MAX_SECONDS", "600"))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))        # running นานกว่านี้ถือว่า worker ตาย → หยิบใหม่
+
+# ----------------- Account deletion (job "account.delete") -----------------
+ACCOUNT_DELETE_CHUNK = int(os.getenv("ACCOUNT_DELETE_CHUNK", "2000"))                # แถวต่อ DELETE (commit ทุก chunk)
+ACCOUNT_DELETE_PAUSE_SECONDS = float(os.getenv("ACCOUNT_DELETE_PAUSE_SECONDS", "0.05"))  # พักระหว่าง chunk (กระจาย WAL)
+ACCOUNT_DELETE_MAX_LAG_SECONDS = float(os.getenv("ACCOUNT_DELETE_MAX_LAG_SECONDS", "10"))  # replica ตามไม่ทัน → รอ
+ACCOUNT_DELETE_MAX_ACTIVE = int(os.getenv("ACCOUNT_DELETE_MAX_ACTIVE", "0"))        # query ที่ active เกินนี้ → รอ (0 = ไม่ดู)
+
+# ----------------- Profiler (ต่อ request; ดู app/profiler.py) -----------------
+# เปิดแล้ว request ที่ส่ง header X-Profile: file|inline (หรือ ?__profile=file|inline) จะถูก sample
+# เฉพาะผู้ดูแล (token ของ ADMIN_USER_IDS) หรือส่ง X-Profile-Token ตรงกับ PROFILER_TOKEN; ปิด = ไม่มี overhead
+PROFILER_ENABLED = _bool("PROFILER_ENABLED", "false")
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "1"))
+PROFILER_DIR = os.getenv("PROFILER_DIR", "profiles")   # ที่เก็บไฟล์ .speedscope.json (โหมด file)
+
+# ----------------- Serving (python -m app.serve) -----------------
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))  # วินาทีที่รอ request ค้างตอน reload/stop
+WEB_PRELOAD = _bool("WEB_PRELOAD", "false")  # import แอปใน master ก่อน fork (เร็วขึ้น แต่ HUP จะไม่โหลดโค้ดใหม่)
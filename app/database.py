@@ -1,24 +1,341 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")  # ควรมาจาก Dashboard ตรง ๆ
-
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,        # เช็ค connection ตายแล้วรีไซเคิล
-    pool_size=2,               # อย่าตั้งใหญ่ ถ้าใช้ pooler
-    max_overflow=0,            # กันล้นเกิน quota ของ pooler
-    pool_recycle=300,          # รีไซเคิลบ้างกัน connection ค้าง
-    connect_args={"sslmode": "require"}  # บังคับ SSL
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker, Session
+from fastapi import HTTPException, Request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import itertools
+import time
+import logging
+import threading
+
+from app.config import (
+    DATABASE_URL, DATABASE_READ_URL, DB_POOL_SIZE, DB_SSLMODE, READ_YOUR_WRITES_SECONDS,
+    DATABASE_SHARD_URLS, DATABASE_SHARD_READ_URLS, SHARD_MAP_REFRESH_SECONDS,
 )
+from app.security import decode_token
+
+log = logging.getLogger(__name__)
+
+
+def _make_engine(url: str):
+    return create_engine(
+        url,
+        pool_pre_ping=True,        # เช็ค connection ตายแล้วรีไซเคิล
+        pool_size=DB_POOL_SIZE,    # อย่าตั้งใหญ่ ถ้าใช้ pooler
+        max_overflow=0,            # กันล้นเกิน quota ของ pooler
+        pool_recycle=300,          # รีไซเคิลบ้างกัน connection ค้าง
+        connect_args={"sslmode": DB_SSLMODE}  # บังคับ SSL
+    )
+
+
+engine = _make_engine(DATABASE_URL)
+# ถ้าไม่ได้ตั้ง DATABASE_READ_URL ก็ใช้ engine เดียวกัน (พฤติกรรมเดิม)
+read_engine = _make_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+
+
+# ----------------- shards -----------------
+# ข้อมูลของ user ทั้งหมด (users, tags, transactions, ...) อยู่ใน shard เดียวกัน
+#   shard ของ user = user_shards.shard ถ้ามี (ถูกย้ายด้วย python -m app.shards move) ไม่งั้น user_id % จำนวน shard
+# ตาราง user_shards อยู่ที่ shard 0 และถูก cache ไว้ต่อ process (โหลดส่วนที่เปลี่ยนทุก SHARD_MAP_REFRESH_SECONDS)
+class Shard:
+    def __init__(self, index: int, engine, read_engine, session=None, read_session=None):
+        self.index = index
+        self.engine = engine
+        self.read_engine = read_engine
+        self.Session = session or sessionmaker(bind=engine, autocommit=False, autoflush=False)
+        self.ReadSession = read_session or sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+
+
+def _make_shards() -> list[Shard]:
+    out = [Shard(0, engine, read_engine, SessionLocal, ReadSessionLocal)]
+    for i, url in enumerate(DATABASE_SHARD_URLS, start=1):
+        eng = _make_engine(url)
+        read_url = DATABASE_SHARD_READ_URLS[i - 1] if i - 1 < len(DATABASE_SHARD_READ_URLS) else ""
+        out.append(Shard(i, eng, _make_engine(read_url) if read_url else eng))
+    return out
+
+
+shards: list[Shard] = _make_shards()
+
+
+class ShardMoving(Exception):
+    """ข้อมูลของ user กำลังถูกย้าย shard (ชั่วคราว)"""
+
+
+_overrides: dict[int, tuple[int, bool]] = {}   # user_id -> (shard, moving)
+_overrides_seen: datetime | None = None         # updated_at ล่าสุดที่โหลดแล้ว
+_overrides_at = float("-inf")
+_overrides_lock = threading.Lock()
+
+
+def refresh_shard_map(force: bool = False):
+    global _overrides_seen, _overrides_at
+    if len(shards) == 1:
+        return
+    if not force and time.monotonic() - _overrides_at < SHARD_MAP_REFRESH_SECONDS:
+        return
+    with _overrides_lock:
+        if not force and time.monotonic() - _overrides_at < SHARD_MAP_REFRESH_SECONDS:
+            return
+        _overrides_at = time.monotonic()
+        try:
+            with shards[0].Session() as db:
+                rows = db.execute(
+                    text('SELECT user_id, shard, moving, updated_at FROM "user_shards" '
+                         'WHERE CAST(:since AS timestamptz) IS NULL OR updated_at >= :since'),
+                    {"since": _overrides_seen}
+                ).fetchall()
+        except Exception:
+            log.exception("loading user_shards failed; keeping the previous shard map")
+            return
+        for r in rows:
+            _overrides[r.user_id] = (r.shard, r.moving)
+            if _overrides_seen is None or r.updated_at > _overrides_seen:
+                _overrides_seen = r.updated_at
+
+
+def shard_index(user_id) -> int:
+    """shard ของ user; กำลังย้ายอยู่ → ShardMoving"""
+    if len(shards) == 1 or user_id is None:
+        return 0
+    refresh_shard_map()
+    uid = int(user_id)
+    o = _overrides.get(uid)
+    if o is None:
+        return uid % len(shards)
+    if o[1]:
+        raise ShardMoving(uid)
+    return o[0]
+
+
+def frozen_users() -> list[int]:
+    """user ที่กำลังย้าย shard (งานเบื้องหลังต้องข้าม)"""
+    if len(shards) == 1:
+        return []
+    refresh_shard_map()
+    return [uid for uid, (_, moving) in _overrides.items() if moving]
+
+
+def session_for(user_id, read: bool = False) -> Session:
+    sh = shards[shard_index(user_id)]
+    return sh.ReadSession() if read else sh.Session()
+
+
+_new_user_rr = itertools.count()
+
+def pick_new_user_shard() -> int:
+    """shard ของ user ใหม่ (วนทีละ shard)"""
+    return next(_new_user_rr) % len(shards)
+
+
+def assign_new_users(shard: int, user_ids: list[int]):
+    """
+    ปกติ id ที่ shard k สร้างจะได้ id % จำนวน shard == k อยู่แล้ว (python -m app.shards init ตั้ง sequence ไว้)
+    ถ้าไม่ตรง (เช่น sequence ยังไม่ได้ตั้ง) → จดไว้ใน user_shards ก่อน commit user จริง
+    """
+    if len(shards) == 1:
+        return
+    off = [uid for uid in user_ids if uid % len(shards) != shard]
+    if not off:
+        return
+    log.warning("shard %d produced %d user ids outside its residue; run python -m app.shards init", shard, len(off))
+    with shards[0].Session() as db:
+        db.execute(
+            text('''
+                INSERT INTO "user_shards" (user_id, shard, updated_at)
+                SELECT u, :s, clock_timestamp() FROM unnest(CAST(:ids AS bigint[])) AS u
+                ON CONFLICT (user_id) DO UPDATE SET shard = EXCLUDED.shard, moving = false, updated_at = EXCLUDED.updated_at
+            '''),
+            {"s": shard, "ids": off}
+        )
+        db.commit()
+    for uid in off:
+        _overrides[uid] = (shard, False)
+
+
+def scatter(fn, read: bool = True, db: Session | None = None) -> list:
+    """
+    เรียก fn(session) บนทุก shard พร้อมกัน คืนผลเรียงตามลำดับ shard (ใช้กับ listing ของ admin / login / ตรวจซ้ำ)
+    db: session ที่ request ถืออยู่แล้ว → shard ของมันใช้ session นี้ (ไม่ยืม connection เพิ่มจาก pool เดียวกัน)
+    """
+    bind = db.get_bind() if db is not None else None
+
+    def run(sh: Shard):
+        if bind is not None and bind in (sh.engine, sh.read_engine):
+            return fn(db)
+        with (sh.ReadSession() if read else sh.Session()) as s:
+            return fn(s)
+
+    if len(shards) == 1:
+        return [run(shards[0])]
+    own = [sh for sh in shards if bind is not None and bind in (sh.engine, sh.read_engine)][:1]
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="scatter") as ex:
+        futures = {sh.index: ex.submit(run, sh) for sh in shards if sh not in own}
+        local = {sh.index: run(sh) for sh in own}  # session ของ request ใช้ใน thread นี้เท่านั้น
+        return [local[sh.index] if sh.index in local else futures[sh.index].result() for sh in shards]
+
+
+def _all_engines() -> list:
+    return list(dict.fromkeys(e for sh in shards for e in (sh.engine, sh.read_engine)))
+
+
+def warm_up_pool():
+    """
+    เปิด connection ให้ครบ pool_size ทั้ง primary และ replica (ทุก shard) ก่อนรับ request แรก
+    (ถือไว้พร้อมกันทั้งหมดเพื่อบังคับให้ pool สร้างใหม่ครบ แล้วค่อยคืน)
+    """
+    for eng in _all_engines():
+        conns = []
+        try:
+            for _ in range(eng.pool.size()):
+                conn = eng.connect()
+                conn.exec_driver_sql("SELECT 1")
+                conns.append(conn)
+        finally:
+            for conn in conns:
+                conn.close()
+
+def dispose_engines():
+    for eng in _all_engines():
+        eng.dispose()
+
+def reset_after_fork():
+    """
+    เรียกใน process ลูกหลัง fork (gunicorn post_fork): ทิ้ง connection ที่ติดมาจาก master
+    โดยไม่ปิด (ยังเป็นของ master) → worker เปิด pool ของตัวเองใหม่
+    """
+    for eng in _all_engines():
+        eng.dispose(close=False)
+
+
+# ----------------- after-commit hooks -----------------
+def on_commit(db: Session, fn):
+    """
+    ลงทะเบียน callback ให้รันหลัง db.commit() สำเร็จเท่านั้น
+    ถ้า rollback จะถูกทิ้งไป
+    """
+    db.info.setdefault("on_commit", []).append(fn)
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session: Session):
+    for fn in session.info.pop("on_commit", []):
+        try:
+            fn()
+        except Exception:
+            log.exception("after-commit hook failed")
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_commit(session: Session):
+    session.info.pop("on_commit", None)
+
+
+# ----------------- read-your-writes -----------------
+# เก็บเวลาที่ user เขียนล่าสุด (ต่อ process) เพื่อให้ GET ถัดไปอ่านจาก primary
+# หลาย worker: marker ต่อ process ไม่พอ (GET ถัดไปอาจไปตก worker อื่น) → app/cache.py ลงทะเบียนตัวเช็ก
+# marker ใน shared cache ผ่าน add_recent_write_check
+_recent_writes: dict[int, float] = {}
+_recent_lock = threading.Lock()
+_recent_write_checks: list = []
+
+def add_recent_write_check(fn):
+    """fn(user_id) -> bool: user เขียนภายใน READ_YOUR_WRITES_SECONDS ไหม (ใช้เมื่อ marker ใน process ไม่เจอ)"""
+    _recent_write_checks.append(fn)
+
+def mark_user_write(user_id: int):
+    until = time.monotonic() + READ_YOUR_WRITES_SECONDS
+    with _recent_lock:
+        _recent_writes[int(user_id)] = until
+        if len(_recent_writes) > 10_000:
+            now = time.monotonic()
+            for uid in [u for u, t in _recent_writes.items() if t < now]:
+                del _recent_writes[uid]
+
+def wrote_recently(user_id) -> bool:
+    if user_id is None:
+        return False
+    with _recent_lock:
+        until = _recent_writes.get(int(user_id))
+    if until is not None and until > time.monotonic():
+        return True
+    return any(fn(int(user_id)) for fn in _recent_write_checks)
+
+# listener ที่อยากรู้ว่า user ไหนเขียนอะไร (เช่น read cache) → fn(user_id, scopes)
+_write_listeners: list = []
+
+def add_write_listener(fn):
+    _write_listeners.append(fn)
+
+def _after_user_write(user_id: int, scopes: tuple[str, ...]):
+    mark_user_write(user_id)
+    for fn in _write_listeners:
+        fn(user_id, scopes)
+
+def record_write(db: Session, user_id: int, *scopes: str):
+    """
+    เรียกใน write handler ก่อน commit; หลัง commit สำเร็จจะ mark user (read-your-writes)
+    และแจ้ง listener ว่าข้อมูลส่วนไหนเปลี่ยน (scopes เช่น "tags", "month_results")
+    """
+    if user_id is not None:
+        on_commit(db, lambda: _after_user_write(user_id, scopes))
+
+
+# ----------------- dependencies -----------------
+def _token_user_id(request: Request):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).get("uid")
+    except Exception:
+        return None
+
+
+def _path_user_id(request: Request):
+    """user_id ใน path เป็น int; ไม่มี/ไม่ใช่ตัวเลข (เช่น /tags/abc) → None แล้วปล่อยให้ route ตอบ 422 เอง"""
+    raw = request.path_params.get("user_id")
+    try:
+        return int(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _request_shard(request: Request, *user_ids) -> Shard:
+    """shard จาก user_id ตัวแรกที่มี; ไม่มีเลย (เช่น สมัคร / login) → shard 0"""
+    if len(shards) == 1:
+        return shards[0]
+    uid = next((u for u in user_ids if u is not None), None)
+    try:
+        return shards[shard_index(uid)]
+    except ShardMoving:
+        raise HTTPException(status_code=503, detail="Account is being moved, retry shortly",
+                            headers={"Retry-After": str(int(SHARD_MAP_REFRESH_SECONDS) * 2 + 5)})
+
+
+def get_db(request: Request):
+    """session ของ primary ใน shard ของ user ที่ล็อกอินอยู่ (จาก token; ไม่มี token → user_id ใน path)"""
+    sh = _request_shard(request, _token_user_id(request) if len(shards) > 1 else None,
+                        _path_user_id(request))
+    db = sh.Session()
+    try:
+        yield db
+    finally:
+        db.close()
 
-def get_db():
-    db = SessionLocal()
+def get_read_db(request: Request):
+    """
+    session สำหรับ route ที่อ่านอย่างเดียว → ไปที่ replica (ของ shard ของ user ใน path)
+    ยกเว้น user ใน path เพิ่งเขียนข้อมูลภายใน READ_YOUR_WRITES_SECONDS → ใช้ primary
+    """
+    uid = _path_user_id(request)
+    sh = _request_shard(request, uid, _token_user_id(request) if len(shards) > 1 and uid is None else None)
+    if sh.read_engine is sh.engine or wrote_recently(uid):
+        db = sh.Session()
+    else:
+        db = sh.ReadSession()
     try:
         yield db
     finally:
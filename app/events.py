@@ -0,0 +1,206 @@
+# app/events.py
+# กระจาย event การเปลี่ยนแปลงยอด (tags / month_results / transactions) ไปยัง client ที่เปิด SSE ค้างไว้
+#
+# - write handler เรียก emit(db, user_id, {...}) ก่อน commit
+# - EVENTS_BACKEND=local    → ส่งให้ subscriber ใน process เดียวกันหลัง commit
+# - EVENTS_BACKEND=postgres → ส่ง pg_notify ใน transaction เดียวกัน (ถูกส่งจริงตอน commit, ทิ้งถ้า rollback)
+#                              แล้วทุก worker ฟัง LISTEN แล้วส่งต่อให้ subscriber ของตัวเอง
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import on_commit
+from app.money import with_baht
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "monkpad_events"
+_MONEY_KEYS = ("delta", "value", "income", "expense")  # สตางค์ใน emit() → บาท + <key>_satang ใน event ที่ส่งออก
+_NOTIFY_MAX_BYTES = 7000  # payload ของ NOTIFY จำกัดไม่เกิน 8000 bytes
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class Broker:
+    """
+    ทะเบียน subscriber ต่อ user (asyncio.Queue ต่อ connection)
+    dispatch() เรียกได้จากทุก thread; การ put ลง queue ทำบน event loop เสมอ
+    """
+
+    def __init__(self, queue_size: int):
+        self._queue_size = queue_size
+        self._subs: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._subs[user_id].add(q)
+        return q
+
+    def unsubscribe(self, user_id: int, q: asyncio.Queue):
+        with self._lock:
+            subs = self._subs.get(user_id)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[user_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
+
+    def dispatch(self, user_id: int, events: list[dict]):
+        with self._lock:
+            queues = list(self._subs.get(int(user_id), ()))
+        if not queues or self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, queues, events)
+        except RuntimeError:
+            pass  # loop ปิดไปแล้ว (กำลัง shutdown)
+
+    @staticmethod
+    def _deliver(queues: list[asyncio.Queue], events: list[dict]):
+        for q in queues:
+            for ev in events:
+                try:
+                    q.put_nowait(ev)
+                except asyncio.QueueFull:
+                    # client อ่านไม่ทัน → ล้างคิวแล้วบอกให้โหลดข้อมูลใหม่ทั้งหมด
+                    while not q.empty():
+                        q.get_nowait()
+                    q.put_nowait({"type": "resync"})
+                    break
+
+
+broker = Broker(config.EVENTS_QUEUE_SIZE)
+
+
+# ----------------- ฝั่ง write handler -----------------
+def emit(db: Session, user_id: int, ev: dict):
+    """เก็บ event ไว้กับ session; จะถูกส่งจริงเมื่อ commit สำเร็จเท่านั้น"""
+    pending = db.info.setdefault("events", {})
+    if not pending:
+        on_commit(db, lambda: _publish_local(pending))
+    pending.setdefault(int(user_id), []).append(with_baht(ev, *_MONEY_KEYS))
+
+
+def _publish_local(pending: dict[int, list[dict]]):
+    if config.EVENTS_BACKEND == "postgres":
+        return  # ส่งผ่าน NOTIFY แล้ว; listener จะ dispatch ให้ (รวมทั้ง worker นี้เอง)
+    for uid, evs in pending.items():
+        broker.dispatch(uid, evs)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_before_commit(session: Session):
+    if config.EVENTS_BACKEND != "postgres":
+        return
+    pending = session.info.get("events")
+    if not pending:
+        return
+    # รวม event เป็นก้อน ๆ ละไม่เกินขนาด payload สูงสุด → ปกติ 1 NOTIFY ต่อ commit
+    for uid, evs in pending.items():
+        chunk: list[dict] = []
+        size = 0
+        for ev in evs:
+            n = len(_dumps(ev).encode("utf-8")) + 1
+            if chunk and size + n > _NOTIFY_MAX_BYTES:
+                _notify(session, uid, chunk)
+                chunk, size = [], 0
+            chunk.append(ev)
+            size += n
+        if chunk:
+            _notify(session, uid, chunk)
+
+
+def _notify(session: Session, uid: int, evs: list[dict]):
+    session.execute(text("SELECT pg_notify(:ch, :p)"), {"ch": CHANNEL, "p": _dumps({"u": uid, "e": evs})})
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_events(session: Session):
+    session.info.pop("events", None)
+
+
+# ----------------- LISTEN (ข้าม worker) -----------------
+class PostgresListener(threading.Thread):
+    """
+    thread เดียวต่อ worker ถือ connection แยก (ไม่กิน pool) แล้ว LISTEN channel
+    หมายเหตุ: LISTEN ใช้ไม่ได้ผ่าน pooler แบบ transaction mode → ตั้ง EVENTS_LISTEN_URL เป็น direct/session URL
+    """
+
+    def __init__(self, url: str):
+        super().__init__(name="events-listener", daemon=True)
+        self._dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self._dsn, sslmode=config.DB_SSLMODE)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        try:
+                            msg = json.loads(n.payload)
+                            broker.dispatch(msg["u"], msg["e"])
+                        except (ValueError, KeyError):
+                            log.warning("bad event payload: %r", n.payload[:200])
+            except Exception:
+                log.exception("events listener failed; reconnecting in %.0fs", backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+_listeners: list[PostgresListener] = []
+
+
+def start(loop: asyncio.AbstractEventLoop):
+    broker.bind(loop)
+    if config.EVENTS_BACKEND == "postgres" and not _listeners:
+        # NOTIFY ถูกส่งใน shard ของ user → ฟังทุก shard (shard 1.. ใช้ DATABASE_SHARD_URLS ซึ่งควรเป็น direct URL)
+        for url in [config.EVENTS_LISTEN_URL, *config.DATABASE_SHARD_URLS]:
+            _listeners.append(PostgresListener(url))
+            _listeners[-1].start()
+
+
+def stop():
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,173 @@
+# app/group_commit.py
+# group commit ของ POST /transactions/add/ (เปิดด้วย GROUP_COMMIT=true)
+#
+# ปกติทุก request commit เอง → จ่ายค่า round trip + WAL flush ต่อรายการ และ pool มีแค่ DB_POOL_SIZE connection
+# เปิดแล้ว: request ตรวจข้อมูลเสร็จ → คืน connection ให้ pool → ส่งรายการเข้าคิวของ writer (1 thread ต่อ shard)
+#   writer รอรวมรายการที่เข้ามาพร้อม ๆ กันไม่เกิน GROUP_COMMIT_WINDOW_MS หรือ GROUP_COMMIT_MAX_BATCH รายการ
+#   แล้วเขียนทั้งก้อนด้วย ledger.apply_transactions (INSERT หลายแถว + ปรับยอดแบบรวมกลุ่ม) + commit ครั้งเดียว
+#   จากนั้นตอบแต่ละ request ด้วยผลของรายการตัวเอง (แถวที่เขียน + ยอด tag / month_results หลัง batch)
+# ก้อนไหนเขียนไม่ผ่าน (เช่น แท็กถูกลบระหว่างรอ) → เขียนทีละรายการใหม่ ให้รายการอื่นในก้อนยังสำเร็จ
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import shards
+from app.ledger import apply_transactions
+from app.money import with_baht
+
+log = logging.getLogger(__name__)
+
+_MONTH_COLUMNS = "id, user_id, month, year, income, expense"
+
+
+def _month_of(item: dict) -> tuple[int, int, int]:
+    return item["user_id"], item["date"].year, item["date"].month
+
+
+class GroupWriter(threading.Thread):
+    def __init__(self, shard: int, window: float, max_batch: int):
+        super().__init__(name=f"group-commit-{shard}", daemon=True)
+        self.shard = shard
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self.batches = self.items = self.fallbacks = 0
+
+    def submit(self, item: dict) -> Future:
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def stop(self):
+        self._queue.put(None)
+
+    def run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                batch.append(nxt)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch: list[tuple[dict, Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = self._write([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            log.warning("group commit of %d items failed (%s); retrying one by one", len(batch), e)
+            self.fallbacks += 1
+            for item, fut in batch:
+                try:
+                    fut.set_result(self._write([item])[0])
+                except Exception as e1:
+                    fut.set_exception(e1)
+            return
+        for (_, fut), res in zip(batch, results):
+            fut.set_result(res)
+
+    def _write(self, items: list[dict]) -> list[dict]:
+        with shards[self.shard].Session() as db:
+            try:
+                ids = apply_transactions(db, items)
+                # ยอดหลัง batch (แถวถูกล็อกจาก UPDATE/UPSERT ข้างบนแล้ว → ค่าตรงกับที่จะ commit)
+                tag_ids = sorted({it["tag_id"] for it in items})
+                tags = {r.id: with_baht(r._mapping, "value") for r in db.execute(
+                    text('SELECT id, value FROM "tags" WHERE id = ANY(CAST(:ids AS bigint[]))'), {"ids": tag_ids}
+                ).fetchall()}
+                keys = sorted({_month_of(it) for it in items})
+                months = {(r.user_id, r.year, r.month): with_baht(r._mapping, "income", "expense") for r in db.execute(
+                    text(f'''
+                        SELECT {_MONTH_COLUMNS} FROM "month_results"
+                        JOIN unnest(CAST(:uids AS bigint[]), CAST(:years AS int[]), CAST(:months AS int[]))
+                             AS k(user_id, year, month) USING (user_id, year, month)
+                    '''),
+                    {"uids": [k[0] for k in keys], "years": [k[1] for k in keys], "months": [k[2] for k in keys]}
+                ).fetchall()}
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        return [
+            {
+                "transaction": with_baht({
+                    "id": tid, "user_id": it["user_id"], "tag_id": it["tag_id"], "value": it["value"],
+                    "date": it["date"], "time": it["time"], "note": it.get("note") or "",
+                }, "value"),
+                "tags": [tags[it["tag_id"]]] if it["tag_id"] in tags else [],
+                "month_results": [months[_month_of(it)]] if _month_of(it) in months else [],
+            }
+            for it, tid in zip(items, ids)
+        ]
+
+
+_writers: dict[int, GroupWriter] = {}
+_lock = threading.Lock()
+
+
+def _writer(shard: int) -> GroupWriter:
+    w = _writers.get(shard)
+    if w is None:
+        with _lock:
+            w = _writers.get(shard)
+            if w is None:
+                w = GroupWriter(shard, config.GROUP_COMMIT_WINDOW_MS / 1000.0, config.GROUP_COMMIT_MAX_BATCH)
+                w.start()
+                _writers[shard] = w
+    return w
+
+
+def write_transaction(db: Session, item: dict) -> dict:
+    """
+    เขียน transaction หนึ่งรายการผ่าน writer ของ shard ที่ session ของ request ชี้อยู่ (รอจนกว่าก้อนจะ commit)
+    item: เหมือนของ ledger.apply_transactions; คืน {"transaction", "tags", "month_results"}
+    รอเกิน GROUP_COMMIT_TIMEOUT_SECONDS → concurrent.futures.TimeoutError (รายการยังอยู่ในคิว อาจ commit ภายหลัง)
+    """
+    bind = db.get_bind()
+    shard = next((sh.index for sh in shards if sh.engine is bind), 0)
+    db.close()  # คืน connection ระหว่างรอ (writer ต้องใช้ connection จาก pool เดียวกัน)
+    return _writer(shard).submit(item).result(timeout=config.GROUP_COMMIT_TIMEOUT_SECONDS)
+
+
+def stats() -> dict:
+    return {
+        w.shard: {"batches": w.batches, "items": w.items, "fallbacks": w.fallbacks,
+                  "avg_batch": round(w.items / w.batches, 2) if w.batches else 0}
+        for w in list(_writers.values())
+    }
+
+
+def stop():
+    """ตอนปิดแอป: ให้ writer เขียนรายการที่ค้างในคิวให้จบแล้วหยุด"""
+    with _lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for w in writers:
+        w.stop()
+    for w in writers:
+        w.join(timeout=5)
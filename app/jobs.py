@@ -0,0 +1,462 @@
+# app/jobs.py
+# คิวงานเบื้องหลังบน Postgres (ตาราง "jobs" จาก migrations/002_jobs.sql)
+#
+# - enqueue() ใน request แล้ว commit → ตอบ job id ทันที ไม่ถือ request worker / DB connection ระหว่างทำงานจริง
+# - worker (python -m app.worker) หยิบงานด้วย FOR UPDATE SKIP LOCKED → หลาย process/thread ไม่หยิบงานซ้ำกัน
+#   connection ถูกใช้แค่ตอนหยิบงานและตอนบันทึกผล (ไม่ถือไว้ระหว่างรอ OCR 60 วินาที)
+# - ล้มเหลว → retry แบบ exponential backoff (+jitter) จนครบ max_attempts; PermanentError = ไม่ retry
+# - worker ตายกลางงาน → งาน running ที่ lease หมด (JOBS_LEASE_SECONDS) ถูกหยิบใหม่
+# - เก็บ queued_ms / run_ms ต่อ job; สรุปรวมที่ GET /system/jobs
+# - หลาย shard: งานอยู่ใน shard เดียวกับข้อมูลของ user (enqueue ด้วย session ของ shard นั้น)
+#   worker วนหยิบทุก shard; handler เปิด session ด้วย job.session() ให้เขียนลง shard ของงาน
+#
+# เพิ่มงานประเภทใหม่:  @handler("kind") def fn(job: Job) -> dict   (dict ที่คืน = result ของ job)
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import frozen_users, record_write, shards
+from app.events import emit
+from app.ledger import apply_transactions
+from app.money import amount_from
+from app.sync import record_user_changes
+
+log = logging.getLogger(__name__)
+
+HANDLERS: dict[str, Callable] = {}
+PUBLIC_KINDS: set[str] = set()  # kind ที่สร้างผ่าน POST /jobs ได้ (ไม่ต้องมีไฟล์แนบ)
+
+
+class PermanentError(Exception):
+    """ข้อผิดพลาดที่ retry ไปก็ไม่หาย (ข้อมูลไม่ถูกต้อง ฯลฯ) → failed ทันที"""
+
+
+def handler(kind: str, public: bool = False):
+    def deco(fn):
+        HANDLERS[kind] = fn
+        if public:
+            PUBLIC_KINDS.add(kind)
+        return fn
+    return deco
+
+
+@dataclass
+class Job:
+    id: int
+    user_id: int | None
+    kind: str
+    payload: dict
+    input: bytes | None
+    progress: dict | None
+    attempts: int
+    max_attempts: int
+    shard: int = 0
+
+    def session(self) -> Session:
+        """session ของ shard ที่งานนี้อยู่ (ข้อมูลของ user อยู่ shard เดียวกัน)"""
+        return shards[self.shard].Session()
+
+    def set_progress(self, db: Session, done: int, total: int):
+        """
+        บันทึก progress ใน transaction ของ db (commit พร้อมงานส่วนนั้น)
+        → ถ้า attempt นี้ล้ม attempt ถัดไปทำต่อจาก progress["done"] ได้โดยไม่ทำซ้ำ
+        ต่อ lease ไปด้วย (งานยาวที่ยังคืบหน้าอยู่ไม่ถูก worker อื่นหยิบซ้ำ)
+        """
+        db.execute(
+            text('UPDATE "jobs" SET progress = CAST(:p AS jsonb), locked_at = now() WHERE id = :id'),
+            {"p": json.dumps({"done": done, "total": total}), "id": self.id}
+        )
+
+
+# ----------------- ฝั่ง web -----------------
+def enqueue(db: Session, kind: str, payload: dict | None = None, user_id: int | None = None,
+            input: bytes | None = None, max_attempts: int | None = None) -> int:
+    """เพิ่มงานเข้าคิว (ไม่ commit เอง)"""
+    return db.execute(
+        text('''
+            INSERT INTO "jobs" (user_id, kind, payload, input, max_attempts)
+            VALUES (:uid, :kind, CAST(:payload AS jsonb), :input, :max)
+            RETURNING id
+        '''),
+        {"uid": user_id, "kind": kind, "payload": json.dumps(payload or {}, ensure_ascii=False),
+         "input": input, "max": max_attempts or config.JOBS_MAX_ATTEMPTS}
+    ).scalar()
+
+
+def stats(db: Session, hours: float = 24) -> list[dict]:
+    """สรุปต่อ (kind, status) ของงานที่สร้างใน N ชั่วโมงล่าสุด: จำนวน, attempts, queued/run ms (avg, p95)"""
+    rows = db.execute(
+        text('''
+            SELECT kind, status, COUNT(*) AS count, SUM(attempts) AS attempts,
+                   AVG(queued_ms) AS queued_ms_avg,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY queued_ms) AS queued_ms_p95,
+                   AVG(run_ms) AS run_ms_avg,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY run_ms) AS run_ms_p95
+            FROM "jobs"
+            WHERE created_at > now() - make_interval(secs => :secs)
+            GROUP BY kind, status
+            ORDER BY kind, status
+        '''),
+        {"secs": hours * 3600}
+    ).fetchall()
+    return [dict(r._mapping) for r in rows]
+
+
+# ----------------- ฝั่ง worker -----------------
+def claim(db: Session, worker_id: str, shard: int = 0) -> Job | None:
+    # งานของ user ที่กำลังย้าย shard รอไว้ก่อน (ย้ายเสร็จแล้วจะถูกหยิบจาก shard ใหม่)
+    row = db.execute(
+        text('''
+            UPDATE "jobs" j
+            SET status = 'running', attempts = j.attempts + 1,
+                locked_by = :w, locked_at = now(), started_at = now(),
+                queued_ms = COALESCE(j.queued_ms, EXTRACT(EPOCH FROM now() - j.created_at) * 1000)
+            WHERE j.id = (
+                SELECT id FROM "jobs"
+                WHERE ((status = 'queued' AND run_after <= now())
+                       OR (status = 'running' AND locked_at < now() - make_interval(secs => :lease)))
+                  AND (user_id IS NULL OR NOT (user_id = ANY(CAST(:frozen AS bigint[]))))
+                ORDER BY run_after, id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING j.id, j.user_id, j.kind, j.payload, j.input, j.progress, j.attempts, j.max_attempts
+        '''),
+        {"w": worker_id, "lease": config.JOBS_LEASE_SECONDS, "frozen": frozen_users()}
+    ).fetchone()
+    db.commit()
+    if not row:
+        return None
+    r = row._mapping
+    return Job(
+        id=r["id"], user_id=r["user_id"], kind=r["kind"], payload=r["payload"] or {},
+        input=bytes(r["input"]) if r["input"] is not None else None, progress=r["progress"],
+        attempts=r["attempts"], max_attempts=r["max_attempts"], shard=shard,
+    )
+
+
+def retry_delay(attempt: int) -> float:
+    base = min(config.JOBS_RETRY_MAX_SECONDS, config.JOBS_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return base * random.uniform(0.5, 1.0)
+
+
+def _finish(db: Session, job: Job, worker_id: str, run_ms: float,
+            result: dict | None = None, error: str | None = None, permanent: bool = False) -> str:
+    if error is None:
+        status = "succeeded"
+    elif permanent or job.attempts >= job.max_attempts:
+        status = "failed"
+    else:
+        status = "queued"
+
+    params = {"id": job.id, "w": worker_id, "a": job.attempts, "ms": run_ms, "err": error}
+    if status == "queued":
+        sql = '''
+            UPDATE "jobs"
+            SET status = 'queued', error = :err, run_ms = :ms, locked_by = NULL, locked_at = NULL,
+                run_after = now() + make_interval(secs => :delay)
+            WHERE id = :id AND locked_by = :w AND attempts = :a
+        '''
+        params["delay"] = retry_delay(job.attempts)
+    else:
+        sql = '''
+            UPDATE "jobs"
+            SET status = :status, result = CAST(:result AS jsonb), error = :err, run_ms = :ms,
+                input = NULL, finished_at = now(), locked_by = NULL, locked_at = NULL
+            WHERE id = :id AND locked_by = :w AND attempts = :a
+        '''
+        params["status"] = status
+        params["result"] = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+
+    # เงื่อนไข locked_by/attempts: ถ้า lease หมดแล้ว worker อื่นหยิบไปทำต่อ ไม่เขียนทับผลของเขา
+    if db.execute(text(sql), params).rowcount and job.user_id is not None:
+        emit(db, job.user_id, {"type": "job", "id": job.id, "kind": job.kind, "status": status})
+    db.commit()
+    return status
+
+
+_next_shard = 0
+
+
+def run_one(worker_id: str) -> bool:
+    """หยิบและทำงาน 1 ชิ้น (วนถามทีละ shard เริ่มจาก shard ถัดจากรอบก่อน); คืน False ถ้าไม่มีงานพร้อมรัน"""
+    global _next_shard
+    job = None
+    start = _next_shard
+    for i in range(len(shards)):
+        sh = shards[(start + i) % len(shards)]
+        with sh.Session() as db:
+            job = claim(db, worker_id, sh.index)
+        if job is not None:
+            _next_shard = sh.index + 1
+            break
+    if job is None:
+        return False
+
+    t0 = time.perf_counter()
+    result, error, permanent = None, None, False
+    try:
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise PermanentError(f"unknown job kind: {job.kind}")
+        if job.attempts > job.max_attempts:
+            raise PermanentError("lease expired on the last attempt")
+        result = fn(job)
+    except PermanentError as e:
+        error, permanent = str(e), True
+    except Exception as e:
+        log.exception("job %d (%s) attempt %d failed", job.id, job.kind, job.attempts)
+        error = f"{type(e).__name__}: {e}"
+    run_ms = (time.perf_counter() - t0) * 1000
+
+    with job.session() as db:
+        status = _finish(db, job, worker_id, run_ms, result, error, permanent)
+    log.info("job %d %s attempt %d → %s in %.0f ms", job.id, job.kind, job.attempts, status, run_ms)
+    return True
+
+
+# ----------------- งานทั่วไป -----------------
+IMPORT_CHUNK = 1000
+
+
+@handler("import.transactions", public=True)
+def import_transactions(job: Job) -> dict:
+    """
+    payload: {"transactions": [{"tag_id", "value" (บาท) หรือ "value_satang", "date": "YYYY-MM-DD", "time": "HH:MM", "note"}, ...]}
+    ตรวจทุกแถวก่อน แล้วเขียนทีละ IMPORT_CHUNK แถว (commit ต่อ chunk พร้อม progress)
+    """
+    uid = job.user_id
+    rows = job.payload.get("transactions")
+    if uid is None or not isinstance(rows, list):
+        raise PermanentError("user_id and transactions are required")
+
+    with job.session() as db:
+        tag_types = dict(db.execute(
+            text('SELECT id, type FROM "tags" WHERE user_id = :uid'), {"uid": uid}
+        ).fetchall())
+
+    items = []
+    for i, r in enumerate(rows):
+        try:
+            value = amount_from(r)
+            date_obj = datetime.strptime(r["date"], "%Y-%m-%d").date()
+            time_obj = datetime.strptime(r.get("time") or "00:00", "%H:%M").time()
+        except (KeyError, TypeError, ValueError):
+            raise PermanentError(f"row {i}: value, date (YYYY-MM-DD) and time (HH:MM) are required")
+        if value is None or value <= 0:
+            raise PermanentError(f"row {i}: value must be positive")
+        tag_id = r.get("tag_id")
+        if tag_id not in tag_types:
+            raise PermanentError(f"row {i}: tag {tag_id} does not exist for this user")
+        items.append({
+            "user_id": uid, "tag_id": tag_id, "tag_type": tag_types[tag_id],
+            "value": value, "date": date_obj, "time": time_obj, "note": r.get("note") or "",
+        })
+
+    done = (job.progress or {}).get("done", 0)
+    while done < len(items):
+        chunk = items[done:done + IMPORT_CHUNK]
+        with job.session() as db:
+            apply_transactions(db, chunk)
+            done += len(chunk)
+            job.set_progress(db, done, len(items))
+            db.commit()
+    return {"imported": len(items)}
+
+
+@handler("reconcile", public=True)
+def reconcile(job: Job) -> dict:
+    """คำนวณ tags.value, month_results และ tag_month_results ของ user ใหม่จาก transactions ทั้งหมด + ยอดสรุปของปีที่ archive แล้ว (แก้ยอดสะสมที่เพี้ยน)"""
+    uid = job.user_id
+    if uid is None:
+        raise PermanentError("user_id is required")
+
+    with job.session() as db:
+        tags_fixed = db.execute(
+            text('''
+                UPDATE "tags" t
+                SET value = s.total
+                FROM (
+                    SELECT tg.id, COALESCE(SUM(tr.value), 0) AS total
+                    FROM "tags" tg
+                    LEFT JOIN (
+                        SELECT tag_id, value FROM "transactions" WHERE user_id = :uid
+                        UNION ALL
+                        SELECT tag_id, total FROM "transactions_archive" WHERE user_id = :uid
+                    ) tr ON tr.tag_id = tg.id
+                    WHERE tg.user_id = :uid
+                    GROUP BY tg.id
+                ) s
+                WHERE t.id = s.id AND t.value IS DISTINCT FROM s.total
+            '''),
+            {"uid": uid}
+        ).rowcount
+        months_fixed = db.execute(
+            text('''
+                WITH actual AS (
+                    SELECT tr.year, tr.month,
+                           SUM(CASE WHEN tg.type = 'income' THEN tr.value ELSE 0 END) AS income,
+                           SUM(CASE WHEN tg.type = 'expense' THEN tr.value ELSE 0 END) AS expense
+                    FROM (
+                        SELECT tag_id, EXTRACT(YEAR FROM date)::int AS year, EXTRACT(MONTH FROM date)::int AS month, value
+                        FROM "transactions" WHERE user_id = :uid
+                        UNION ALL
+                        SELECT tag_id, year, month, total FROM "transactions_archive" WHERE user_id = :uid
+                    ) tr JOIN "tags" tg ON tg.id = tr.tag_id
+                    GROUP BY 1, 2
+                )
+                INSERT INTO "month_results" (user_id, month, year, income, expense)
+                SELECT :uid, k.month, k.year, COALESCE(a.income, 0), COALESCE(a.expense, 0)
+                FROM (
+                    SELECT year, month FROM "month_results" WHERE user_id = :uid
+                    UNION
+                    SELECT year, month FROM actual
+                ) k
+                LEFT JOIN actual a USING (year, month)
+                ON CONFLICT (user_id, year, month) DO UPDATE
+                SET income = EXCLUDED.income, expense = EXCLUDED.expense
+                WHERE ("month_results".income, "month_results".expense)
+                      IS DISTINCT FROM (EXCLUDED.income, EXCLUDED.expense)
+            '''),
+            {"uid": uid}
+        ).rowcount
+        tag_months_fixed = db.execute(
+            text('''
+                WITH actual AS (
+                    SELECT tag_id, year, month, SUM(total) AS total, SUM(tx_count) AS tx_count
+                    FROM (
+                        SELECT tag_id, EXTRACT(YEAR FROM date)::int AS year, EXTRACT(MONTH FROM date)::int AS month,
+                               value AS total, 1 AS tx_count
+                        FROM "transactions" WHERE user_id = :uid
+                        UNION ALL
+                        SELECT tag_id, year, month, total, tx_count FROM "transactions_archive" WHERE user_id = :uid
+                    ) s
+                    GROUP BY 1, 2, 3
+                )
+                INSERT INTO "tag_month_results" (user_id, tag_id, year, month, total, tx_count)
+                SELECT :uid, k.tag_id, k.year, k.month, COALESCE(a.total, 0), COALESCE(a.tx_count, 0)
+                FROM (
+                    SELECT tag_id, year, month FROM "tag_month_results" WHERE user_id = :uid
+                    UNION
+                    SELECT tag_id, year, month FROM actual
+                ) k
+                LEFT JOIN actual a USING (tag_id, year, month)
+                ON CONFLICT (user_id, year, month, tag_id) DO UPDATE
+                SET total = EXCLUDED.total, tx_count = EXCLUDED.tx_count
+                WHERE ("tag_month_results".total, "tag_month_results".tx_count)
+                      IS DISTINCT FROM (EXCLUDED.total, EXCLUDED.tx_count)
+            '''),
+            {"uid": uid}
+        ).rowcount
+        if tags_fixed or months_fixed or tag_months_fixed:
+            emit(db, uid, {"type": "resync"})
+            record_user_changes(db, uid, "tag", "month")
+            record_write(db, uid, "tags", "month_results", "tag_month_results")
+        db.commit()
+    return {"tags_fixed": tags_fixed, "months_fixed": months_fixed, "tag_months_fixed": tag_months_fixed}
+
+
+# ----------------- ลบบัญชี -----------------
+# ลำดับการลบ (users ลบเป็นอย่างสุดท้ายหลังทุกตารางว่างแล้ว)
+DELETE_ORDER = (
+    "recurring_transactions", "transactions", "transactions_archive", "tag_month_results",
+    "month_results", "change_log", "tags", "jobs",
+)
+
+
+def _delete_chunk_sql(table: str) -> str:
+    # transactions เป็น partitioned table (ctid ซ้ำกันได้ข้าม partition) → เลือกด้วย primary key (id, date)
+    if table == "transactions":
+        return '''
+            WITH c AS (SELECT id, date FROM "transactions" WHERE user_id = :uid LIMIT :n)
+            DELETE FROM "transactions" t USING c
+            WHERE t.user_id = :uid AND t.id = c.id AND t.date = c.date
+        '''
+    extra = "AND id <> :job_id" if table == "jobs" else ""  # ไม่ลบแถวของงานนี้เอง
+    return f'''
+        DELETE FROM "{table}"
+        WHERE ctid = ANY(ARRAY(SELECT ctid FROM "{table}" WHERE user_id = :uid {extra} LIMIT :n))
+    '''
+
+
+def _throttle(db: Session, job: Job, done: int, total: int) -> float:
+    """รอจน replica ตามทัน (และจำนวน query ที่ active ไม่เกินกำหนด) คืนจำนวนวินาทีที่รอ"""
+    waited, delay = 0.0, 0.5
+    while True:
+        lag, active = db.execute(text('''
+            SELECT COALESCE((SELECT MAX(EXTRACT(EPOCH FROM replay_lag)) FROM pg_stat_replication), 0),
+                   (SELECT COUNT(*) FROM pg_stat_activity WHERE state = 'active' AND pid <> pg_backend_pid())
+        ''')).one()
+        busy = lag > config.ACCOUNT_DELETE_MAX_LAG_SECONDS or (
+            config.ACCOUNT_DELETE_MAX_ACTIVE and active > config.ACCOUNT_DELETE_MAX_ACTIVE
+        )
+        if not busy:
+            return waited
+        if waited == 0:
+            log.info("job %d: throttling (replica lag %.1fs, %d active queries)", job.id, lag, active)
+        job.set_progress(db, done, total)  # ต่อ lease ระหว่างรอ
+        db.commit()
+        time.sleep(delay)
+        waited += delay
+        delay = min(delay * 2, 10.0)
+
+
+@handler("account.delete")
+def delete_account(job: Job) -> dict:
+    """
+    ลบข้อมูลทั้งหมดของ user (ขอลบผ่าน DELETE /users/me แล้ว → users.deleted_at ถูกตั้งไว้)
+    ทีละ ACCOUNT_DELETE_CHUNK แถว commit ทุก chunk → ไม่ถือ lock นาน / WAL ไม่พุ่งเป็นก้อนเดียว
+    progress = {"done": แถวที่ลบแล้ว, "total": ทั้งหมด}; ล้มกลางทาง → attempt ถัดไปลบส่วนที่เหลือต่อ
+    """
+    uid = job.user_id
+    if uid is None:
+        raise PermanentError("user_id is required")
+
+    with job.session() as db:
+        user = db.execute(text('SELECT deleted_at FROM "users" WHERE id = :uid'), {"uid": uid}).fetchone()
+        if user is None:
+            return {"user_id": uid, "deleted": {}, "already_deleted": True}
+        if user.deleted_at is None:
+            raise PermanentError("account deletion was not requested for this user")
+        remaining = sum(
+            db.execute(text(f'SELECT COUNT(*) FROM "{t}" WHERE user_id = :uid'), {"uid": uid}).scalar()
+            for t in DELETE_ORDER
+        )
+
+    done = (job.progress or {}).get("done", 0)
+    total = done + remaining + 1  # + แถว users
+    deleted = dict.fromkeys(DELETE_ORDER, 0)
+    throttled = 0.0
+    params = {"uid": uid, "n": config.ACCOUNT_DELETE_CHUNK, "job_id": job.id}
+    with job.session() as db:
+        for table in DELETE_ORDER:
+            sql = text(_delete_chunk_sql(table))
+            while True:
+                throttled += _throttle(db, job, done, total)
+                n = db.execute(sql, params).rowcount
+                deleted[table] += n
+                done += n
+                job.set_progress(db, done, total)
+                db.commit()
+                if n < config.ACCOUNT_DELETE_CHUNK:
+                    break
+                time.sleep(config.ACCOUNT_DELETE_PAUSE_SECONDS)
+
+        db.execute(text('DELETE FROM "users" WHERE id = :uid'), {"uid": uid})
+        job.set_progress(db, total, total)
+        record_write(db, uid, "user", "tags", "month_results", "tag_month_results")
+        db.commit()
+
+    if len(shards) > 1:
+        with shards[0].Session() as home:
+            home.execute(text('DELETE FROM "user_shards" WHERE user_id = :uid'), {"uid": uid})
+            home.commit()
+    return {"user_id": uid, "deleted": deleted, "throttled_seconds": round(throttled, 1)}
@@ -0,0 +1,198 @@
+# app/ledger.py
+# เขียน transaction ทีละหลายแถวพร้อมปรับยอดสะสมแบบรวมกลุ่ม (ใช้กับงาน batch เช่น scheduler)
+#
+# ต่อหนึ่ง batch:
+#   0) ล็อกแท็กทุกตัวใน batch แบบ FOR KEY SHARE (เรียงตาม id) — กันแท็กถูกลบ/merge ระหว่างเขียน
+#      ถ้าแท็กไหนไม่มีแล้ว → raise MissingTagError (group commit จะ fallback ทีละรายการแล้วตอบ 400 เฉพาะรายการนั้น)
+#   1) จอง id ล่วงหน้า 1 query แล้ว INSERT หลายแถวด้วย unnest (รู้ว่า id ไหนเป็นของรายการไหนแน่นอน)
+#   2) UPDATE "tags" ครั้งเดียวด้วยผลรวมต่อแท็ก
+#   3) UPSERT "month_results" ครั้งเดียวด้วยผลรวมต่อ (user, ปี, เดือน)
+#   4) UPSERT "tag_month_results" ครั้งเดียวด้วยผลรวมต่อ (user, แท็ก, ปี, เดือน)
+# ไม่ commit เอง — ให้ผู้เรียก commit (จะได้รวมกับงานอื่นใน transaction เดียวกัน)
+from collections import defaultdict
+from datetime import date, time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import record_write
+from app.events import emit
+from app.sync import month_key, record_change
+
+
+class MissingTagError(ValueError):
+    """แท็กของรายการใน batch ไม่มีอยู่ (หรือไม่ใช่ของ user นั้น) ตอนล็อก"""
+
+
+def apply_transactions(db: Session, items: list[dict]) -> list[int]:
+    """
+    items: [{"user_id", "tag_id", "tag_type", "value" (สตางค์), "date": date, "time": time, "note"}, ...]
+    ล็อกแท็กก่อน INSERT แล้ว raise MissingTagError ถ้าแท็กถูกลบไประหว่างนั้น  คืน id ของ transaction ตามลำดับ items
+    """
+    if not items:
+        return []
+
+    pairs = sorted({(it["tag_id"], it["user_id"]) for it in items})
+    locked = {(r.id, r.user_id) for r in db.execute(
+        text('''
+            SELECT t.id, t.user_id FROM "tags" t
+            JOIN unnest(CAST(:tids AS bigint[]), CAST(:uids AS bigint[])) AS k(id, user_id)
+              ON t.id = k.id AND t.user_id = k.user_id
+            ORDER BY t.id
+            FOR KEY SHARE OF t
+        '''),
+        {"tids": [p[0] for p in pairs], "uids": [p[1] for p in pairs]}
+    ).fetchall()}
+    for tag_id, user_id in pairs:
+        if (tag_id, user_id) not in locked:
+            raise MissingTagError(f"tag {tag_id} does not exist for user {user_id}")
+
+    ids = [r[0] for r in db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('transactions', 'id')) FROM generate_series(1, :n)"),
+        {"n": len(items)}
+    ).fetchall()]
+
+    db.execute(
+        text('''
+            INSERT INTO "transactions" (id, user_id, tag_id, value, time, date, note)
+            SELECT * FROM unnest(
+                CAST(:ids AS bigint[]), CAST(:uids AS bigint[]), CAST(:tids AS bigint[]),
+                CAST(:vals AS bigint[]), CAST(:times AS time[]), CAST(:dates AS date[]), CAST(:notes AS text[])
+            )
+        '''),
+        {
+            "ids": ids,
+            "uids": [it["user_id"] for it in items],
+            "tids": [it["tag_id"] for it in items],
+            "vals": [it["value"] for it in items],
+            "times": [it.get("time") or time(0, 0) for it in items],
+            "dates": [it["date"] for it in items],
+            "notes": [it.get("note") or "" for it in items],
+        }
+    )
+
+    tag_delta: dict[tuple[int, int], int] = defaultdict(int)
+    month_delta: dict[tuple[int, int, int], list] = defaultdict(lambda: [0, 0])
+    tag_month_delta: dict[tuple[int, int, int, int], list] = defaultdict(lambda: [0, 0])
+    for it in items:
+        d: date = it["date"]
+        tag_delta[(it["user_id"], it["tag_id"])] += it["value"]
+        month_delta[(it["user_id"], d.year, d.month)][0 if it["tag_type"] == "income" else 1] += it["value"]
+        tm = tag_month_delta[(it["user_id"], it["tag_id"], d.year, d.month)]
+        tm[0] += it["value"]
+        tm[1] += 1
+
+    db.execute(
+        text('''
+            UPDATE "tags" t
+            SET value = t.value + d.delta
+            FROM unnest(CAST(:uids AS bigint[]), CAST(:tids AS bigint[]), CAST(:deltas AS bigint[]))
+                 AS d(user_id, tag_id, delta)
+            WHERE t.id = d.tag_id AND t.user_id = d.user_id
+        '''),
+        {
+            "uids": [k[0] for k in tag_delta],
+            "tids": [k[1] for k in tag_delta],
+            "deltas": list(tag_delta.values()),
+        }
+    )
+
+    db.execute(
+        text('''
+            INSERT INTO "month_results" (user_id, month, year, income, expense)
+            SELECT * FROM unnest(
+                CAST(:uids AS bigint[]), CAST(:months AS int[]), CAST(:years AS int[]),
+                CAST(:incomes AS bigint[]), CAST(:expenses AS bigint[])
+            )
+            ON CONFLICT (user_id, year, month) DO UPDATE
+            SET income = "month_results".income + EXCLUDED.income,
+                expense = "month_results".expense + EXCLUDED.expense
+        '''),
+        {
+            "uids": [k[0] for k in month_delta],
+            "months": [k[2] for k in month_delta],
+            "years": [k[1] for k in month_delta],
+            "incomes": [v[0] for v in month_delta.values()],
+            "expenses": [v[1] for v in month_delta.values()],
+        }
+    )
+
+    adjust_tag_months(db, tag_month_delta)
+
+    # แจ้ง client (SSE) + change feed + ล้าง cache ต่อ user
+    for it, tid in zip(items, ids):
+        emit(db, it["user_id"], {"type": "transaction", "op": "add", "id": tid})
+    for (uid, tag_id), delta in tag_delta.items():
+        emit(db, uid, {"type": "tag", "id": tag_id, "delta": delta})
+    for (uid, y, m), (inc, exp) in month_delta.items():
+        emit(db, uid, {"type": "month", "year": y, "month": m, "income": inc, "expense": exp})
+    # change feed (GET /sync)
+    for it, tid in zip(items, ids):
+        record_change(db, it["user_id"], "transaction", tid)
+    for uid, tag_id in tag_delta:
+        record_change(db, uid, "tag", tag_id)
+    for uid, y, m in month_delta:
+        record_change(db, uid, "month", month_key(y, m))
+    for uid in {it["user_id"] for it in items}:
+        record_write(db, uid, "tags", "month_results", "tag_month_results")
+    return ids
+
+
+def adjust_tag_months(db: Session, deltas: dict[tuple[int, int, int, int], list]):
+    """
+    deltas: {(user_id, tag_id, year, month): [ยอดสตางค์ที่ต้องบวก, จำนวนรายการที่ต้องบวก]} (ติดลบได้)
+    upsert ครั้งเดียวแบบ atomic — key ต้องไม่ซ้ำกัน (รวมกันมาก่อนแล้วใน dict)
+    """
+    deltas = {k: v for k, v in deltas.items() if v[0] or v[1]}
+    if not deltas:
+        return
+    keys = list(deltas)
+    db.execute(
+        text('''
+            INSERT INTO "tag_month_results" (user_id, tag_id, year, month, total, tx_count)
+            SELECT * FROM unnest(
+                CAST(:uids AS bigint[]), CAST(:tids AS bigint[]), CAST(:years AS int[]), CAST(:months AS int[]),
+                CAST(:totals AS bigint[]), CAST(:counts AS int[])
+            )
+            ON CONFLICT (user_id, year, month, tag_id) DO UPDATE
+            SET total = "tag_month_results".total + EXCLUDED.total,
+                tx_count = "tag_month_results".tx_count + EXCLUDED.tx_count
+        '''),
+        {
+            "uids": [k[0] for k in keys],
+            "tids": [k[1] for k in keys],
+            "years": [k[2] for k in keys],
+            "months": [k[3] for k in keys],
+            "totals": [deltas[k][0] for k in keys],
+            "counts": [deltas[k][1] for k in keys],
+        }
+    )
+
+
+def move_tag_months(db: Session, user_id: int, pairs: list[tuple[int, int]]):
+    """
+    ย้ายยอดของแท็กต้นทางไปรวมกับแท็กปลายทาง (ใช้ตอนลบ/รวมแท็ก) — คำสั่งเดียว
+    pairs: [(tag_id ต้นทาง, tag_id ปลายทาง), ...]
+    """
+    if not pairs:
+        return
+    db.execute(
+        text('''
+            WITH m AS (
+                SELECT * FROM unnest(CAST(:srcs AS bigint[]), CAST(:dsts AS bigint[])) AS m(src, dst)
+            ), moved AS (
+                DELETE FROM "tag_month_results" t
+                USING m
+                WHERE t.user_id = :uid AND t.tag_id = m.src
+                RETURNING m.dst, t.year, t.month, t.total, t.tx_count
+            )
+            INSERT INTO "tag_month_results" (user_id, tag_id, year, month, total, tx_count)
+            SELECT :uid, dst, year, month, SUM(total), SUM(tx_count)
+            FROM moved
+            GROUP BY dst, year, month
+            ON CONFLICT (user_id, year, month, tag_id) DO UPDATE
+            SET total = "tag_month_results".total + EXCLUDED.total,
+                tx_count = "tag_month_results".tx_count + EXCLUDED.tx_count
+        '''),
+        {"uid": user_id, "srcs": [p[0] for p in pairs], "dsts": [p[1] for p in pairs]}
+    )
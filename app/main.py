@@ -1,11 +1,50 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routers import users, tags, month_results , transactions , auth , ocr_space 
-from dotenv import load_dotenv  
-import os
+from starlette.concurrency import run_in_threadpool
+
+from app import config, events, cache, scheduler, partitions, group_commit
+from app.database import warm_up_pool, dispose_engines
+from app.security import shutdown_hash_pool
+from app.middleware import ProfileMiddleware, ServedByMiddleware, UploadLimitMiddleware, set_upload_spool_size
+from app.routers import users, tags, month_results , transactions , auth , ocr_space , dashboard
+from app.routers import events as events_router, system, analytics, recurring, jobs, sync
+
+log = logging.getLogger(__name__)
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # เปิด connection ให้ครบ pool ก่อนรายงานว่าพร้อม (ลด latency ของ request แรก)
+    if config.DB_WARMUP:
+        await run_in_threadpool(warm_up_pool)
+    # partition ของ transactions ปีนี้/ปีหน้า (ไม่มีก็ยังเขียนได้ — ลง partition default)
+    try:
+        await run_in_threadpool(partitions.ensure_upcoming)
+    except Exception:
+        log.exception("ensure transactions partitions failed")
+    events.start(asyncio.get_running_loop())
+    cache.start()
+    scheduler.start()
+    yield
+    scheduler.stop()
+    group_commit.stop()
+    cache.stop()
+    events.stop()
+    shutdown_hash_pool()
+    dispose_engines()
 
-load_dotenv()
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ServedByMiddleware)
+app.add_middleware(UploadLimitMiddleware, max_bytes=config.OCR_MAX_UPLOAD_BYTES, prefixes=("/ocr/",))
+set_upload_spool_size(config.UPLOAD_SPOOL_BYTES)
+# เพิ่มท้ายสุด = ชั้นนอกสุด (ครอบทุก middleware); ปิดอยู่ → ไม่เพิ่มเลย
+if config.PROFILER_ENABLED:
+    app.add_middleware(ProfileMiddleware, admin_ids=config.ADMIN_USER_IDS, token=config.PROFILER_TOKEN,
+                       interval_ms=config.PROFILER_INTERVAL_MS, out_dir=config.PROFILER_DIR)
 
 # include routers
 app.include_router(users.router)
@@ -14,5 +53,10 @@ app.include_router(month_results.router)
 app.include_router(transactions.router)
 app.include_router(auth.router)
 app.include_router(ocr_space.router)
-
-
+app.include_router(dashboard.router)
+app.include_router(events_router.router)
+app.include_router(system.router)
+app.include_router(analytics.router)
+app.include_router(recurring.router)
+app.include_router(jobs.router)
+app.include_router(sync.router)
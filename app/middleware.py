@@ -0,0 +1,180 @@
+# app/middleware.py
+# ASGI middleware แบบเบา (ไม่ใช้ BaseHTTPMiddleware เพื่อไม่รบกวน StreamingResponse / SSE)
+import hmac
+import json
+import logging
+import os
+import socket
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+
+from app import profiler
+from app.security import decode_token
+
+log = logging.getLogger(__name__)
+
+
+def served_by() -> str:
+    """host:pid ของ worker ปัจจุบัน (คำนวณทุกครั้ง → ถูกต้องแม้แอปถูก import ก่อน fork)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ServedByMiddleware:
+    """ใส่ header X-Served-By ให้ทุก response → รู้ว่า worker ไหนตอบ (debug การกระจายโหลด / reload)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        value = served_by().encode()
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-served-by", value)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_header)
+
+
+class _BodyTooLarge(HTTPException):
+    # เป็น HTTPException เพื่อให้ FastAPI ส่งต่อเป็น 413 (ไม่แปลงเป็น 400 "error parsing the body")
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Request body exceeds {limit} bytes")
+
+
+class UploadLimitMiddleware:
+    """
+    จำกัดขนาด body ของ path ที่ขึ้นต้นด้วย prefixes ตั้งแต่ตอนรับข้อมูล (ไม่ต้องรอรับครบก่อนตรวจ)
+      - Content-Length เกิน → 413 ทันทีโดยไม่อ่าน body
+      - ไม่บอกขนาด / โกหกขนาด → นับ byte ระหว่าง receive() เกินเมื่อไหร่หยุดรับแล้วตอบ 413
+    """
+
+    def __init__(self, app, max_bytes: int, prefixes: tuple[str, ...]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.prefixes = prefixes
+        self.too_large = JSONResponse(status_code=413, content={"detail": f"Request body exceeds {max_bytes} bytes"})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await self.too_large(scope, receive, send)
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise _BodyTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            # ปกติ FastAPI ตอบ 413 ให้แล้ว; กรณีหลุดออกมาถึงนี่ (เช่นอ่าน body นอก endpoint) ตอบเอง
+            if not started:
+                await self.too_large(scope, receive, send)
+
+
+class ProfileMiddleware:
+    """
+    sampling profiler ต่อ request (เพิ่มเข้าแอปเฉพาะตอน PROFILER_ENABLED=true)
+      X-Profile: file    → response จริง + header X-Profile-File (path ของ .speedscope.json ใน out_dir เขียนหลังตอบเสร็จ)
+      X-Profile: inline  → ตอบไฟล์ speedscope แทน response จริง (status / เวลารวม / เวลา DB อยู่ในชื่อ profile)
+                           + header Server-Timing: total / db
+      (หรือ query ?__profile=file|inline)
+    ต้องเป็นผู้ดูแล (Bearer token ของ admin_ids) หรือส่ง X-Profile-Token ตรงกับ token; ไม่ผ่าน → ทำงานปกติไม่ profile
+    """
+
+    def __init__(self, app, admin_ids: set[int], token: str, interval_ms: float, out_dir: str):
+        self.app = app
+        self.admin_ids = admin_ids
+        self.token = token.encode()
+        self.interval = interval_ms / 1000.0
+        self.out_dir = out_dir
+        profiler.install()
+
+    def _mode(self, scope) -> str | None:
+        headers = dict(scope["headers"])
+        mode = headers.get(b"x-profile", b"").decode("latin-1").lower()
+        if not mode and b"__profile" in scope.get("query_string", b""):
+            mode = parse_qs(scope["query_string"].decode("latin-1")).get("__profile", [""])[0].lower()
+        if mode not in ("file", "inline"):
+            return None
+        given = headers.get(b"x-profile-token")
+        if self.token and given and hmac.compare_digest(given, self.token):
+            return mode
+        scheme, _, bearer = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() == "bearer" and bearer:
+            try:
+                if decode_token(bearer).get("uid") in self.admin_ids:
+                    return mode
+            except Exception:
+                pass
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = self._mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        prof, token = profiler.start(f'{scope["method"]} {scope["path"]}', self.interval)
+        path = prof.path_in(self.out_dir)
+        status = 500
+
+        async def profiled_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if mode == "file":
+                    message["headers"] = [*message.get("headers", []), (b"x-profile-file", path.encode())]
+            if mode == "inline":
+                return  # ทิ้ง response จริง ตอบ profile แทนหลัง request จบ
+            await send(message)
+
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            profiler.stop(prof, token)
+            prof.label = f"{prof.label} → {status}"
+            timing = prof.server_timing().encode()
+
+        if mode == "inline":
+            body = json.dumps(prof.speedscope(), separators=(",", ":")).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            (b"server-timing", timing)],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        prof.write(path)
+        log.info("profile of %s written to %s (%s)", prof.label, path, timing.decode())
+
+
+def set_upload_spool_size(n: int):
+    """UploadFile เก็บในหน่วยความจำไม่เกิน n byte ที่เหลือพักลงไฟล์ชั่วคราว (ค่าเริ่มต้นของ Starlette = 1 MB)"""
+    for attr in ("spool_max_size", "max_file_size"):  # ชื่อ attribute ต่างกันตามเวอร์ชัน Starlette
+        if hasattr(MultiPartParser, attr):
+            setattr(MultiPartParser, attr, n)
@@ -0,0 +1,59 @@
+# app/migrate.py
+# รันไฟล์ SQL ใน migrations/ ตามลำดับชื่อไฟล์ และจดไว้ในตาราง schema_migrations (รันซ้ำได้ ข้ามอันที่ทำแล้ว)
+#
+#   python -m app.migrate            # apply ทั้งหมดที่ยังไม่ได้รัน
+#   python -m app.migrate --list     # ดูสถานะ
+# มีหลาย shard (DATABASE_SHARD_URLS) → ทำกับทุก shard ตามลำดับ
+import argparse
+from pathlib import Path
+
+from app.database import engine, shards
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+
+def _applied(cur) -> set[str]:
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "schema_migrations" (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    ''')
+    cur.execute('SELECT version FROM "schema_migrations"')
+    return {r[0] for r in cur.fetchall()}
+
+
+def migrate(eng=engine, list_only: bool = False):
+    files = sorted(MIGRATIONS_DIR.glob("*.sql"))
+    raw = eng.raw_connection()
+    try:
+        cur = raw.cursor()
+        done = _applied(cur)
+        raw.commit()
+        for f in files:
+            version = f.stem
+            if list_only:
+                print(f"{'x' if version in done else ' '} {version}")
+                continue
+            if version in done:
+                continue
+            print(f"applying {version} ...")
+            try:
+                cur.execute(f.read_text(encoding="utf-8"))  # หนึ่งไฟล์ = หนึ่ง transaction
+                cur.execute('INSERT INTO "schema_migrations" (version) VALUES (%s)', (version,))
+                raw.commit()
+            except Exception:
+                raw.rollback()
+                raise
+    finally:
+        raw.close()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="apply SQL migrations in migrations/")
+    p.add_argument("--list", action="store_true")
+    args = p.parse_args()
+    for sh in shards:
+        if len(shards) > 1:
+            print(f"-- shard {sh.index}")
+        migrate(sh.engine, list_only=args.list)
@@ -0,0 +1,78 @@
+# app/money.py
+# เงินทุกจำนวนเก็บและคำนวณเป็นจำนวนเต็มหน่วยสตางค์ (BIGINT) — 1 บาท = 100 สตางค์
+# (transactions.value, tags.value, month_results.income/expense, recurring_transactions.value)
+#
+# body ของ request ส่งได้ 2 แบบ:
+#   "value_satang": 15000030        ← แนะนำ (จำนวนเต็ม)
+#   "value": 150000.3 / "150,000.30" ← บาท (แปลงแบบ exact ด้วย Decimal; เกิน 2 ตำแหน่ง → error)
+# response: "value" (และ income / expense / delta) เป็นบาทเหมือนเดิม + "<ชื่อ>_satang" เป็นจำนวนเต็มคู่กัน (with_baht)
+#   → client เดิมแสดงผลได้เหมือนเดิม และส่ง "value" ที่อ่านได้กลับมาได้ค่าเดิมเป๊ะ
+import re
+from decimal import Decimal, InvalidOperation
+
+SATANG_PER_BAHT = 100
+MAX_SATANG = 10 ** 15  # ~ หมื่นล้านล้านบาท (ยังอยู่ในช่วงจำนวนเต็มที่ JSON/JS แทนได้แน่นอน)
+
+_STRIP = re.compile(r"[\s,฿]|บาท|thb", re.IGNORECASE)
+
+
+def parse_baht(v) -> int:
+    """1250.5 / "1,250.50" / "฿1250" → 125050 (สตางค์); ไม่ใช่ตัวเลข หรือเกิน 2 ตำแหน่งทศนิยม → ValueError"""
+    if isinstance(v, bool) or v is None:
+        raise ValueError("amount must be a number")
+    try:
+        if isinstance(v, int):
+            d = Decimal(v)
+        elif isinstance(v, float):
+            d = Decimal(repr(v))  # repr = ทศนิยมสั้นสุดที่ให้ float ค่าเดิม → 150000.3 ไม่กลายเป็น 150000.29999…
+        elif isinstance(v, str):
+            d = Decimal(_STRIP.sub("", v))
+        else:
+            raise ValueError("amount must be a number")
+    except InvalidOperation:
+        raise ValueError("amount must be a number")
+    if not d.is_finite():
+        raise ValueError("amount must be a number")
+    satang = d * SATANG_PER_BAHT
+    if satang != satang.to_integral_value():
+        raise ValueError("amount must have at most 2 decimal places")
+    return _checked(int(satang))
+
+
+def parse_satang(v) -> int:
+    if isinstance(v, bool) or not isinstance(v, int):
+        raise ValueError("value_satang must be an integer")
+    return _checked(v)
+
+
+def _checked(n: int) -> int:
+    if abs(n) > MAX_SATANG:
+        raise ValueError("amount is too large")
+    return n
+
+
+def amount_from(data: dict, key: str = "value") -> int | None:
+    """อ่านจำนวนเงินจาก body: <key>_satang ก่อน แล้วค่อย <key> (บาท); ไม่มีทั้งคู่ → None"""
+    if data.get(f"{key}_satang") is not None:
+        return parse_satang(data[f"{key}_satang"])
+    if data.get(key) is not None:
+        return parse_baht(data[key])
+    return None
+
+
+def baht(satang) -> float | None:
+    """125050 → 1250.5 (ทศนิยมไม่เกิน 2 ตำแหน่งเสมอ → parse_baht คืนค่าสตางค์เดิม)"""
+    if satang is None:
+        return None
+    return int(satang) / SATANG_PER_BAHT
+
+
+def with_baht(row, *fields: str) -> dict:
+    """แถวที่จะส่งให้ client: {"value": 125050} → {"value": 1250.5, "value_satang": 125050} (เฉพาะ field ที่มีในแถว)"""
+    out = dict(row)
+    for f in fields:
+        if f in out:
+            v = out[f]
+            out[f] = baht(v)
+            out[f"{f}_satang"] = None if v is None else int(v)
+    return out
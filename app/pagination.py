@@ -0,0 +1,69 @@
+# app/pagination.py
+# keyset pagination สำหรับ listing ทั้งตาราง (admin) แทน SELECT ทั้งตารางทีเดียว
+#
+#   GET ...?after_id=<id สุดท้ายของหน้าก่อน>&limit=100
+#     → body เป็น list เหมือนเดิม; หน้าถัดไปอยู่ใน header X-Next-After-Id (ไม่มี = หน้าสุดท้าย)
+#     → X-Total-Approx จาก pg_class.reltuples (สถิติของ ANALYZE, ไม่ต้อง COUNT(*) ทั้งตาราง)
+#   GET ...?format=ndjson  → stream ทุกแถวหลัง after_id ทีละบรรทัด (ดึงจาก DB ทีละ STREAM_BATCH แถว)
+#
+# sql ที่ส่งเข้ามาต้องมี  WHERE id > :after ORDER BY id LIMIT :n
+# convert (ไม่บังคับ) = แปลงแต่ละแถวก่อนส่ง เช่น lambda r: with_baht(r, "value")
+#
+# หลาย shard: ถามทุก shard ด้วย after/limit เดียวกันพร้อมกัน แล้ว merge ตาม id (id ไม่ซ้ำข้าม shard
+# เพราะ sequence ของแต่ละ shard แยก residue กัน — python -m app.shards init) → ได้หน้าที่ถูกต้องเหมือน shard เดียว
+import heapq
+import json
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import scatter
+
+PAGE_DEFAULT = 100
+PAGE_MAX = 1000
+STREAM_BATCH = 1000
+
+
+def approx_count(db: Session, table: str) -> int | None:
+    n = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"),
+        {"t": f'"{table}"'}
+    ).scalar()
+    return n if n is not None and n >= 0 else None  # -1 = ยังไม่เคย ANALYZE
+
+
+def _page(sql: str, after_id: int, n: int, db: Session | None = None) -> list[dict]:
+    """n แถวแรก (id น้อยสุด) หลัง after_id รวมทุก shard"""
+    parts = scatter(lambda s: [dict(r._mapping) for r in s.execute(text(sql), {"after": after_id, "n": n})], db=db)
+    if len(parts) == 1:
+        return parts[0]
+    return list(heapq.merge(*parts, key=lambda r: r["id"]))[:n]
+
+
+def keyset_page(db: Session, response: Response, sql: str, table: str, after_id: int, limit: int,
+                convert=None) -> list[dict]:
+    rows = _page(sql, after_id, limit + 1, db)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-After-Id"] = str(rows[-1]["id"])
+    counts = [n for n in scatter(lambda s: approx_count(s, table), db=db) if n is not None]
+    if counts:
+        response.headers["X-Total-Approx"] = str(sum(counts))
+    return [convert(r) for r in rows] if convert else rows
+
+
+def ndjson_stream(sql: str, after_id: int, convert=None) -> StreamingResponse:
+    # เปิด session สั้น ๆ ต่อ batch → ไม่ถือ connection ไว้ตลอดการส่งข้อมูลให้ client ที่อ่านช้า
+    def gen():
+        after = after_id
+        while True:
+            rows = _page(sql, after, STREAM_BATCH)
+            if rows:
+                yield "".join(json.dumps(convert(r) if convert else r, ensure_ascii=False, default=str) + "\n" for r in rows)
+            if len(rows) < STREAM_BATCH:
+                return
+            after = rows[-1]["id"]
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
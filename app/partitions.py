@@ -0,0 +1,182 @@
+# app/partitions.py
+# partition รายปีของ "transactions" (migrations/004) + archive ปีที่ปิดแล้ว
+#
+# - ensure_upcoming(): สร้าง partition ของปีนี้และปีหน้าล่วงหน้า (เรียกตอนแอปเริ่ม + ทุกรอบของ scheduler)
+#   แถวที่ไม่มี partition ของปีนั้นจะตกไปอยู่ใน "transactions_default" และถูกย้ายเข้า partition เมื่อสร้าง
+# - archive_year(): สรุปรายการของปีที่ปิดแล้วเป็นยอดรวมต่อ (user, แท็ก, เดือน) ลง "transactions_archive"
+#   แล้ว DETACH + DROP partition ของปีนั้น — month_results / tag_month_results / tags.value ไม่ถูกแตะ (ยังเป็นยอดจริงทั้งหมด)
+#
+#   python -m app.partitions ensure
+#   python -m app.partitions list
+#   python -m app.partitions archive 2022 [--export DIR] [--dry-run]
+import argparse
+import gzip
+import json
+import logging
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import shards
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "transactions_default"
+
+
+def partition_name(year: int) -> str:
+    return f"transactions_y{int(year)}"
+
+
+def year_range(year: int) -> tuple[date, date]:
+    """ช่วง [1 ม.ค. ปีนั้น, 1 ม.ค. ปีถัดไป) — ใช้เป็นเงื่อนไข date ให้ planner ตัด partition ได้"""
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def ensure_year(db: Session, year: int) -> str:
+    """สร้าง partition ของปี (ถ้ายังไม่มี) ไม่ commit เอง"""
+    return db.execute(text("SELECT ensure_transactions_partition(:y)"), {"y": int(year)}).scalar()
+
+
+def ensure_upcoming(today: date | None = None) -> list[str]:
+    """ปีนี้ + ปีหน้า ในทุก shard; ข้ามปีที่ archive ไปแล้ว (ไม่สร้าง partition ว่างกลับมา)"""
+    today = today or date.today()
+    created = []
+    for sh in shards:
+        with sh.Session() as db:
+            archived = _archived_years(db)
+            for y in (today.year, today.year + 1):
+                if y in archived:
+                    continue
+                if db.execute(text("SELECT to_regclass(:n)"), {"n": partition_name(y)}).scalar() is None:
+                    created.append(f"shard{sh.index}:{ensure_year(db, y)}" if len(shards) > 1 else ensure_year(db, y))
+            db.commit()
+    for name in created:
+        log.info("created partition %s", name)
+    return created
+
+
+def _archived_years(db: Session) -> set[int]:
+    return {r[0] for r in db.execute(text('SELECT year FROM "transactions_archive_years"')).fetchall()}
+
+
+def list_partitions(db: Session) -> list[dict]:
+    rows = db.execute(
+        text('''
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound,
+                   c.reltuples::bigint AS approx_rows, pg_total_relation_size(c.oid) AS bytes
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = '"transactions"'::regclass
+            ORDER BY c.relname
+        ''')
+    ).fetchall()
+    return [dict(r._mapping) for r in rows]
+
+
+# ----------------- archive -----------------
+def _export(db: Session, year: int, export_dir: Path) -> Path:
+    """เก็บรายการดิบของปีเป็น NDJSON.gz ก่อนลบ (ไว้กู้คืน/ตรวจย้อนหลัง)"""
+    lo, hi = year_range(year)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    path = export_dir / f"{partition_name(year)}.ndjson.gz"
+    result = db.execute(
+        text('SELECT id, user_id, tag_id, value, date, time, note FROM "transactions" '
+             'WHERE date >= :lo AND date < :hi ORDER BY id'),
+        {"lo": lo, "hi": hi}
+    )
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for r in result:
+            f.write(json.dumps(dict(r._mapping), default=str, ensure_ascii=False) + "\n")
+    return path
+
+
+def archive_year(db: Session, year: int, export_dir: Path | None = None, dry_run: bool = False) -> dict:
+    """
+    ย้ายปีที่ปิดแล้ว (ก่อนปีปัจจุบัน) ไปเป็นยอดสรุป แล้วลบ partition ของปีนั้นทิ้ง
+    ทำใน transaction เดียว: ล็อก partition กันเขียนระหว่างสรุป → ไม่มีรายการหลุดระหว่างสรุปกับลบ
+    """
+    year = int(year)
+    if year >= date.today().year:
+        raise ValueError("only closed years (before the current year) can be archived")
+    if year in _archived_years(db):
+        raise ValueError(f"year {year} is already archived")
+
+    lo, hi = year_range(year)
+    part = partition_name(year)
+    has_part = db.execute(text("SELECT to_regclass(:n)"), {"n": part}).scalar() is not None
+    locks = ([part] if has_part else []) + [DEFAULT_PARTITION]
+    for name in locks:
+        db.execute(text(f'LOCK TABLE "{name}" IN EXCLUSIVE MODE'))
+
+    summary = db.execute(
+        text('''
+            SELECT COUNT(*) AS rows, COUNT(DISTINCT user_id) AS users, COALESCE(SUM(value), 0) AS total
+            FROM "transactions" WHERE date >= :lo AND date < :hi
+        '''),
+        {"lo": lo, "hi": hi}
+    ).fetchone()._mapping
+    out = {"year": year, "partition": part if has_part else None, **summary}
+    if dry_run:
+        db.rollback()
+        return out
+
+    if export_dir is not None:
+        out["export"] = str(_export(db, year, export_dir))
+
+    db.execute(
+        text('''
+            INSERT INTO "transactions_archive" (user_id, tag_id, year, month, total, tx_count)
+            SELECT user_id, tag_id, :y, EXTRACT(MONTH FROM date)::int, SUM(value), COUNT(*)
+            FROM "transactions"
+            WHERE date >= :lo AND date < :hi
+            GROUP BY user_id, tag_id, EXTRACT(MONTH FROM date)
+        '''),
+        {"y": year, "lo": lo, "hi": hi}
+    )
+    if has_part:
+        db.execute(text(f'ALTER TABLE "transactions" DETACH PARTITION "{part}"'))
+        db.execute(text(f'DROP TABLE "{part}"'))
+    db.execute(
+        text(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE date >= :lo AND date < :hi'),
+        {"lo": lo, "hi": hi}
+    )
+    db.execute(
+        text('INSERT INTO "transactions_archive_years" (year, rows) VALUES (:y, :n)'),
+        {"y": year, "n": out["rows"]}
+    )
+    db.commit()
+    log.info("archived %s: %d rows for %d users", year, out["rows"], out["users"])
+    return out
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="transactions partitions")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("ensure", help="สร้าง partition ของปีนี้และปีหน้า")
+    sub.add_parser("list", help="แสดง partition ทั้งหมด")
+    a = sub.add_parser("archive", help="สรุปปีที่ปิดแล้วลง transactions_archive แล้วลบ partition")
+    a.add_argument("year", type=int)
+    a.add_argument("--export", type=Path, default=None, help="โฟลเดอร์เก็บรายการดิบ (.ndjson.gz) ก่อนลบ")
+    a.add_argument("--dry-run", action="store_true")
+    args = p.parse_args()
+
+    if args.cmd == "ensure":
+        print(ensure_upcoming() or "nothing to create")
+    elif args.cmd == "list":
+        for sh in shards:
+            with sh.Session() as db:
+                for r in list_partitions(db):
+                    print(f"{sh.index:<3} {r['name']:<24} {r['bound']:<60} ~{r['approx_rows']} rows  {r['bytes']} bytes")
+    else:
+        # ทุก shard (shard ละ transaction); export แยกโฟลเดอร์ย่อยต่อ shard
+        for sh in shards:
+            export = args.export / f"shard{sh.index}" if args.export is not None and len(shards) > 1 else args.export
+            with sh.Session() as db:
+                try:
+                    print(sh.index, archive_year(db, args.year, export, args.dry_run))
+                except ValueError as e:  # เช่น shard นี้ archive ไปแล้วในรอบก่อน
+                    print(sh.index, e)
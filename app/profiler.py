@@ -0,0 +1,218 @@
+# app/profiler.py
+# sampling profiler ต่อ request (เปิดใช้ผ่าน ProfileMiddleware ใน app/middleware.py เมื่อ PROFILER_ENABLED=true)
+#
+# - thread sampler อ่าน stack (sys._current_frames) ทุก PROFILER_INTERVAL_MS เฉพาะ thread ที่ทำงานให้ request นี้:
+#     event loop (ใช้ร่วมกับ request อื่น) + thread ใน threadpool ระหว่างที่รัน dependency / endpoint แบบ sync ของ request
+#   (รู้ว่า thread ไหนเป็นของ request ด้วยการห่อ anyio.to_thread.run_sync ซึ่ง Starlette/FastAPI ใช้ส่งงานเข้า threadpool)
+# - เวลา DB: event before/after_cursor_execute ของ SQLAlchemy → รวม ms / จำนวน query
+#   และ sample ที่เก็บระหว่างรอ DB จะมี frame "SQL ..." ต่อท้าย stack (แยกเวลาของ query ออกจาก python ใน flamegraph)
+# - ผลเป็นไฟล์ speedscope (https://www.speedscope.app) — 1 profile ต่อ thread
+# ปิด (ค่าเริ่มต้น) → ไม่ติดตั้ง hook / event ใด ๆ เลย
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_DEPTH = 200
+_SQL_LABEL_CHARS = 80
+
+_current: ContextVar["Profile | None"] = ContextVar("profile", default=None)
+_thread_profiles: dict[int, "Profile"] = {}  # thread ของ threadpool ที่กำลังทำงานให้ request ที่ถูก profile
+
+
+class Profile(threading.Thread):
+    def __init__(self, name: str, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.label = name
+        self.interval = interval
+        self.loop_thread = threading.get_ident()
+        self._active: dict[int, int] = {self.loop_thread: 1}  # thread id → จำนวนงานที่ซ้อนกันอยู่
+        self._names: dict[int, str] = {self.loop_thread: "event loop (shared)"}
+        self._in_db: dict[int, str] = {}
+        self._frames: dict[tuple, int] = {}
+        self._samples: dict[int, list[tuple[list[int], float]]] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.db_ms = 0.0
+        self.db_queries = 0
+        self.started = self.finished = 0.0
+
+    # ---------- ลงทะเบียน thread ----------
+    def enter(self, tid: int):
+        with self._lock:
+            self._active[tid] = self._active.get(tid, 0) + 1
+            self._names.setdefault(tid, f"worker {tid}")
+        _thread_profiles[tid] = self
+
+    def leave(self, tid: int):
+        with self._lock:
+            n = self._active.get(tid, 0) - 1
+            if n <= 0:
+                self._active.pop(tid, None)
+                self._in_db.pop(tid, None)  # query ที่ error ไม่มี after_cursor_execute
+                _thread_profiles.pop(tid, None)
+            else:
+                self._active[tid] = n
+
+    def db_start(self, tid: int, statement: str):
+        self._in_db[tid] = " ".join(statement.split())[:_SQL_LABEL_CHARS]
+
+    def db_end(self, tid: int, ms: float):
+        self._in_db.pop(tid, None)
+        self.db_ms += ms
+        self.db_queries += 1
+
+    # ---------- sampler ----------
+    def _frame_id(self, key: tuple) -> int:
+        i = self._frames.get(key)
+        if i is None:
+            i = self._frames[key] = len(self._frames)
+        return i
+
+    def _stack(self, frame, tid: int) -> list[int]:
+        out = []
+        while frame is not None and len(out) < MAX_DEPTH:
+            code = frame.f_code
+            out.append(self._frame_id((code.co_name, code.co_filename, code.co_firstlineno)))
+            frame = frame.f_back
+        out.reverse()  # speedscope: root → leaf
+        sql = self._in_db.get(tid)
+        if sql is not None:
+            out.append(self._frame_id((f"SQL {sql}", "<database>", 0)))
+        return out
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._done.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = (now - last) * 1000, now
+            frames = sys._current_frames()
+            with self._lock:
+                tids = list(self._active)
+            for tid in tids:
+                f = frames.get(tid)
+                if f is not None:
+                    self._samples.setdefault(tid, []).append((self._stack(f, tid), weight))
+            del frames
+
+    def begin(self):
+        self.started = time.perf_counter()
+        self.start()
+
+    def end(self):
+        self.finished = time.perf_counter()
+        self._done.set()
+        self.join()
+        for tid in list(self._active):
+            if _thread_profiles.get(tid) is self:
+                _thread_profiles.pop(tid, None)
+
+    @property
+    def wall_ms(self) -> float:
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    # ---------- output ----------
+    def speedscope(self) -> dict:
+        frames = [None] * len(self._frames)
+        for (name, file, line), i in self._frames.items():
+            frames[i] = {"name": name, "file": file, "line": line}
+        profiles = []
+        for tid, samples in self._samples.items():
+            total = sum(w for _, w in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": self._names.get(tid, str(tid)),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [s for s, _ in samples],
+                "weights": [w for _, w in samples],
+            })
+        # thread ของ threadpool (ที่รันโค้ดของ request จริง) ขึ้นก่อน event loop
+        profiles.sort(key=lambda p: p["name"].startswith("event loop"))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.label} — {self.wall_ms:.1f} ms, db {self.db_ms:.1f} ms / {self.db_queries} queries",
+            "exporter": "monkpad app.profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def server_timing(self) -> str:
+        return f'total;dur={self.wall_ms:.1f}, db;dur={self.db_ms:.1f};desc="{self.db_queries} queries"'
+
+    def path_in(self, directory: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.label).strip("_")[:60]
+        return os.path.join(directory, f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{slug}.speedscope.json")
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f, separators=(",", ":"))
+
+
+# ----------------- hooks (ติดตั้งครั้งเดียวเมื่อเปิด profiler) -----------------
+_installed = False
+
+
+def install():
+    """ห่อ anyio.to_thread.run_sync + ฟัง cursor event ของทุก engine (เรียกจาก ProfileMiddleware เท่านั้น)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    import anyio.to_thread
+
+    original = anyio.to_thread.run_sync
+
+    async def run_sync(func, *args, **kwargs):
+        prof = _current.get()
+        if prof is None:
+            return await original(func, *args, **kwargs)
+
+        def traced(*a):
+            tid = threading.get_ident()
+            prof.enter(tid)
+            try:
+                return func(*a)
+            finally:
+                prof.leave(tid)
+
+        return await original(traced, *args, **kwargs)
+
+    anyio.to_thread.run_sync = run_sync
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        prof = _thread_profiles.get(threading.get_ident())
+        if prof is not None:
+            conn.info["profile_t0"] = time.perf_counter()
+            prof.db_start(threading.get_ident(), statement)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info.pop("profile_t0", None)
+        prof = _thread_profiles.get(threading.get_ident())
+        if prof is not None and t0 is not None:
+            prof.db_end(threading.get_ident(), (time.perf_counter() - t0) * 1000)
+
+
+def start(name: str, interval: float) -> tuple[Profile, object]:
+    prof = Profile(name, interval)
+    token = _current.set(prof)
+    prof.begin()
+    return prof, token
+
+
+def stop(prof: Profile, token):
+    prof.end()
+    _current.reset(token)
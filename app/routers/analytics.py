@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.routers.auth import require_user
+from app.database import get_read_db
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"], dependencies=[Depends(require_user)])
+
+# แนวโน้มรายรับ/รายจ่าย ภาพรวม + แยกแท็ก (rolling 3/6/12, MoM, เดือนผิดปกติ, คาดการณ์เดือนหน้า)
+# months = จำนวนเดือนล่าสุดที่จะส่งกลับในแต่ละ series (การคำนวณใช้ประวัติทั้งหมด)
+@router.get("/{user_id}/trends")
+def read_trends(user_id: int, months: int = Query(12, ge=1, le=120), db: Session = Depends(get_read_db)):
+    from app.analytics import user_trends  # import ตอนใช้ — ไม่ให้ NumPy ถูกโหลดตอน start app
+    return user_trends(db, user_id, last_months=months)
@@ -3,8 +3,10 @@ from fastapi import APIRouter, Depends, HTTPException, Body
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app.database import get_db
+from app.database import get_db, scatter
 from app.security import create_access_token, decode_token, verify_password
+from app.cache import cached
+from app import config
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 security = HTTPBearer(auto_error=True)
@@ -17,16 +19,18 @@ security = HTTPBearer(auto_error=True)
 """
 # ================================================
 @router.post("/login")
-def login(payload: dict = Body(...), db: Session = Depends(get_db)):
+def login(payload: dict = Body(...)):
     username = payload.get("username")
     password = payload.get("password")
     if not username or not password:
         raise HTTPException(status_code=422, detail="username and password are required")
 
-    row = db.execute(
-        text('SELECT id, username, password FROM "users" WHERE username = :u'),
+    # username ไม่บอกว่า user อยู่ shard ไหน → ถามทุก shard พร้อมกัน (shard เดียว = query เดิม)
+    found = scatter(lambda s: s.execute(
+        text('SELECT id, username, password FROM "users" WHERE username = :u AND deleted_at IS NULL'),
         {"u": username}
-    ).fetchone()
+    ).fetchone(), read=False)
+    row = next((r for r in found if r is not None), None)
     if not row:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -47,12 +51,23 @@ def require_user(
         uid = payload.get("uid")
         if not uid:
             raise HTTPException(status_code=401, detail="Invalid token")
-        row = db.execute(
-            text('SELECT id, username, email FROM "users" WHERE id = :id'),
-            {"id": uid}
-        ).fetchone()
-        if not row:
+        def load():
+            row = db.execute(
+                text('SELECT id, username, email FROM "users" WHERE id = :id AND deleted_at IS NULL'),
+                {"id": uid}
+            ).fetchone()
+            return dict(row._mapping) if row else None
+
+        user = cached(uid, "user", "row", load)
+        if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return dict(row._mapping)  # {id, username, email}
+        return user  # {id, username, email}
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+def require_admin(user: dict = Depends(require_user)):
+    """เฉพาะ user ที่อยู่ใน ADMIN_USER_IDS"""
+    if user["id"] not in config.ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user
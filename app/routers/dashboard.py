@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import date
+from app.routers.auth import require_user
+from app.database import get_db
+from app.money import with_baht
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"], dependencies=[Depends(require_user)])
+
+# รวม tags + month_results ของปี + transactions ล่าสุด N รายการ เป็น query เดียว (json_agg)
+# หมายเหตุ: ใช้ get_db (ไม่ใช่ get_read_db) เพราะ require_user ใช้ get_db อยู่แล้ว
+# FastAPI จะ cache dependency ต่อ request → auth + ข้อมูลทั้งหมดใช้ session/connection เดียวกัน
+_DASHBOARD_SQL = text('''
+    SELECT
+        (SELECT COALESCE(json_agg(tg ORDER BY tg.id, tg.tag), '[]'::json)
+           FROM (SELECT id, user_id, tag, type, value FROM "tags" WHERE user_id = :uid) tg
+        ) AS tags,
+        (SELECT COALESCE(json_agg(mr ORDER BY mr.month), '[]'::json)
+           FROM (SELECT id, user_id, month, year, income, expense FROM "month_results"
+                 WHERE user_id = :uid AND year = :y) mr
+        ) AS month_results,
+        (SELECT COALESCE(json_agg(r ORDER BY r.date DESC, r.time DESC), '[]'::json)
+           FROM (SELECT t.id, t.tag_id, t.value, t.date, t.time, tg.type, tg.tag, t.note
+                 FROM "transactions" t JOIN "tags" tg ON t.tag_id = tg.id
+                 WHERE t.user_id = :uid
+                 ORDER BY t.date DESC, t.time DESC
+                 LIMIT :n) r
+        ) AS recent_transactions
+''')
+
+@router.get("/{user_id}")
+def read_dashboard(
+    user_id: int,
+    year: int | None = None,
+    recent: int = Query(5, ge=0, le=100),
+    db: Session = Depends(get_db),
+):
+    year = year or date.today().year
+    row = db.execute(_DASHBOARD_SQL, {"uid": user_id, "y": year, "n": recent}).fetchone()
+    data = row._mapping
+    return {
+        "user_id": user_id,
+        "year": year,
+        "tags": [with_baht(t, "value") for t in data["tags"]],
+        "month_results": [with_baht(m, "income", "expense") for m in data["month_results"]],
+        "recent_transactions": [with_baht(t, "value") for t in data["recent_transactions"]],
+    }
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.database import get_db
+from app.events import broker
+from app.routers.auth import require_user
+
+router = APIRouter(prefix="/events", tags=["Events"], dependencies=[Depends(require_user)])
+
+# ================= ตัวอย่าง stream =================
+"""
+event: transaction
+data: {"type":"transaction","op":"add","id":120}
+
+event: tag
+data: {"type":"tag","id":4,"delta":150.5,"delta_satang":15050}
+
+event: month
+data: {"type":"month","year":2025,"month":9,"income":150.5,"expense":0,"income_satang":15050,"expense_satang":0}
+"""
+# ================================================
+@router.get("/{user_id}")
+async def stream_events(user_id: int, db: Session = Depends(get_db)):
+    # auth เสร็จแล้ว → คืน connection เข้า pool ทันที ไม่ถือไว้ตลอดอายุ stream
+    await run_in_threadpool(db.close)
+    q = broker.subscribe(user_id)
+
+    async def gen():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    ev = await asyncio.wait_for(q.get(), timeout=config.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                data = json.dumps(ev, separators=(",", ":"), ensure_ascii=False, default=str)
+                yield f"event: {ev.get('type', 'message')}\ndata: {data}\n\n"
+        finally:
+            broker.unsubscribe(user_id, q)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
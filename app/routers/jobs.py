@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.routers.auth import require_user
+from app.database import get_db
+from app import jobs
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"], dependencies=[Depends(require_user)])
+
+# ================= ตัวอย่าง JSON =================
+"""
+{
+  "user_id": 4,
+  "kind": "import.transactions",     (import.transactions | reconcile)
+  "payload": {
+    "transactions": [
+      {"tag_id": 7, "value": 120, "date": "2025-10-01", "time": "08:30", "note": "ข้าวเช้า"}
+    ]
+  }
+}
+"""
+# ================================================
+@router.post("")
+def create_job(data: dict = Body(...), db: Session = Depends(get_db)):
+    user_id = data.get("user_id")
+    kind = data.get("kind")
+    payload = data.get("payload") or {}
+
+    if not user_id or not kind:
+        raise HTTPException(status_code=422, detail="user_id and kind are required")
+    if kind not in jobs.PUBLIC_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(sorted(jobs.PUBLIC_KINDS))}")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="payload must be an object")
+
+    job_id = jobs.enqueue(db, kind, payload, user_id=user_id)
+    db.commit()
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+
+# สถานะงาน (ไม่ส่ง payload/input กลับ); result มีค่าเมื่อ status = succeeded
+@router.get("/{job_id}")
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    row = db.execute(
+        text('''
+            SELECT id, user_id, kind, status, result, error, progress, attempts, max_attempts,
+                   run_after, created_at, started_at, finished_at, queued_ms, run_ms
+            FROM "jobs" WHERE id = :id
+        '''),
+        {"id": job_id}
+    ).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return dict(row._mapping)
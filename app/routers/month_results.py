@@ -3,19 +3,25 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.routers.auth import require_user
 
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.cache import cached
+from app.money import with_baht
 
 router = APIRouter(prefix="/month_results", tags=["Month Results"] , dependencies=[Depends(require_user)]) 
 
 @router.get("/{user_id}")
-def read_month_result(user_id: int, db: Session = Depends(get_db)):
-    rows = db.execute(
-        text('SELECT id, user_id, month, year, income, expense FROM "month_results" WHERE user_id = :uid'),
-        {"uid": user_id}
-    ).fetchall()
-    if not rows:
+def read_month_result(user_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        rows = db.execute(
+            text('SELECT id, user_id, month, year, income, expense FROM "month_results" WHERE user_id = :uid'),
+            {"uid": user_id}
+        ).fetchall()
+        return [with_baht(r._mapping, "income", "expense") for r in rows]
+
+    result = cached(user_id, "month_results", "all", load)
+    if not result:
         raise HTTPException(status_code=404, detail="No month results found for this user")
-    return [dict(r._mapping) for r in rows]
+    return result
 
 
 # ================= ตัวอย่าง JSON =================
@@ -122,12 +128,16 @@ def read_month_result(user_id: int, db: Session = Depends(get_db)):
 
 #find a month result by user_id and year
 @router.get("/{user_id}/{year}")
-def read_month_results_by_year(user_id: int, year: int, db: Session = Depends(get_db)):
-    rows = db.execute(
-        text('SELECT id, user_id, month, year, income, expense FROM "month_results" '
-             'WHERE user_id = :uid AND year = :y ORDER BY month'),
-        {"uid": user_id, "y": year}
-    ).fetchall()
-    if not rows:
+def read_month_results_by_year(user_id: int, year: int, db: Session = Depends(get_read_db)):
+    def load():
+        rows = db.execute(
+            text('SELECT id, user_id, month, year, income, expense FROM "month_results" '
+                 'WHERE user_id = :uid AND year = :y ORDER BY month'),
+            {"uid": user_id, "y": year}
+        ).fetchall()
+        return [with_baht(r._mapping, "income", "expense") for r in rows]
+
+    result = cached(user_id, "month_results", ("year", year), load)
+    if not result:
         raise HTTPException(status_code=404, detail="No month results found for this user/year")
-    return [dict(r._mapping) for r in rows]
+    return result
@@ -1,13 +1,21 @@
 # app/routers/ocr_space.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
-import httpx, re, os
-from dotenv import load_dotenv
-load_dotenv()
+from fastapi import APIRouter, UploadFile, File, Form, Query, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from functools import lru_cache
+from typing import BinaryIO
+import asyncio
+import logging
+import re
 
-API_KEY = os.getenv("OCR_SPACE_API_KEY")  # ← ดึงจาก ENV
-if not API_KEY:
-    raise HTTPException(status_code=500, detail="Missing OCR_SPACE_API_KEY")
+from app import config, jobs, slip_qr
+from app.database import session_for
+from app.money import parse_baht
+
+# หมายเหตุ: ไม่ตรวจ OCR_SPACE_API_KEY ตอน import แล้ว (ให้แอปบูตได้แม้ไม่ได้ตั้งค่า OCR)
+# จะตรวจตอนเรียก /ocr/parse แทน; httpx และ regex ที่ใหญ่ ๆ โหลดตอนใช้งานครั้งแรก
+
+log = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ocr", tags=["ocr"])
 
@@ -38,7 +46,23 @@ NEGATIVE_KEYWORDS = [
     "transaction", "txid", "customer", "client", "invoice no", "เลขที่ใบ",
     "รหัสลูกค้า"
 ]
-_amount_num_pat = re.compile(r"-?\d{1,3}(?:[ ,]?\d{3})*(?:\.\d+)?|-?\d+\.\d+")
+
+@lru_cache(maxsize=None)
+def _patterns() -> dict:
+    """คอมไพล์ regex ทั้งหมดครั้งเดียวตอนใช้งานครั้งแรก"""
+    month_alt = "|".join(re.escape(k) for k in TH_MONTHS.keys())
+    return {
+        "amount_num": re.compile(r"-?\d{1,3}(?:[ ,]?\d{3})*(?:\.\d+)?|-?\d+\.\d+"),
+        "date_num4": re.compile(r"\b(\d{1,2})[\/\-.](\d{1,2})[\/\-.](\d{4})\b"),
+        "date_num2": re.compile(r"\b(\d{1,2})[\/\-.](\d{1,2})[\/\-.](\d{2})\b"),
+        "date_th": re.compile(rf"\b(\d{{1,2}})\s*({month_alt})\s*(?:พ\.ศ\.\s*)?(\d{{2,4}})\b"),
+        "date_iso": re.compile(r"\b(20\d{2})-(\d{2})-(\d{2})\b"),
+        # ใช้ใน extract_time_hhmm เพื่อบอกว่าบรรทัดนี้คือวันที่
+        "line_date_th": re.compile(rf"\b\d{{1,2}}\s*({month_alt})\s*(?:พ\.ศ\.\s*)?\d{{2,4}}\b"),
+        "line_date_num": re.compile(r"\b\d{1,2}[\/\-.]\d{1,2}[\/\-.]\d{2,4}\b"),
+        "time_colon": re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b"),
+        "time_dot": re.compile(r"\b([01]?\d|2[0-3])[.]([0-5]\d)\b"),
+    }
 
 def _has_any(s: str, words: list[str]) -> bool:
     return any(w in s for w in words)
@@ -58,11 +82,12 @@ def extract_amount(text: str) -> str | None:
     if not text:
         return None
 
+    amount_num_pat = _patterns()["amount_num"]
     lines = [re.sub(r"\s+", " ", ln.strip().lower()) for ln in text.splitlines() if ln.strip()]
     candidates: list[tuple[str, float]] = []
 
     for i, ln in enumerate(lines):
-        for m in _amount_num_pat.finditer(ln):
+        for m in amount_num_pat.finditer(ln):
             raw = _normalize_amount(m.group(0))
             if not raw:
                 continue
@@ -114,6 +139,15 @@ def extract_amount(text: str) -> str | None:
 
     return best_raw
 
+def _satang(amount: str | None) -> int | None:
+    """จำนวนเงินที่ดึงได้ ("1250.50") → สตางค์ (125050) สำหรับส่งต่อเป็น value_satang ได้ตรง ๆ"""
+    if amount is None:
+        return None
+    try:
+        return parse_baht(amount)
+    except ValueError:
+        return None
+
 def _to_ce(y: int) -> int:
     """
     แปลงปีให้เป็น ค.ศ.:
@@ -138,25 +172,22 @@ def _from_ddmmyyyy(dd: str, mm: str, yyyy: str) -> str | None:
 def extract_date_iso(text: str) -> str | None:
     # 0) Normalize ข้อความเล็กน้อย
     t = text.replace(",", " ")
+    pats = _patterns()
 
     # 1) DD/MM/YYYY หรือ DD-MM-YYYY หรือ DD.MM.YYYY (ปี 4 หลัก)
-    m1 = re.search(r"\b(\d{1,2})[\/\-.](\d{1,2})[\/\-.](\d{4})\b", t)
+    m1 = pats["date_num4"].search(t)
     if m1:
         y = _to_ce(int(m1.group(3)))
         return f"{y:04d}-{int(m1.group(2)):02d}-{int(m1.group(1)):02d}"
 
     # 1.1) DD/MM/YY (ปี 2 หลัก)
-    m1b = re.search(r"\b(\d{1,2})[\/\-.](\d{1,2})[\/\-.](\d{2})\b", t)
+    m1b = pats["date_num2"].search(t)
     if m1b:
         y = _to_ce(int(m1b.group(3)))
         return f"{y:04d}-{int(m1b.group(2)):02d}-{int(m1b.group(1)):02d}"
 
     # 2) ไทย: "16 ก.ย. 2568" / "16 กันยายน 68" (รองรับปี 2 หรือ 4 หลัก, อาจมี 'พ.ศ.' แทรก)
-    month_alt = "|".join(re.escape(k) for k in TH_MONTHS.keys())
-    m2 = re.search(
-        rf"\b(\d{{1,2}})\s*({month_alt})\s*(?:พ\.ศ\.\s*)?(\d{{2,4}})\b",
-        t
-    )
+    m2 = pats["date_th"].search(t)
     if m2:
         d = int(m2.group(1))
         mon_txt = m2.group(2)
@@ -166,7 +197,7 @@ def extract_date_iso(text: str) -> str | None:
             return f"{y:04d}-{m:02d}-{d:02d}"
 
     # 3) ISO อยู่แล้ว: YYYY-MM-DD
-    m3 = re.search(r"\b(20\d{2})-(\d{2})-(\d{2})\b", t)
+    m3 = pats["date_iso"].search(t)
     if m3:
         return m3.group(0)
 
@@ -187,9 +218,9 @@ def extract_time_hhmm(text: str) -> str | None:
     amount_kw = ["จำนวนเงิน", "ค่าธรรมเนียม", "baht", "บาท", "thb", "รวม", "ยอด"]
     time_kw = ["เวลา", "time"]
     # เดือนภาษาไทยเพื่อช่วยบอกว่าบรรทัดนี้คือวันที่
-    month_alt = "|".join(re.escape(k) for k in TH_MONTHS.keys())
-    date_pat_th = re.compile(rf"\b\d{{1,2}}\s*({month_alt})\s*(?:พ\.ศ\.\s*)?\d{{2,4}}\b")
-    date_pat_num = re.compile(r"\b\d{1,2}[\/\-.]\d{1,2}[\/\-.]\d{2,4}\b")
+    pats = _patterns()
+    date_pat_th = pats["line_date_th"]
+    date_pat_num = pats["line_date_num"]
 
     # เตรียมบรรทัด
     raw_lines = [ln for ln in text.splitlines() if ln.strip()]
@@ -215,7 +246,7 @@ def extract_time_hhmm(text: str) -> str | None:
                     break
 
         # หาเวลาแบบ HH:MM (ให้ความสำคัญ)
-        for m in re.finditer(r"\b([01]?\d|2[0-3]):([0-5]\d)\b", ln):
+        for m in pats["time_colon"].finditer(ln):
             hh, mm = int(m.group(1)), int(m.group(2))
             score = 5.0  # base สำหรับ ':'
             if has_time_kw: score += 8
@@ -227,7 +258,7 @@ def extract_time_hhmm(text: str) -> str | None:
 
         # หาเวลาแบบ HH.MM แต่ **ข้าม** บรรทัดเงิน
         if not is_amount_line:
-            for m in re.finditer(r"\b([01]?\d|2[0-3])[.]([0-5]\d)\b", ln):
+            for m in pats["time_dot"].finditer(ln):
                 hh, mm = int(m.group(1)), int(m.group(2))
                 score = 2.0  # base สำหรับ '.'
                 if has_time_kw: score += 8
@@ -243,20 +274,29 @@ def extract_time_hhmm(text: str) -> str | None:
     candidates.sort(key=lambda x: x[1], reverse=True)
     return candidates[0][0]
 
-# ---------- Endpoint ----------
-@router.post("/parse")
-async def parse_ocr(file: UploadFile = File(...)):
-    API_KEY = os.getenv("OCR_SPACE_API_KEY") or "YOUR_FREE_OCR_SPACE_KEY"
+# ---------- OCR.space ----------
+OCR_SPACE_URL = "https://api.ocr.space/parse/image"
+
+def _api_key() -> str:
+    API_KEY = config.OCR_SPACE_API_KEY or "YOUR_FREE_OCR_SPACE_KEY"
     if not API_KEY or API_KEY == "YOUR_FREE_OCR_SPACE_KEY":
         raise HTTPException(status_code=500, detail="Missing OCR_SPACE_API_KEY")
+    return API_KEY
 
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+async def ocr_image(content: bytes | BinaryIO, filename: str | None, content_type: str | None) -> dict:
+    """
+    ส่งรูปไป OCR.space แล้วดึง amount/date/time
+    ใช้ทั้ง /ocr/parse (sync) และงาน "ocr.parse" ใน worker; error เป็น HTTPException ตาม status เดิม
+    content เป็น file object ได้ (เช่น UploadFile.file ที่พักบนดิสก์) → httpx อ่านส่งทีละ chunk ไม่โหลดทั้งไฟล์
+    """
+    import httpx  # โหลดเมื่อใช้ OCR ครั้งแรก ไม่ถ่วงเวลา startup
+
+    if hasattr(content, "seek"):
+        content.seek(0)
 
     files = {
         
-        "file": (file.filename or "image.jpg", content, file.content_type or "image/jpeg")
+        "file": (filename or "image.jpg", content, content_type or "image/jpeg")
     }
     data = {
         
@@ -265,12 +305,12 @@ async def parse_ocr(file: UploadFile = File(...)):
         "OCREngine": 2,   
         "scale": "true",  
     }
-    headers = {"apikey": API_KEY}
+    headers = {"apikey": _api_key()}
 
     try:
         async with httpx.AsyncClient(timeout=60) as client:
             resp = await client.post(
-                "https://api.ocr.space/parse/image",
+                OCR_SPACE_URL,
                 data=data,
                 files=files,
                 headers=headers,
@@ -303,4 +343,88 @@ async def parse_ocr(file: UploadFile = File(...)):
     date   = extract_date_iso(full_text)
     time   = extract_time_hhmm(full_text)
 
-    return {"amount": amount, "date": date, "time": time, "text": full_text}
\ No newline at end of file
+    return {"amount": amount, "amount_satang": _satang(amount), "date": date, "time": time, "text": full_text}
+
+# ---------- QR fast path ----------
+# สลิปส่วนใหญ่มี QR → อ่านในเครื่องก่อน (app/slip_qr.py)
+#   path = "qr"     : QR ให้ทั้งจำนวนเงินและวันที่ → ไม่เรียก OCR.space
+#   path = "qr+ocr" : อ่าน QR ได้แต่ข้อมูลไม่ครบ → OCR ต่อ (จำนวนเงินจาก QR แม่นกว่า ใช้แทนของ OCR)
+#   path = "ocr"    : ไม่มี QR ที่ใช้ได้
+def qr_result(qr: dict | None) -> dict | None:
+    if qr and qr["amount"] and qr["date"]:
+        return {"amount": qr["amount"], "amount_satang": _satang(qr["amount"]), "date": qr["date"], "time": qr["time"],
+                "text": None, "path": "qr", "qr": qr}
+    return None
+
+async def ocr_with_qr(content: bytes | BinaryIO, filename: str | None, content_type: str | None, qr: dict | None) -> dict:
+    res = await ocr_image(content, filename, content_type)
+    if qr and qr["amount"]:
+        res["amount"], res["amount_satang"] = qr["amount"], _satang(qr["amount"])
+    res["path"] = "qr+ocr" if qr else "ocr"
+    res["qr"] = qr
+    return res
+
+# ---------- Background job ----------
+@jobs.handler("ocr.parse")
+def _ocr_job(job: jobs.Job) -> dict:
+    if job.input is None:
+        raise jobs.PermanentError("missing image")
+    qr = job.payload.get("qr")  # endpoint อ่าน QR ไปแล้วก่อนเข้าคิว
+    try:
+        return asyncio.run(ocr_with_qr(job.input, job.payload.get("filename"), job.payload.get("content_type"), qr))
+    except HTTPException as e:
+        # upstream ล่ม / timeout / rate limit → retry;  รูปเสีย / key ผิด → ไม่ retry
+        if e.status_code >= 502 or e.status_code == 429:
+            raise RuntimeError(e.detail)
+        raise jobs.PermanentError(e.detail)
+
+def _enqueue_ocr(content: bytes, filename: str | None, content_type: str | None,
+                 user_id: int | None, qr: dict | None) -> int:
+    with session_for(user_id) as db:
+        job_id = jobs.enqueue(
+            db, "ocr.parse", {"filename": filename, "content_type": content_type, "qr": qr},
+            user_id=user_id, input=content,
+        )
+        db.commit()
+    return job_id
+
+# ---------- Endpoint ----------
+def _upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    pos = file.file.tell()
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(pos)
+    return size
+
+# อ่าน QR ก่อนเสมอ (ถ้าได้ครบตอบทันทีทั้ง 2 โหมด) แล้วค่อย OCR
+# mode=async → เข้าคิวแล้วตอบ 202 {"job_id"} ทันที (ดูผลที่ GET /jobs/{job_id} หรือ event "job" ทาง SSE)
+# ไม่ใช้ Depends(get_db): โหมด sync ไม่ควรถือ DB connection ไว้ระหว่างรอ OCR
+@router.post("/parse")
+async def parse_ocr(
+    file: UploadFile = File(...),
+    mode: str = Query("sync", pattern="^(sync|async)$"),
+    user_id: int | None = Form(None),
+):
+    # ไม่ await file.read(): ไฟล์ถูกจำกัดขนาดแล้ว (UploadLimitMiddleware) และพักลงดิสก์ถ้าใหญ่ (UPLOAD_SPOOL_BYTES)
+    # ใช้ file object ต่อทั้ง QR และ OCR → ไม่มีสำเนาทั้งไฟล์ในหน่วยความจำ
+    if not _upload_size(file):
+        raise HTTPException(status_code=400, detail="Empty file")
+
+    qr = await run_in_threadpool(slip_qr.read_slip, file.file)
+    fast = qr_result(qr)
+    if fast:
+        log.info("ocr/parse served by qr")
+        return fast
+
+    _api_key()
+    if mode == "async":
+        await file.seek(0)
+        content = await file.read()  # ต้องเก็บลง jobs.input
+        job_id = await run_in_threadpool(_enqueue_ocr, content, file.filename, file.content_type, user_id, qr)
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued", "path": "qr+ocr" if qr else "ocr"})
+
+    res = await ocr_with_qr(file.file, file.filename, file.content_type, qr)
+    log.info("ocr/parse served by %s", res["path"])
+    return res
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Body
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime
+from app.routers.auth import require_user
+from app.database import get_db, get_read_db
+from app.scheduler import FREQUENCIES
+from app.money import amount_from, with_baht
+
+router = APIRouter(prefix="/recurring", tags=["Recurring"], dependencies=[Depends(require_user)])
+
+# ================= ตัวอย่าง JSON =================
+"""
+{
+  "user_id": 4,
+  "tag_id": 7,
+  "value": 8500,              (บาท หรือส่ง "value_satang": 850000 แทน)
+  "frequency": "monthly",     (daily | weekly | monthly)
+  "interval": 1,              (ทุก ๆ กี่ วัน/สัปดาห์/เดือน, ไม่ใส่ = 1)
+  "start_date": "2025-10-01",
+  "end_date": null,           (ไม่บังคับ)
+  "time": "09:00",
+  "note": "ค่าเช่าห้อง"
+}
+"""
+# ================================================
+@router.post("/add/")
+def create_recurring(data: dict = Body(...), db: Session = Depends(get_db)):
+    user_id = data.get("user_id")
+    tag_id = data.get("tag_id")
+    frequency = data.get("frequency")
+    interval = data.get("interval") or 1
+    start_str = data.get("start_date")
+    end_str = data.get("end_date")
+    time_str = data.get("time") or "00:00"
+    note = data.get("note") or ""
+    try:
+        value = amount_from(data)  # สตางค์
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not user_id or not tag_id or value is None or not frequency or not start_str:
+        raise HTTPException(status_code=422, detail="user_id, tag_id, value, frequency, and start_date are required")
+    if value <= 0:
+        raise HTTPException(status_code=400, detail="value must be positive")
+    if frequency not in FREQUENCIES:
+        raise HTTPException(status_code=400, detail="frequency must be 'daily', 'weekly' or 'monthly'")
+    if not isinstance(interval, int) or interval < 1:
+        raise HTTPException(status_code=400, detail="interval must be a positive integer")
+
+    try:
+        time_obj = datetime.strptime(time_str, "%H:%M").time()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="time must be in HH:MM format")
+    try:
+        start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be in YYYY-MM-DD format")
+    if end_date is not None and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must be on or after start_date")
+
+    if not db.execute(
+        text('SELECT id FROM "tags" WHERE id = :tid AND user_id = :uid'),
+        {"tid": tag_id, "uid": user_id}
+    ).fetchone():
+        raise HTTPException(status_code=400, detail="Tag ID does not exist for this user")
+
+    new_id = db.execute(
+        text('''
+            INSERT INTO "recurring_transactions"
+                (user_id, tag_id, value, frequency, interval_count, day_of_month, time, note, next_date, end_date)
+            VALUES (:uid, :tid, :v, :f, :i, :dom, :ti, :n, :start, :end)
+            RETURNING id
+        '''),
+        {"uid": user_id, "tid": tag_id, "v": value, "f": frequency, "i": interval,
+         "dom": start_date.day if frequency == "monthly" else None,
+         "ti": time_obj, "n": note, "start": start_date, "end": end_date}
+    ).scalar()
+    db.commit()
+    return {"message": "Recurring transaction created successfully", "id": new_id}
+
+
+@router.get("/{user_id}")
+def read_recurring(user_id: int, db: Session = Depends(get_read_db)):
+    rows = db.execute(
+        text('''
+            SELECT r.id, r.tag_id, tg.tag, tg.type, r.value, r.frequency, r.interval_count AS interval,
+                   r.time, r.note, r.next_date, r.end_date, r.active
+            FROM "recurring_transactions" r JOIN "tags" tg ON tg.id = r.tag_id
+            WHERE r.user_id = :uid
+            ORDER BY r.next_date, r.id
+        '''),
+        {"uid": user_id}
+    ).fetchall()
+    return {"recurring": [with_baht(r._mapping, "value") for r in rows]}
+
+
+@router.delete("/delete/{recurring_id}")
+def delete_recurring(recurring_id: int, db: Session = Depends(get_db)):
+    deleted = db.execute(
+        text('DELETE FROM "recurring_transactions" WHERE id = :id RETURNING id'),
+        {"id": recurring_id}
+    ).fetchone()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Recurring transaction not found")
+    db.commit()
+    return {"message": "Recurring transaction deleted successfully"}
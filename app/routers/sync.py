@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.routers.auth import require_user
+from app.database import get_read_db
+from app.sync import changes_since
+
+router = APIRouter(prefix="/sync", tags=["Sync"], dependencies=[Depends(require_user)])
+
+# delta sync ของแอปที่เก็บสำเนาข้อมูลไว้ในเครื่อง
+# - ครั้งแรก since=0 → ได้ทุกแถว (ทยอยเป็นหน้า ๆ)
+# - ครั้งถัดไปส่ง "next" ของรอบก่อนกลับมา → ได้เฉพาะแถวที่เปลี่ยน/ถูกลบหลังจากนั้น
+# - has_more = true → เรียกต่อทันทีด้วย since = next จนกว่าจะเป็น false แล้วค่อยเก็บ next ไว้
+## ================= ตัวอย่าง JSON =================
+"""
+GET /sync/4?since=1520&limit=500
+{
+  "changes": [
+    {"seq": 1521, "entity": "transaction", "id": 88, "op": "upsert",
+     "data": {"id": 88, "user_id": 4, "tag_id": 4, "value": 150000.3, "date": "2024-06-16", "time": "12:30:00", "note": "",
+              "value_satang": 15000030}},
+    {"seq": 1522, "entity": "tag", "id": 4, "op": "upsert",
+     "data": {"id": 4, "user_id": 4, "tag": "เงินเดือน", "type": "income", "value": 450000.9, "value_satang": 45000090}},
+    {"seq": 1523, "entity": "month", "id": 202406, "op": "upsert",
+     "data": {"id": 12, "user_id": 4, "month": 6, "year": 2024, "income": 450000.9, "expense": 0.0,
+              "income_satang": 45000090, "expense_satang": 0}},
+    {"seq": 1524, "entity": "transaction", "id": 87, "op": "delete", "data": null}
+  ],
+  "next": 1524,
+  "has_more": false
+}
+"""
+@router.get("/{user_id}")
+def read_changes(
+    user_id: int,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_read_db),
+):
+    return changes_since(db, user_id, since, limit)
+# ================================================
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.routers.auth import require_user
+from app.database import get_db, scatter, shards
+from app import cache, config, group_commit, jobs
+
+router = APIRouter(prefix="/system", tags=["System"], dependencies=[Depends(require_user)])
+
+# สถิติ read cache ของ worker นี้ (hit rate / evictions / ...) และ shared cache
+@router.get("/cache")
+def cache_stats():
+    return cache.stats()
+
+
+# group commit ของ worker นี้: จำนวนก้อน / รายการ / ขนาดก้อนเฉลี่ยต่อ shard (GROUP_COMMIT=true)
+@router.get("/group_commit")
+def group_commit_stats():
+    return {
+        "enabled": config.GROUP_COMMIT,
+        "window_ms": config.GROUP_COMMIT_WINDOW_MS,
+        "max_batch": config.GROUP_COMMIT_MAX_BATCH,
+        "shards": group_commit.stats(),
+    }
+
+
+# สรุปคิวงาน: จำนวน / attempts / เวลารอคิวและเวลาทำงาน (avg, p95) ต่อ kind และ status
+# หลาย shard: แยกตาม shard (percentile รวมข้าม shard ไม่ได้)
+@router.get("/jobs")
+def job_stats(hours: float = 24, db: Session = Depends(get_db)):
+    per_shard = scatter(lambda s: jobs.stats(s, hours), read=False, db=db)
+    if len(shards) == 1:
+        return {"hours": hours, "kinds": per_shard[0]}
+    return {"hours": hours, "kinds": [dict(k, shard=i) for i, ks in enumerate(per_shard) for k in ks]}
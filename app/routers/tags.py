@@ -1,12 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.routers.auth import require_user
 
-from app.database import get_db
+from app.database import get_db, get_read_db, record_write
+from app.sync import record_change
+from app.events import emit
+from app.cache import cached
+from app.pagination import PAGE_DEFAULT, PAGE_MAX, keyset_page, ndjson_stream
+from app.ledger import move_tag_months
+from app.money import with_baht
 
 router = APIRouter(prefix="/tags", tags=["Tags"] , dependencies=[Depends(require_user)])
 
+DEFAULT_TAGS = ("รายรับอื่นๆ", "รายจ่ายอื่นๆ")
+
+def _default_for(tag_type: str) -> str:
+    """แท็กพื้นฐานที่รับ transactions ของแท็กที่ถูกลบ (ตาม type)"""
+    return "รายรับอื่นๆ" if tag_type == "income" else "รายจ่ายอื่นๆ"
+
+def _parse_ids(value, name: str) -> list[int]:
+    if not isinstance(value, list) or not value:
+        raise HTTPException(status_code=422, detail=f"{name} must be a non-empty list")
+    try:
+        ids = [int(v) for v in value]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail=f"{name} must contain integers only")
+    return list(dict.fromkeys(ids))  # ตัดซ้ำ คงลำดับ
+
 # ================= ตัวอย่าง JSON =================
 """
 {
@@ -38,27 +59,71 @@ def create_tag(tag_data: dict = Body(...), db: Session = Depends(get_db)):
     ).fetchone():
         raise HTTPException(status_code=400, detail="Tag already exists for this user")
 
-    db.execute(
-        text('INSERT INTO "tags" (user_id, tag, type, value) VALUES (:uid, :t, :ty, :v)'),
+    new_id = db.execute(
+        text('INSERT INTO "tags" (user_id, tag, type, value) VALUES (:uid, :t, :ty, :v) RETURNING id'),
         {"uid": user_id, "t": tag_name, "ty": tag_type, "v": 0}
-    )
+    ).scalar()
+    emit(db, user_id, {"type": "tag", "op": "add", "id": new_id, "tag": tag_name, "tag_type": tag_type})
+    record_change(db, user_id, "tag", new_id)
+    record_write(db, user_id, "tags")
     db.commit()
     return {"message": "Tag created successfully"}
 
+def _tag_row(r) -> dict:
+    return with_baht(r, "value")
+
+# ทีละหน้า (ดู app/pagination.py): ?after_id=&limit=  หรือ ?format=ndjson
+_TAGS_PAGE_SQL = 'SELECT id, user_id, tag, type, value FROM "tags" WHERE id > :after ORDER BY id LIMIT :n'
+
 @router.get("/all/")
-def read_tags(db: Session = Depends(get_db)):
-    rows = db.execute(text('SELECT id, user_id, tag, type, value FROM "tags"')).fetchall()
-    return [dict(r._mapping) for r in rows]
+def read_tags(
+    response: Response,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(PAGE_DEFAULT, ge=1, le=PAGE_MAX),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_read_db),
+):
+    if format == "ndjson":
+        return ndjson_stream(_TAGS_PAGE_SQL, after_id, _tag_row)
+    return keyset_page(db, response, _TAGS_PAGE_SQL, "tags", after_id, limit, _tag_row)
 
 @router.get("/{user_id}")
-def read_tag(user_id: int, db: Session = Depends(get_db)):
-    rows = db.execute(
-        text('SELECT id, user_id, tag, type, value FROM "tags" WHERE user_id = :uid ORDER BY id, tag'),
-        {"uid": user_id}
-    ).fetchall()
-    if not rows:
+def read_tag(user_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        rows = db.execute(
+            text('SELECT id, user_id, tag, type, value FROM "tags" WHERE user_id = :uid ORDER BY id, tag'),
+            {"uid": user_id}
+        ).fetchall()
+        return [_tag_row(r._mapping) for r in rows]
+
+    result = cached(user_id, "tags", "all", load)
+    if not result:
         raise HTTPException(status_code=404, detail="No tags found for this user")
-    return [dict(r._mapping) for r in rows]
+    return result
+
+# ยอดต่อแท็กของเดือนเดียว (กราฟวงกลม) จาก tag_month_results — อ่านช่วงเดียวของ primary key (user, ปี, เดือน)
+@router.get("/{user_id}/breakdown/{year}/{month}")
+def read_tag_breakdown(user_id: int, year: int, month: int, db: Session = Depends(get_read_db)):
+    if not (1 <= month <= 12):
+        raise HTTPException(status_code=400, detail="month must be 1..12")
+
+    def load():
+        rows = db.execute(
+            text('''
+                SELECT m.tag_id, tg.tag, tg.type, m.total AS value, m.tx_count AS count
+                FROM "tag_month_results" m JOIN "tags" tg ON tg.id = m.tag_id
+                WHERE m.user_id = :uid AND m.year = :y AND m.month = :m AND m.tx_count > 0
+                ORDER BY tg.type, m.total DESC
+            '''),
+            {"uid": user_id, "y": year, "m": month}
+        ).fetchall()
+        return [_tag_row(r._mapping) for r in rows]
+
+    tags = cached(user_id, "tag_month_results", (year, month), load)
+    totals = {"income": 0, "expense": 0}
+    for t in tags:
+        totals[t["type"]] = totals.get(t["type"], 0) + t["value_satang"]
+    return {"year": year, "month": month, **with_baht(totals, "income", "expense"), "tags": tags}
 
 # # add value to tag by user_id and tag_id
 # #value = old valuse + new value
@@ -119,9 +184,10 @@ def delete_tag(
     tag_id: int,
     db: Session = Depends(get_db)
 ):
-    # ตรวจสอบว่า tag มีอยู่จริงไหม
+    # ตรวจสอบว่า tag มีอยู่จริงไหม (FOR UPDATE: transaction ที่กำลังเขียนเข้าแท็กนี้ต้อง commit ก่อน
+    # และที่มาทีหลังต้องรอจนลบเสร็จ → ไม่มีรายการไหนถูกย้ายไปแท็กสำรองโดยที่ยอดไม่ตามไป)
     tag = db.execute(
-        text('SELECT id, user_id, tag, type, value FROM "tags" WHERE id = :tid AND user_id = :uid'),
+        text('SELECT id, user_id, tag, type, value FROM "tags" WHERE id = :tid AND user_id = :uid FOR UPDATE'),
         {"tid": tag_id, "uid": user_id}
     ).fetchone()
     if not tag:
@@ -130,7 +196,6 @@ def delete_tag(
     tag_data = tag._mapping
     tag_name = tag_data["tag"]
     tag_type = tag_data["type"]
-    tag_value = tag_data["value"]
 
     # ❗ กันลบแท็กตั้งต้น 2 ตัวแรก (ยังบังคับไว้ที่ backend)
     if tag_name in ("รายจ่ายอื่นๆ", "รายรับอื่นๆ"):
@@ -146,29 +211,245 @@ def delete_tag(
         raise HTTPException(status_code=400, detail=f"Default tag '{default_tag_name}' does not exist for this user")
 
     default_tag_id = default_tag._mapping["id"]
-    default_tag_value = default_tag._mapping["value"]
 
-    # ย้าย transactions ทั้งหมดไปยังแท็กสำรอง
+    # ย้าย transactions ทั้งหมด (รวมรายการประจำและยอดสรุปของปีที่ archive แล้ว) ไปยังแท็กสำรอง
+    moved_ids = [r[0] for r in db.execute(
+        text('UPDATE "transactions" SET tag_id = :new_tid WHERE user_id = :uid AND tag_id = :old_tid RETURNING id'),
+        {"new_tid": default_tag_id, "uid": user_id, "old_tid": tag_id}
+    ).fetchall()]
     db.execute(
-        text('UPDATE "transactions" SET tag_id = :new_tid WHERE user_id = :uid AND tag_id = :old_tid'),
+        text('UPDATE "recurring_transactions" SET tag_id = :new_tid WHERE user_id = :uid AND tag_id = :old_tid'),
         {"new_tid": default_tag_id, "uid": user_id, "old_tid": tag_id}
     )
-
-    # รวม value เข้ากับแท็กสำรอง
-    new_default_value = default_tag_value + tag_value
     db.execute(
-        text('UPDATE "tags" SET value = :v WHERE id = :tid AND user_id = :uid'),
-        {"v": new_default_value, "tid": default_tag_id, "uid": user_id}
+        text('UPDATE "transactions_archive" SET tag_id = :new_tid WHERE user_id = :uid AND tag_id = :old_tid'),
+        {"new_tid": default_tag_id, "uid": user_id, "old_tid": tag_id}
     )
+    move_tag_months(db, user_id, [(tag_id, default_tag_id)])
 
-    # ลบแท็กเป้าหมาย
-    db.execute(
-        text('DELETE FROM "tags" WHERE id = :tid AND user_id = :uid'),
+    # ลบแท็กเป้าหมาย — ยอดที่ต้องย้ายเอาจาก RETURNING ของคำสั่งลบเอง (ไม่ใช่ค่าที่อ่านไว้ตอนต้น)
+    tag_value = db.execute(
+        text('DELETE FROM "tags" WHERE id = :tid AND user_id = :uid RETURNING value'),
         {"tid": tag_id, "uid": user_id}
-    )
+    ).scalar()
+
+    # รวม value เข้ากับแท็กสำรอง (บวกใน SQL → ไม่ทับยอดที่ request อื่นเพิ่งเขียน) แล้วคืนยอดใหม่จาก RETURNING
+    default_row = db.execute(
+        text('UPDATE "tags" SET value = value + :v WHERE id = :tid AND user_id = :uid RETURNING id, value'),
+        {"v": tag_value, "tid": default_tag_id, "uid": user_id}
+    ).fetchone()
+    new_default_value = default_row._mapping["value"]
 
+    emit(db, user_id, {"type": "tag", "op": "delete", "id": tag_id, "moved_to": default_tag_id})
+    emit(db, user_id, {"type": "tag", "id": default_tag_id, "value": new_default_value})
+    record_change(db, user_id, "tag", tag_id, deleted=True)
+    record_change(db, user_id, "tag", default_tag_id)
+    record_change(db, user_id, "transaction", *moved_ids)
+    record_write(db, user_id, "tags", "tag_month_results")
     db.commit()
+    # type เดียวกัน → month_results ไม่เปลี่ยน; client ใช้ "tags" อัปเดตหน้าจอได้เลย
     return {
         "message": "Tag deleted successfully and transactions moved to default tag",
-        "moved_to": default_tag_name
+        "moved_to": default_tag_name,
+        "deleted_tag_id": tag_id,
+        "moved_transactions": len(moved_ids),
+        "tags": [_tag_row(default_row._mapping)],
+        "month_results": [],
+    }
+
+
+
+# ================= ตัวอย่าง JSON =================
+"""
+{
+    "user_id": 1,
+    "source_tag_ids": [5, 6, 7],
+    "target_tag_id": 3
+}
+"""
+# ================================================
+# รวมหลายแท็กเข้าแท็กเดียว (ต้องเป็น type เดียวกัน)
+# ทำแบบ set-based: ย้าย transactions 1 คำสั่ง, รวม value 1 คำสั่ง, ลบ 1 คำสั่ง ใน transaction เดียว
+@router.post("/merge")
+def merge_tags(data: dict = Body(...), db: Session = Depends(get_db)):
+    user_id = data.get("user_id")
+    target_id = data.get("target_tag_id")
+    if not user_id or not target_id:
+        raise HTTPException(status_code=422, detail="user_id, source_tag_ids, target_tag_id are required")
+    source_ids = _parse_ids(data.get("source_tag_ids"), "source_tag_ids")
+    if isinstance(target_id, bool) or not isinstance(target_id, (int, str)):
+        raise HTTPException(status_code=422, detail="target_tag_id must be an integer")
+    try:
+        target_id = int(target_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="target_tag_id must be an integer")
+    if target_id in source_ids:
+        raise HTTPException(status_code=400, detail="target_tag_id cannot be one of source_tag_ids")
+
+    # ล็อกทุกแท็กที่เกี่ยว (เรียงตาม id กัน deadlock) ก่อนย้าย → transaction ที่กำลังเขียนเข้าแท็กต้นทาง
+    # (FOR KEY SHARE) ต้อง commit ก่อนเราเห็น หรือรอจนเราลบเสร็จแล้วได้ 400 — ไม่มีรายการค้างบนแท็กที่ถูกลบ
+    rows = db.execute(
+        text('SELECT id, tag, type FROM "tags" WHERE user_id = :uid AND id = ANY(:ids) ORDER BY id FOR UPDATE'),
+        {"uid": user_id, "ids": source_ids + [target_id]}
+    ).fetchall()
+    found = {r._mapping["id"]: r._mapping for r in rows}
+    if target_id not in found:
+        raise HTTPException(status_code=404, detail="Target tag not found for this user")
+    missing = [i for i in source_ids if i not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tags not found for this user: {missing}")
+    target_type = found[target_id]["type"]
+    if any(found[i]["tag"] in DEFAULT_TAGS for i in source_ids):
+        raise HTTPException(status_code=400, detail="Default tags cannot be deleted")
+    if any(found[i]["type"] != target_type for i in source_ids):
+        raise HTTPException(status_code=400, detail="All tags must have the same type as the target tag")
+
+    try:
+        moved_ids = [r[0] for r in db.execute(
+            text('UPDATE "transactions" SET tag_id = :target WHERE user_id = :uid AND tag_id = ANY(:ids) RETURNING id'),
+            {"target": target_id, "uid": user_id, "ids": source_ids}
+        ).fetchall()]
+        db.execute(
+            text('UPDATE "recurring_transactions" SET tag_id = :target WHERE user_id = :uid AND tag_id = ANY(:ids)'),
+            {"target": target_id, "uid": user_id, "ids": source_ids}
+        )
+        db.execute(
+            text('UPDATE "transactions_archive" SET tag_id = :target WHERE user_id = :uid AND tag_id = ANY(:ids)'),
+            {"target": target_id, "uid": user_id, "ids": source_ids}
+        )
+        move_tag_months(db, user_id, [(sid, target_id) for sid in source_ids])
+        # ยอดที่ย้ายเอาจาก RETURNING ของคำสั่งลบเอง (เหมือน delete_tag)
+        moved_value = sum(r[0] for r in db.execute(
+            text('DELETE FROM "tags" WHERE user_id = :uid AND id = ANY(:ids) RETURNING value'),
+            {"uid": user_id, "ids": source_ids}
+        ).fetchall())
+        new_value = db.execute(
+            text('UPDATE "tags" SET value = value + :v WHERE id = :target AND user_id = :uid RETURNING value'),
+            {"v": moved_value, "target": target_id, "uid": user_id}
+        ).scalar()
+        for sid in source_ids:
+            emit(db, user_id, {"type": "tag", "op": "delete", "id": sid, "moved_to": target_id})
+        emit(db, user_id, {"type": "tag", "id": target_id, "value": new_value})
+        record_change(db, user_id, "tag", *source_ids, deleted=True)
+        record_change(db, user_id, "tag", target_id)
+        record_change(db, user_id, "transaction", *moved_ids)
+        record_write(db, user_id, "tags", "tag_month_results")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return with_baht({
+        "message": "Tags merged successfully",
+        "target_tag_id": target_id,
+        "target_value": new_value,
+        "deleted_tag_ids": source_ids,
+        "moved_transactions": len(moved_ids),
+    }, "target_value")
+
+
+# ================= ตัวอย่าง JSON =================
+"""
+{
+    "user_id": 1,
+    "tag_ids": [5, 6, 7]
+}
+"""
+# ================================================
+# ลบหลายแท็กพร้อมกัน: ธุรกรรมย้ายไปแท็กพื้นฐานตาม type ของแต่ละแท็ก (เหมือน delete_tag)
+@router.delete("/bulk")
+def delete_tags_bulk(data: dict = Body(...), db: Session = Depends(get_db)):
+    user_id = data.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=422, detail="user_id and tag_ids are required")
+    tag_ids = _parse_ids(data.get("tag_ids"), "tag_ids")
+
+    # ดึงแท็กที่จะลบ + แท็กพื้นฐานในคำสั่งเดียว
+    rows = db.execute(
+        # FOR UPDATE ทั้งแท็กที่จะลบและแท็กพื้นฐาน (เรียงตาม id) ก่อนย้าย — เหตุผลเดียวกับ merge_tags
+        text('SELECT id, tag, type FROM "tags" WHERE user_id = :uid AND (id = ANY(:ids) OR tag = ANY(:defaults)) '
+             'ORDER BY id FOR UPDATE'),
+        {"uid": user_id, "ids": tag_ids, "defaults": list(DEFAULT_TAGS)}
+    ).fetchall()
+    by_id = {r._mapping["id"]: r._mapping for r in rows}
+    missing = [i for i in tag_ids if i not in by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tags not found for this user: {missing}")
+    if any(by_id[i]["tag"] in DEFAULT_TAGS for i in tag_ids):
+        raise HTTPException(status_code=400, detail="Default tags cannot be deleted")
+    default_ids = {r._mapping["tag"]: r._mapping["id"] for r in rows if r._mapping["tag"] in DEFAULT_TAGS}
+    for i in tag_ids:
+        need = _default_for(by_id[i]["type"])
+        if need not in default_ids:
+            raise HTTPException(status_code=400, detail=f"Default tag '{need}' does not exist for this user")
+
+    params = {"uid": user_id, "ids": tag_ids}
+    # จับคู่แท็กต้นทาง → แท็กพื้นฐานที่ตรง type
+    default_join = '''
+        JOIN "tags" d ON d.user_id = s.user_id
+                     AND d.tag = CASE WHEN s.type = 'income' THEN 'รายรับอื่นๆ' ELSE 'รายจ่ายอื่นๆ' END
+    '''
+    try:
+        moved_ids = [r[0] for r in db.execute(
+            text(f'''
+                UPDATE "transactions" t
+                SET tag_id = d.id
+                FROM "tags" s {default_join}
+                WHERE s.user_id = :uid AND s.id = ANY(:ids)
+                  AND t.user_id = :uid AND t.tag_id = s.id
+                RETURNING t.id
+            '''), params
+        ).fetchall()]
+        db.execute(
+            text(f'''
+                UPDATE "recurring_transactions" r
+                SET tag_id = d.id
+                FROM "tags" s {default_join}
+                WHERE s.user_id = :uid AND s.id = ANY(:ids)
+                  AND r.user_id = :uid AND r.tag_id = s.id
+            '''), params
+        )
+        db.execute(
+            text(f'''
+                UPDATE "transactions_archive" a
+                SET tag_id = d.id
+                FROM "tags" s {default_join}
+                WHERE s.user_id = :uid AND s.id = ANY(:ids)
+                  AND a.user_id = :uid AND a.tag_id = s.id
+            '''), params
+        )
+        move_tag_months(db, user_id, [(i, default_ids[_default_for(by_id[i]["type"])]) for i in tag_ids])
+        # ยอดที่ย้ายเอาจาก RETURNING ของคำสั่งลบเอง แล้วรวมเข้าแท็กพื้นฐานตาม type
+        totals: dict[int, int] = {}
+        for r in db.execute(
+            text('DELETE FROM "tags" WHERE user_id = :uid AND id = ANY(:ids) RETURNING type, value'), params
+        ).fetchall():
+            did = default_ids[_default_for(r.type)]
+            totals[did] = totals.get(did, 0) + r.value
+        updated_defaults = db.execute(
+            text('''
+                UPDATE "tags" d
+                SET value = d.value + agg.total
+                FROM unnest(CAST(:dids AS bigint[]), CAST(:totals AS bigint[])) AS agg(id, total)
+                WHERE d.user_id = :uid AND d.id = agg.id
+                RETURNING d.id, d.value
+            '''), {"uid": user_id, "dids": list(totals), "totals": list(totals.values())}
+        ).fetchall()
+        for tid in tag_ids:
+            emit(db, user_id, {"type": "tag", "op": "delete", "id": tid})
+        for r in updated_defaults:
+            emit(db, user_id, {"type": "tag", "id": r.id, "value": r.value})
+        record_change(db, user_id, "tag", *tag_ids, deleted=True)
+        record_change(db, user_id, "tag", *[r.id for r in updated_defaults])
+        record_change(db, user_id, "transaction", *moved_ids)
+        record_write(db, user_id, "tags", "tag_month_results")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "message": "Tags deleted successfully and transactions moved to default tags",
+        "deleted_tag_ids": tag_ids,
+        "moved_transactions": len(moved_ids),
     }
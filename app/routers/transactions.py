@@ -1,18 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime
+from app import config
 from app.routers.auth import require_user
-from app.database import get_db
+from app.database import get_db, get_read_db, record_write
+from app.events import emit
+from app.money import amount_from, with_baht
+from app.group_commit import write_transaction
+from app.ledger import MissingTagError, adjust_tag_months
+from app.sync import month_key, record_change
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"]  , dependencies=[Depends(require_user)])
 
+# คอลัมน์ที่ write endpoint คืนให้ client (RETURNING ของคำสั่งเขียนเอง ไม่ต้อง query ซ้ำ)
+_TX_COLUMNS = "id, user_id, tag_id, value, date, time, note"
+_MONTH_COLUMNS = "id, user_id, month, year, income, expense"
+
+
+def _record_changes(db: Session, user_id: int, tx_id: int, tag_rows, month_rows, deleted: bool = False):
+    """จดแถวที่เปลี่ยนลง change feed (GET /sync) จากผล RETURNING ชุดเดียวกับที่ส่งกลับ client"""
+    record_change(db, user_id, "transaction", tx_id, deleted=deleted)
+    record_change(db, user_id, "tag", *[r.id for r in tag_rows])
+    record_change(db, user_id, "month", *[month_key(r.year, r.month) for r in month_rows if r is not None])
+
+
+def _write_result(message: str, row, tag_rows, month_rows) -> dict:
+    """
+    {"message", "transaction": แถวหลังเขียน (หรือแถวที่ถูกลบ), "tags": [{id, value}], "month_results": [...]}
+    client อัปเดตหน้าจอจากผลนี้ได้เลย ไม่ต้องดึง tags / month_results ใหม่
+    """
+    return {
+        "message": message,
+        "transaction": with_baht(row._mapping, "value") if row is not None else None,
+        "tags": [with_baht(r._mapping, "value") for r in tag_rows],
+        "month_results": [with_baht(r._mapping, "income", "expense") for r in month_rows if r is not None],
+    }
+
 ## ================= ตัวอย่าง JSON =================
 """
 {
   "user_id": 4,
   "tag_id": 4,
-  "value": 150000.3,
+  "value": 150000.3,            (บาท หรือส่ง "value_satang": 15000030 แทน)
   "time": "12:30:30",
   "date": "2024-06-16",
   "note": "เงินเดือนฮิอิ"
@@ -22,10 +53,13 @@ router = APIRouter(prefix="/transactions", tags=["Transactions"]  , dependencies
 def create_transaction(data: dict = Body(...), db: Session = Depends(get_db)):
     user_id = data.get("user_id")
     tag_id = data.get("tag_id")
-    value = data.get("value")
     time_str = data.get("time")
     date_str = data.get("date")
     note = data.get("note", "")
+    try:
+        value = amount_from(data)  # สตางค์
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # ตรวจสอบค่าที่จำเป็น
     if not user_id or not tag_id or value is None or not time_str or not date_str:
@@ -52,81 +86,63 @@ def create_transaction(data: dict = Body(...), db: Session = Depends(get_db)):
     if not user_exists:
         raise HTTPException(status_code=400, detail="User ID does not exist")
 
-    # ตรวจสอบว่า tag มีอยู่จริงไหม และเป็นของ user นั้นไหม
+    # ตรวจสอบว่า tag มีอยู่จริงไหม และเป็นของ user นั้นไหม (FOR KEY SHARE: กันแท็กถูกลบ/รวมระหว่างเขียน)
     tag_row = db.execute(
-        text('SELECT id, type FROM "tags" WHERE id = :tid AND user_id = :uid'),
+        text('SELECT id, type FROM "tags" WHERE id = :tid AND user_id = :uid FOR KEY SHARE'),
         {"tid": tag_id, "uid": user_id}
     ).fetchone()
     if not tag_row:
         raise HTTPException(status_code=400, detail="Tag ID does not exist for this user")
     tag_type = tag_row._mapping["type"]
 
+    # group commit: รวมกับรายการอื่นที่เข้ามาพร้อมกันแล้ว commit ทีเดียว (ledger ปรับยอด / emit / change feed ให้)
+    if config.GROUP_COMMIT:
+        try:
+            result = write_transaction(db, {
+                "user_id": user_id, "tag_id": tag_id, "tag_type": tag_type, "value": value,
+                "date": date_obj, "time": time_obj, "note": note,
+            })
+        except MissingTagError:  # แท็กถูกลบ/merge ระหว่างรอเข้าก้อน
+            raise HTTPException(status_code=400, detail="Tag ID does not exist for this user")
+        except FutureTimeoutError:  # รายการอยู่ในคิวแล้ว อาจยัง commit ภายหลังได้ → ห้ามบอกว่าล้มเหลว
+            raise HTTPException(
+                status_code=503,
+                detail="Write is taking longer than expected and may still be applied; check before retrying",
+            )
+        return {"message": "Transaction created successfully", **result}
+
     # insert transaction
-    db.execute(
-        text('INSERT INTO "transactions" (user_id, tag_id, value, time, date, note) VALUES (:uid, :tid, :v, :ti, :d, :n)'),
+    row = db.execute(
+        text(f'INSERT INTO "transactions" (user_id, tag_id, value, time, date, note) VALUES (:uid, :tid, :v, :ti, :d, :n) RETURNING {_TX_COLUMNS}'),
         {"uid": user_id, "tid": tag_id, "v": value, "ti": time_obj, "d": date_obj, "n": note}
-    )
-
-    # update ยอดใน tags
-    if tag_type == "income":
-        db.execute(
-            text('UPDATE "tags" SET value = value + :v WHERE id = :tid AND user_id = :uid'),
-            {"v": value, "tid": tag_id, "uid": user_id}
-        )
-        # update ยอดใน month_results
-        month = date_obj.month
-        year = date_obj.year
-        mr = db.execute(
-            text('SELECT id, income FROM "month_results" WHERE user_id = :uid AND month = :m AND year = :y'),
-            {"uid": user_id, "m": month, "y": year}
-        ).fetchone()
-        if mr:
-            new_income = mr.income + value
-            db.execute(
-                text('UPDATE "month_results" SET income = :val WHERE id = :id'),
-                {"val": new_income, "id": mr.id}
-            )
-        else:
-            # ถ้าไม่มี record ใน month_results ให้สร้างใหม่
-            db.execute(
-                text('INSERT INTO "month_results" (user_id, month, year, income, expense) VALUES (:uid, :m, :y, :inc, 0)'),
-                {"uid": user_id, "m": month, "y": year, "inc": value}
-            )
-    else:  # expense
-        db.execute(
-            text('UPDATE "tags" SET value = value + :v WHERE id = :tid AND user_id = :uid'),
-            {"v": value, "tid": tag_id, "uid": user_id}
-        )
-        # update ยอดใน month_results
-        month = date_obj.month
-        year = date_obj.year
-        mr = db.execute(
-            text('SELECT id, expense FROM "month_results" WHERE user_id = :uid AND month = :m AND year = :y'),
-            {"uid": user_id, "m": month, "y": year}
-        ).fetchone()
-        if mr:
-            new_expense = mr.expense + value
-            db.execute(
-                text('UPDATE "month_results" SET expense = :val WHERE id = :id'),
-                {"val": new_expense, "id": mr.id}
-            )
-        else:
-            # ถ้าไม่มี record ใน month_results ให้สร้างใหม่
-            db.execute(
-                text('INSERT INTO "month_results" (user_id, month, year, income, expense) VALUES (:uid, :m, :y, 0, :exp)'),
-                {"uid": user_id, "m": month, "y": year, "exp": value}
-            )
+    ).fetchone()
+    new_id = row._mapping["id"]
+
+    # update ยอดใน tags และ month_results (จำนวนเต็มสตางค์ → บวกใน SQL ตรง ๆ ได้เลย)
+    tag_rows = db.execute(
+        text('UPDATE "tags" SET value = value + :v WHERE id = :tid AND user_id = :uid RETURNING id, value'),
+        {"v": value, "tid": tag_id, "uid": user_id}
+    ).fetchall()
+    field = "income" if tag_type == "income" else "expense"
+    month_row = _adjust_month_results(db, user_id, date_obj.month, date_obj.year, field, value)
+    adjust_tag_months(db, {(user_id, tag_id, date_obj.year, date_obj.month): [value, 1]})
+    emit(db, user_id, {"type": "transaction", "op": "add", "id": new_id})
+    emit(db, user_id, {"type": "tag", "id": tag_id, "delta": value})
+    emit(db, user_id, {"type": "month", "year": date_obj.year, "month": date_obj.month, field: value})
+    _record_changes(db, user_id, new_id, tag_rows, [month_row])
+    record_write(db, user_id, "tags", "month_results", "tag_month_results")
     db.commit()
-    return {"message": "Transaction created successfully"}
+    return _write_result("Transaction created successfully", row, tag_rows, [month_row])
 # ================================================
 
 
 #if delete transaction by transaction_id
 @router.delete("/delete/{transaction_id}")
 def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    # ตรวจสอบว่า transaction มีอยู่จริงไหม
+    # ตรวจสอบว่า transaction มีอยู่จริงไหม (FOR UPDATE: request ที่ลบ/แก้แถวเดียวกันพร้อมกันต้องรอ
+    # แล้วอ่านค่าหลัง commit ของอีกฝั่ง → ไม่หักยอดซ้ำจาก value เก่า)
     tr = db.execute(
-        text('SELECT id, user_id, tag_id, value, date FROM "transactions" WHERE id = :tid'),
+        text('SELECT id, user_id, tag_id, value, date FROM "transactions" WHERE id = :tid FOR UPDATE'),
         {"tid": transaction_id}
     ).fetchone()
     if not tr:
@@ -150,99 +166,104 @@ def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
     tag_type = tag_row._mapping["type"]
 
     # ลบ transaction
-    db.execute(
-        text('DELETE FROM "transactions" WHERE id = :tid'),
-        {"tid": transaction_id}
-    )
+    row = db.execute(
+        text(f'DELETE FROM "transactions" WHERE id = :tid AND date = :d RETURNING {_TX_COLUMNS}'),
+        {"tid": transaction_id, "d": date_obj}
+    ).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
 
     # ลดยอดใน tags
-    db.execute(
-        text('UPDATE "tags" SET value = value - :v WHERE id = :tid AND user_id = :uid'),
+    tag_rows = db.execute(
+        text('UPDATE "tags" SET value = value - :v WHERE id = :tid AND user_id = :uid RETURNING id, value'),
         {"v": value, "tid": tag_id, "uid": user_id}
-    )
+    ).fetchall()
 
     # ลดยอดใน month_results
-    mr = db.execute(
-        text('SELECT id, income, expense FROM "month_results" WHERE user_id = :uid AND month = :m AND year = :y'),
-        {"uid": user_id, "m": month, "y": year}
-    ).fetchone()
-    if mr:
-        if tag_type == "income":
-            new_income = mr.income - value
-            if new_income < 0:
-                new_income = 0
-            db.execute(
-                text('UPDATE "month_results" SET income = :val WHERE id = :id'),
-                {"val": new_income, "id": mr.id}
-            )
-        else:  # expense
-            new_expense = mr.expense - value
-            if new_expense < 0:
-                new_expense = 0
-            db.execute(
-                text('UPDATE "month_results" SET expense = :val WHERE id = :id'),
-                {"val": new_expense, "id": mr.id}
-            )
+    field = "income" if tag_type == "income" else "expense"
+    month_row = _adjust_month_results(db, user_id, month, year, field, -value)
+    adjust_tag_months(db, {(user_id, tag_id, year, month): [-value, -1]})
+    emit(db, user_id, {"type": "transaction", "op": "delete", "id": transaction_id})
+    emit(db, user_id, {"type": "tag", "id": tag_id, "delta": -value})
+    emit(db, user_id, {"type": "month", "year": year, "month": month, field: -value})
+    _record_changes(db, user_id, transaction_id, tag_rows, [month_row], deleted=True)
+    record_write(db, user_id, "tags", "month_results", "tag_month_results")
     db.commit()
-    return {"message": "Transaction deleted successfully"}
+    return _write_result("Transaction deleted successfully", row, tag_rows, [month_row])
 # ================================================
 
 
 #ดู transaction ทั้งหมดของ user_id โดย join tags เพื่อดู type ของ tag  เเละชื่อ tag 
+# ?year=2024 หรือ ?since=2024-06-01 → จำกัดช่วงวันที่ (อ่านเฉพาะ partition ของปีที่เกี่ยวข้อง)
+# ปีที่ archive แล้วไม่มีรายการเดี่ยว ดูยอดสรุปได้ที่ /transactions/{user_id}/archive
 @router.get("/{user_id}")
-def get_transactions_by_user(user_id: int, db: Session = Depends(get_db)):
+def get_transactions_by_user(
+    user_id: int,
+    year: int | None = Query(None, ge=1900, le=9999),
+    since: date | None = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    where = ["t.user_id = :uid"]
+    params = {"uid": user_id}
+    # เงื่อนไขเป็นช่วงของคอลัมน์ date ตรง ๆ (ไม่ใช้ EXTRACT) เพื่อให้ planner ตัด partition ได้
+    if year is not None:
+        where.append("t.date >= :y_lo AND t.date <= :y_hi")
+        params.update({"y_lo": date(year, 1, 1), "y_hi": date(year, 12, 31)})  # ไม่ใช้ year + 1 (ปี 9999 → ValueError)
+    if since is not None:
+        where.append("t.date >= :since")
+        params["since"] = since
     transactions = db.execute(
-        text('SELECT t.id, t.tag_id, t.value, t.date, t.time, tg.type, tg.tag , t.note FROM "transactions" t JOIN "tags" tg ON t.tag_id = tg.id WHERE t.user_id = :uid ORDER BY t.date DESC, t.time DESC'),
-        {"uid": user_id}
+        text(f'SELECT t.id, t.tag_id, t.value, t.date, t.time, tg.type, tg.tag , t.note FROM "transactions" t JOIN "tags" tg ON t.tag_id = tg.id WHERE {" AND ".join(where)} ORDER BY t.date DESC, t.time DESC'),
+        params
     ).fetchall()
-    result = [dict(row._mapping) for row in transactions]
+    result = [with_baht(row._mapping, "value") for row in transactions]
     return {"transactions": result}
 
 
-def _adjust_month_results(db: Session, user_id: int, month: int, year: int, field: str, delta: int | float):
+#ยอดสรุปต่อแท็กต่อเดือนของปีที่ archive แล้ว (python -m app.partitions archive <ปี>)
+@router.get("/{user_id}/archive")
+def get_archived_summary(user_id: int, year: int | None = Query(None), db: Session = Depends(get_read_db)):
+    rows = db.execute(
+        text('''
+            SELECT a.year, a.month, a.tag_id, tg.type, tg.tag, SUM(a.total) AS value, SUM(a.tx_count) AS count
+            FROM "transactions_archive" a JOIN "tags" tg ON tg.id = a.tag_id
+            WHERE a.user_id = :uid AND (CAST(:year AS int) IS NULL OR a.year = :year)
+            GROUP BY a.year, a.month, a.tag_id, tg.type, tg.tag
+            ORDER BY a.year DESC, a.month DESC, a.tag_id
+        '''),
+        {"uid": user_id, "year": year}
+    ).fetchall()
+    return {"archive": [with_baht(r._mapping, "value") for r in rows]}
+
+
+def _adjust_month_results(db: Session, user_id: int, month: int, year: int, field: str, delta: int):
     """
     field: 'income' หรือ 'expense'
-    delta: จำนวนที่ต้อง + หรือ - (อาจติดลบ)
-    ถ้าไม่มีแถว month_results มาก่อนและ delta > 0 ให้ insert
-    ถ้าไม่มีแถวและ delta <= 0 ข้ามได้ (ไม่มีอะไรให้หัก)
-    ป้องกันค่าติดลบโดย clamp เป็น 0
+    delta: สตางค์ที่ต้อง + หรือ - (อาจติดลบ)
+    upsert คำสั่งเดียวแบบ atomic (ไม่ต้องอ่านก่อน และไม่ต้อง clamp เพราะยอดเป็นจำนวนเต็มที่ตรงเป๊ะ)
+    คืนแถว month_results หลังปรับ (จาก RETURNING)
     """
     if field not in ("income", "expense"):
         raise ValueError("field must be 'income' or 'expense'")
-
-    mr = db.execute(
-        text('SELECT id, income, expense FROM "month_results" WHERE user_id = :uid AND month = :m AND year = :y'),
-        {"uid": user_id, "m": month, "y": year}
+    other = "expense" if field == "income" else "income"
+
+    return db.execute(
+        text(f'''
+            INSERT INTO "month_results" (user_id, month, year, {field}, {other})
+            VALUES (:uid, :m, :y, :d, 0)
+            ON CONFLICT (user_id, year, month) DO UPDATE
+            SET {field} = "month_results".{field} + EXCLUDED.{field}
+            RETURNING {_MONTH_COLUMNS}
+        '''),
+        {"uid": user_id, "m": month, "y": year, "d": delta}
     ).fetchone()
 
-    if mr:
-        mr_map = mr._mapping
-        current_val = mr_map[field] or 0
-        new_val = current_val + (delta or 0)
-        if new_val < 0:
-            new_val = 0
-        db.execute(
-            text(f'UPDATE "month_results" SET {field} = :val WHERE id = :id'),
-            {"val": new_val, "id": mr_map["id"]}
-        )
-    else:
-        # ยังไม่มีสรุปเดือนนี้
-        if delta and delta > 0:
-            if field == "income":
-                db.execute(
-                    text('INSERT INTO "month_results" (user_id, month, year, income, expense) VALUES (:uid, :m, :y, :inc, 0)'),
-                    {"uid": user_id, "m": month, "y": year, "inc": delta}
-                )
-            else:
-                db.execute(
-                    text('INSERT INTO "month_results" (user_id, month, year, income, expense) VALUES (:uid, :m, :y, 0, :exp)'),
-                    {"uid": user_id, "m": month, "y": year, "exp": delta}
-                )
-        # ถ้า delta <= 0 ไม่ต้องสร้างแถวใหม่ (เพื่อไม่ให้ได้ค่าติดลบโดยไม่มีฐาน)
-
 @router.put("/update/{transaction_id}")
 def update_transaction(transaction_id: int, data: dict = Body(...), db: Session = Depends(get_db)):
-    value = data.get("value")
+    try:
+        value = amount_from(data)  # สตางค์
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     time_str = data.get("time")
     date_str = data.get("date")
     note = data.get("note")
@@ -265,9 +286,9 @@ def update_transaction(transaction_id: int, data: dict = Body(...), db: Session
         except ValueError:
             raise HTTPException(status_code=400, detail="date must be in YYYY-MM-DD format")
 
-    # ดึงข้อมูล transaction เดิม
+    # ดึงข้อมูล transaction เดิม (ล็อกแถวไว้ → update พร้อมกันคำนวณ diff จากค่าล่าสุด ไม่ใช่ old_value ชุดเดียวกัน)
     tr = db.execute(
-        text('SELECT id, user_id, tag_id, value, date FROM "transactions" WHERE id = :tid'),
+        text('SELECT id, user_id, tag_id, value, date FROM "transactions" WHERE id = :tid FOR UPDATE'),
         {"tid": transaction_id}
     ).fetchone()
     if not tr:
@@ -299,7 +320,7 @@ def update_transaction(transaction_id: int, data: dict = Body(...), db: Session
     # หา type ของแท็กใหม่
     if new_tag_id != old_tag_id:
         new_tag_row = db.execute(
-            text('SELECT type FROM "tags" WHERE id = :tid AND user_id = :uid'),
+            text('SELECT type FROM "tags" WHERE id = :tid AND user_id = :uid FOR KEY SHARE'),
             {"tid": new_tag_id, "uid": user_id}
         ).fetchone()
         if not new_tag_row:
@@ -308,38 +329,43 @@ def update_transaction(transaction_id: int, data: dict = Body(...), db: Session
     else:
         new_tag_type = old_tag_type
 
-    # 1) อัปเดตตัว transaction เอง
-    db.execute(
-        text('''
+    # 1) อัปเดตตัว transaction เอง (date เดิมอยู่ใน WHERE → ไปที่ partition เดียว; ถ้าเปลี่ยนปี แถวย้าย partition เอง)
+    row = db.execute(
+        text(f'''
             UPDATE "transactions"
             SET tag_id = :new_tid,
                 value = :v,
                 time = COALESCE(:ti, time),
                 date = COALESCE(:d, date),
                 note = COALESCE(:n, note)
-            WHERE id = :tid
+            WHERE id = :tid AND date = :old_d
+            RETURNING {_TX_COLUMNS}
         '''),
-        {"new_tid": new_tag_id, "v": new_value, "ti": time_obj, "d": new_date, "n": note, "tid": transaction_id}
-    )
+        {"new_tid": new_tag_id, "v": new_value, "ti": time_obj, "d": new_date, "n": note,
+         "tid": transaction_id, "old_d": old_date}
+    ).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
 
     # 2) อัปเดตตาราง tags (ยอดรวมของแท็ก ไม่ขึ้นกับเดือน)
+    tag_rows = []
     if old_tag_id == new_tag_id:
         diff = (new_value or 0) - (old_value or 0)
         if diff != 0:
-            db.execute(
-                text('UPDATE "tags" SET value = value + :diff WHERE id = :tid AND user_id = :uid'),
+            tag_rows += db.execute(
+                text('UPDATE "tags" SET value = value + :diff WHERE id = :tid AND user_id = :uid RETURNING id, value'),
                 {"diff": diff, "tid": old_tag_id, "uid": user_id}
-            )
+            ).fetchall()
     else:
         # หักออกจากแท็กเก่าแล้วบวกให้แท็กใหม่
-        db.execute(
-            text('UPDATE "tags" SET value = GREATEST(value - :v, 0) WHERE id = :tid AND user_id = :uid'),
+        tag_rows += db.execute(
+            text('UPDATE "tags" SET value = value - :v WHERE id = :tid AND user_id = :uid RETURNING id, value'),
             {"v": old_value, "tid": old_tag_id, "uid": user_id}
-        )
-        db.execute(
-            text('UPDATE "tags" SET value = value + :v WHERE id = :tid AND user_id = :uid'),
+        ).fetchall()
+        tag_rows += db.execute(
+            text('UPDATE "tags" SET value = value + :v WHERE id = :tid AND user_id = :uid RETURNING id, value'),
             {"v": new_value, "tid": new_tag_id, "uid": user_id}
-        )
+        ).fetchall()
 
     # 3) อัปเดต month_results ให้ถูก bucket (เดือน/ปี + income/expense)
     old_field = "income" if old_tag_type == "income" else "expense"
@@ -347,17 +373,40 @@ def update_transaction(transaction_id: int, data: dict = Body(...), db: Session
 
     same_bucket = (old_month == new_month) and (old_year == new_year) and (old_field == new_field)
 
+    month_rows = []
     if same_bucket:
         # เดิมกับใหม่อยู่ bucket เดียวกัน → ปรับด้วย diff พอ
         diff = (new_value or 0) - (old_value or 0)
         if diff != 0:
-            _adjust_month_results(db, user_id, old_month, old_year, old_field, diff)
+            month_rows.append(_adjust_month_results(db, user_id, old_month, old_year, old_field, diff))
     else:
         # คนละ bucket → หักออกที่เก่า และบวกเข้า bucket ใหม่
         if old_value:
-            _adjust_month_results(db, user_id, old_month, old_year, old_field, -old_value)
+            month_rows.append(_adjust_month_results(db, user_id, old_month, old_year, old_field, -old_value))
         if new_value:
-            _adjust_month_results(db, user_id, new_month, new_year, new_field, +new_value)
+            month_rows.append(_adjust_month_results(db, user_id, new_month, new_year, new_field, +new_value))
+
+    # 4) อัปเดต tag_month_results (แท็ก/เดือนเดิม −, แท็ก/เดือนใหม่ +; key เดียวกันจะรวมเป็น diff)
+    tag_month_delta = {(user_id, old_tag_id, old_year, old_month): [-old_value, -1]}
+    cur = tag_month_delta.setdefault((user_id, new_tag_id, new_year, new_month), [0, 0])
+    cur[0] += new_value
+    cur[1] += 1
+    adjust_tag_months(db, tag_month_delta)
 
+    emit(db, user_id, {"type": "transaction", "op": "update", "id": transaction_id})
+    if old_tag_id == new_tag_id:
+        if new_value != old_value:
+            emit(db, user_id, {"type": "tag", "id": old_tag_id, "delta": new_value - old_value})
+    else:
+        emit(db, user_id, {"type": "tag", "id": old_tag_id, "delta": -old_value})
+        emit(db, user_id, {"type": "tag", "id": new_tag_id, "delta": new_value})
+    if same_bucket:
+        if new_value != old_value:
+            emit(db, user_id, {"type": "month", "year": old_year, "month": old_month, old_field: new_value - old_value})
+    else:
+        emit(db, user_id, {"type": "month", "year": old_year, "month": old_month, old_field: -old_value})
+        emit(db, user_id, {"type": "month", "year": new_year, "month": new_month, new_field: new_value})
+    _record_changes(db, user_id, transaction_id, tag_rows, month_rows)
+    record_write(db, user_id, "tags", "month_results", "tag_month_results")
     db.commit()
-    return {"message": "Transaction updated successfully"}
\ No newline at end of file
+    return _write_result("Transaction updated successfully", row, tag_rows, month_rows)
\ No newline at end of file
@@ -1,12 +1,19 @@
 # app/routers/users.py
-from fastapi import APIRouter, Depends, HTTPException, Body, status
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import bcrypt
 import logging
 import re
-from app.routers.auth import require_user
-from app.database import get_db
+from app import config, jobs
+from app.routers.auth import require_admin, require_user
+from app.database import (
+    ShardMoving, assign_new_users, get_db, get_read_db, pick_new_user_shard, record_write, scatter, session_for,
+    shards,
+)
+from app.security import hash_passwords
+from app.sync import record_change, record_user_changes
+from app.pagination import PAGE_DEFAULT, PAGE_MAX, keyset_page, ndjson_stream
 
 log = logging.getLogger(__name__)
 
@@ -41,6 +48,11 @@ def _validate_new_password(pw: str):
     if not pw or len(pw) < 8:
         raise HTTPException(status_code=422, detail="password must be at least 8 characters")
 
+def _taken(results: list) -> tuple[set, set]:
+    """รวมผล (username, email) ที่มีอยู่แล้วจากทุก shard → (usernames, emails)"""
+    rows = [r._mapping for rs in results for r in rs]
+    return {r["username"] for r in rows}, {r["email"] for r in rows}
+
 # =======================================================
 # สมัครสมาชิก (ไม่ต้อง auth)
 # ================= ตัวอย่าง JSON สมัคร =================
@@ -53,7 +65,7 @@ def _validate_new_password(pw: str):
 """
 # =======================================================
 @router.post("/add/", status_code=status.HTTP_201_CREATED)
-def create_user(user: dict = Body(...), db: Session = Depends(get_db)):
+def create_user(user: dict = Body(...)):
     username = (user.get("username") or "").strip()
     email = (user.get("email") or "").strip()
     password = user.get("password") or ""
@@ -65,14 +77,20 @@ def create_user(user: dict = Body(...), db: Session = Depends(get_db)):
     _validate_email(email)
     _validate_new_password(password)
 
-    # duplicate checks
-    if db.execute(text('SELECT 1 FROM "users" WHERE username = :u'), {"u": username}).fetchone():
+    # duplicate checks (ทุก shard)
+    taken = _taken(scatter(lambda s: s.execute(
+        text('SELECT username, email FROM "users" WHERE username = :u OR email = :e'),
+        {"u": username, "e": email}
+    ).fetchall(), read=False))
+    if username in taken[0]:
         raise HTTPException(status_code=400, detail="Username already registered")
-    if db.execute(text('SELECT 1 FROM "users" WHERE email = :e'), {"e": email}).fetchone():
+    if email in taken[1]:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
+    shard = pick_new_user_shard()
+    db = shards[shard].Session()
     try:
         # insert user
         row = db.execute(
@@ -80,6 +98,7 @@ def create_user(user: dict = Body(...), db: Session = Depends(get_db)):
             {"u": username, "p": hashed_password, "e": email}
         ).fetchone()
         uid = row._mapping["id"]
+        assign_new_users(shard, [uid])
 
         # seed แท็กเริ่มต้น (กันซ้ำด้วย NOT EXISTS)
         db.execute(
@@ -96,6 +115,7 @@ def create_user(user: dict = Body(...), db: Session = Depends(get_db)):
                 WHERE NOT EXISTS (SELECT 1 FROM "tags" WHERE user_id = :uid AND tag = :t)
             '''), {"uid": uid, "t": "รายจ่ายอื่นๆ", "ty": "expense"}
         )
+        record_user_changes(db, uid, "tag")
 
         db.commit()
         return {"message": "User created successfully", "user_id": uid}
@@ -104,19 +124,158 @@ def create_user(user: dict = Body(...), db: Session = Depends(get_db)):
         db.rollback()
         log.exception("Failed to create user and default tags: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create user and default tags")
+    finally:
+        db.close()
+
+# =======================================================
+# สร้าง user ทีละหลายคน (admin เท่านั้น)
+# - ตรวจรูปแบบทีละคน, ตรวจซ้ำกับในฐานข้อมูลด้วย query เดียว (= ANY)
+# - hash รหัสผ่านพร้อมกันหลาย process, INSERT users หลายแถวครั้งเดียว, seed แท็กเริ่มต้นของทุกคนครั้งเดียว
+# - คนที่ไม่ผ่านจะไม่ทำให้ทั้งชุดล้ม: คืนผลแยกทีละคนตามลำดับที่ส่งมา
+# ================= ตัวอย่าง JSON =================
+"""
+{
+    "users": [
+        {"username": "somchai", "password": "S0mchai@2024", "email": "somchai@example.com"},
+        {"username": "somsri", "password": "S0msri@2024", "email": "somsri@example.com"}
+    ]
+}
+"""
+# =======================================================
+DEFAULT_TAGS = (("รายรับอื่นๆ", "income"), ("รายจ่ายอื่นๆ", "expense"))
+
+@router.post("/bulk/", dependencies=[Depends(require_admin)])
+def create_users_bulk(data: dict = Body(...)):
+    items = data.get("users")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=422, detail="users must be a non-empty list")
+    if len(items) > config.BULK_PROVISION_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {config.BULK_PROVISION_MAX} users per request")
+
+    results: list[dict] = []
+    pending: list[int] = []  # index ของคนที่ผ่านการตรวจรูปแบบ
+    seen_u, seen_e = set(), set()
+    for i, u in enumerate(items):
+        u = u if isinstance(u, dict) else {}
+        username = (u.get("username") or "").strip()
+        email = (u.get("email") or "").strip()
+        password = u.get("password") or ""
+        res = {"index": i, "username": username, "email": email}
+        results.append(res)
+        try:
+            if not username or not email or not password:
+                raise HTTPException(status_code=422, detail="username, email, password are required")
+            _validate_username(username)
+            _validate_email(email)
+            _validate_new_password(password)
+        except HTTPException as e:
+            res.update(status="error", detail=e.detail)
+            continue
+        if username in seen_u or email in seen_e:
+            res.update(status="error", detail="Duplicate username or email in request")
+            continue
+        seen_u.add(username)
+        seen_e.add(email)
+        res["_password"] = password
+        pending.append(i)
+
+    # duplicate checks (query เดียวสำหรับทั้งชุด ต่อ shard)
+    if pending:
+        params = {"us": [results[i]["username"] for i in pending], "es": [results[i]["email"] for i in pending]}
+        taken_u, taken_e = _taken(scatter(lambda s: s.execute(
+            text('SELECT username, email FROM "users" WHERE username = ANY(:us) OR email = ANY(:es)'), params
+        ).fetchall(), read=False))
+        ok = []
+        for i in pending:
+            r = results[i]
+            if r["username"] in taken_u:
+                r.update(status="error", detail="Username already registered")
+            elif r["email"] in taken_e:
+                r.update(status="error", detail="Email already registered")
+            else:
+                ok.append(i)
+        pending = ok
+
+    if pending:
+        hashes = hash_passwords([results[i].pop("_password") for i in pending])
+        # ทั้งชุดลง shard เดียว (INSERT ครั้งเดียว)
+        # ON CONFLICT DO NOTHING: สมัครพร้อมกันแล้วชิง username/email ไปหลังการตรวจด้านบน → แถวนั้นไม่ถูก insert
+        # (คนอื่นในชุดยังสร้างได้ตามปกติ) แล้วรายงานเป็น already registered แทนที่จะล้มทั้งชุดเป็น 500
+        shard = pick_new_user_shard()
+        db = shards[shard].Session()
+        try:
+            rows = db.execute(
+                text('''
+                    INSERT INTO "users" (username, password, email)
+                    SELECT * FROM unnest(CAST(:us AS text[]), CAST(:ps AS text[]), CAST(:es AS text[]))
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, username
+                '''),
+                {
+                    "us": [results[i]["username"] for i in pending],
+                    "ps": hashes,
+                    "es": [results[i]["email"] for i in pending],
+                }
+            ).fetchall()
+            ids = {r._mapping["username"]: r._mapping["id"] for r in rows}
+            assign_new_users(shard, list(ids.values()))
+            tag_rows = db.execute(
+                text('''
+                    INSERT INTO "tags" (user_id, tag, type, value)
+                    SELECT u.id, d.tag, d.type, 0
+                    FROM unnest(CAST(:ids AS bigint[])) AS u(id)
+                    CROSS JOIN unnest(CAST(:tags AS text[]), CAST(:types AS text[])) AS d(tag, type)
+                    RETURNING user_id, id
+                '''),
+                {
+                    "ids": list(ids.values()),
+                    "tags": [t for t, _ in DEFAULT_TAGS],
+                    "types": [ty for _, ty in DEFAULT_TAGS],
+                }
+            ).fetchall()
+            for r in tag_rows:
+                record_change(db, r.user_id, "tag", r.id)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.exception("Failed to bulk create users: %s", e)
+            raise HTTPException(status_code=500, detail="Failed to create users and default tags")
+        finally:
+            db.close()
+        for i in pending:
+            uid = ids.get(results[i]["username"])
+            if uid is None:
+                results[i].update(status="error", detail="Username or email already registered")
+            else:
+                results[i].update(status="created", user_id=uid)
+
+    for r in results:
+        r.pop("_password", None)
+    created = sum(1 for r in results if r["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
 
 # =======================================================
 # อ่าน users (ต้องล็อกอิน)
 # =======================================================
+# ทีละหน้า (ดู app/pagination.py): ?after_id=&limit=  หรือ ?format=ndjson
+_USERS_PAGE_SQL = 'SELECT id, username, email FROM "users" WHERE id > :after ORDER BY id LIMIT :n'
+
 @router.get("/all/", dependencies=[Depends(require_user)])
-def read_users(db: Session = Depends(get_db)):
-    rows = db.execute(text('SELECT id, username, email FROM "users"')).fetchall()
-    return [dict(r._mapping) for r in rows]
+def read_users(
+    response: Response,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(PAGE_DEFAULT, ge=1, le=PAGE_MAX),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_read_db),
+):
+    if format == "ndjson":
+        return ndjson_stream(_USERS_PAGE_SQL, after_id)
+    return keyset_page(db, response, _USERS_PAGE_SQL, "users", after_id, limit)
 
 @router.get("/{user_id}", dependencies=[Depends(require_user)])
-def read_user(user_id: int, db: Session = Depends(get_db)):
+def read_user(user_id: int, db: Session = Depends(get_read_db)):
     row = db.execute(
-        text('SELECT id, username, email FROM "users" WHERE id = :id'),
+        text('SELECT id, username, email FROM "users" WHERE id = :id AND deleted_at IS NULL'),
         {"id": user_id}
     ).fetchone()
     if not row:
@@ -157,6 +316,7 @@ def change_my_password(
 
     try:
         db.execute(text('UPDATE "users" SET password = :p WHERE id = :id'), {"p": new_hash, "id": uid})
+        record_write(db, uid, "user")
         db.commit()
         return {"message": "Password updated"}
     except Exception as e:
@@ -188,15 +348,16 @@ def change_my_username(
     if not bcrypt.checkpw(password.encode("utf-8"), row_pwd._mapping["password"].encode("utf-8")):
         raise HTTPException(status_code=400, detail="password is incorrect")
 
-    dup = db.execute(
+    dup = any(scatter(lambda s: s.execute(
         text('SELECT 1 FROM "users" WHERE username = :u AND id <> :id'),
         {"u": new_username, "id": uid}
-    ).fetchone()
+    ).fetchone(), read=False, db=db))
     if dup:
         raise HTTPException(status_code=400, detail="Username already taken")
 
     try:
         db.execute(text('UPDATE "users" SET username = :u WHERE id = :id'), {"u": new_username, "id": uid})
+        record_write(db, uid, "user")
         db.commit()
         return {"message": "Username updated", "username": new_username}
     except Exception as e:
@@ -228,18 +389,82 @@ def change_my_email(
     if not bcrypt.checkpw(password.encode("utf-8"), row_pwd._mapping["password"].encode("utf-8")):
         raise HTTPException(status_code=400, detail="password is incorrect")
 
-    dup = db.execute(
+    dup = any(scatter(lambda s: s.execute(
         text('SELECT 1 FROM "users" WHERE email = :e AND id <> :id'),
         {"e": new_email, "id": uid}
-    ).fetchone()
+    ).fetchone(), read=False, db=db))
     if dup:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     try:
         db.execute(text('UPDATE "users" SET email = :e WHERE id = :id'), {"e": new_email, "id": uid})
+        record_write(db, uid, "user")
         db.commit()
         return {"message": "Email updated", "email": new_email}
     except Exception as e:
         db.rollback()
         log.exception("Failed to change email: %s", e)
         raise HTTPException(status_code=500, detail="Failed to change email")
+
+
+# =======================================================
+# ลบบัญชี: ตั้ง deleted_at (login / token ใช้ไม่ได้ทันที) แล้วให้ job "account.delete" ทยอยลบข้อมูล
+# ตอบ 202 {"job_id"} → ดูความคืบหน้าที่ GET /jobs/{job_id} (progress: done / total)
+# ขอซ้ำระหว่างที่ยังลบไม่เสร็จ → ได้ job เดิม
+# =======================================================
+def _schedule_deletion(db: Session, uid: int) -> dict:
+    existing = db.execute(
+        text('''
+            SELECT id FROM "jobs"
+            WHERE user_id = :uid AND kind = 'account.delete' AND status IN ('queued', 'running')
+            ORDER BY id LIMIT 1
+        '''),
+        {"uid": uid}
+    ).scalar()
+    if existing:
+        return {"job_id": existing, "status": "queued"}
+    try:
+        db.execute(text('UPDATE "users" SET deleted_at = COALESCE(deleted_at, now()) WHERE id = :id'), {"id": uid})
+        # หยุดรายการประจำทันที (scheduler ไม่สร้าง transaction ใหม่ระหว่างรอลบ)
+        db.execute(text('UPDATE "recurring_transactions" SET active = false WHERE user_id = :id'), {"id": uid})
+        job_id = jobs.enqueue(db, "account.delete", user_id=uid)
+        record_write(db, uid, "user")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        log.exception("Failed to schedule account deletion: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to schedule account deletion")
+    return {"job_id": job_id, "status": "queued"}
+
+
+# Body: { "password": "..." }
+@router.delete("/me", status_code=status.HTTP_202_ACCEPTED)
+def delete_my_account(
+    payload: dict = Body(...),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_user),
+):
+    uid = _uid_of(current_user)
+    password = payload.get("password")
+    if not password:
+        raise HTTPException(status_code=422, detail="password is required")
+
+    row = db.execute(text('SELECT password FROM "users" WHERE id = :id'), {"id": uid}).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not bcrypt.checkpw(password.encode("utf-8"), row._mapping["password"].encode("utf-8")):
+        raise HTTPException(status_code=400, detail="password is incorrect")
+    return _schedule_deletion(db, uid)
+
+
+# ผู้ดูแลลบบัญชีของคนอื่น (ใช้ session ของ shard ของ user เป้าหมาย ไม่ใช่ของผู้ดูแล)
+@router.delete("/{user_id}", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+def delete_user(user_id: int):
+    try:
+        db = session_for(user_id)
+    except ShardMoving:
+        raise HTTPException(status_code=503, detail="Account is being moved, retry shortly")
+    with db:
+        if not db.execute(text('SELECT 1 FROM "users" WHERE id = :id'), {"id": user_id}).fetchone():
+            raise HTTPException(status_code=404, detail="User not found")
+        return _schedule_deletion(db, user_id)
@@ -0,0 +1,154 @@
+# app/scheduler.py
+# สร้าง transaction จาก recurring_transactions ที่ถึงกำหนด เป็น batch สำหรับทุก user
+#
+# - เลือก template ที่ถึงกำหนดด้วย FOR UPDATE SKIP LOCKED → หลาย worker รันพร้อมกันได้ ไม่สร้างซ้ำ
+#   (worker ที่มาทีหลังจะข้ามแถวที่ถูกล็อกไปหยิบแถวอื่นแทน)
+# - ต่อ batch: INSERT หลายแถว + ปรับ tags/month_results แบบรวมกลุ่ม (app.ledger) + เลื่อน next_date แล้ว commit ครั้งเดียว
+#
+# รันในแอป: thread เบื้องหลังทุก RECURRING_INTERVAL_SECONDS (ปิดได้ด้วย RECURRING_SCHEDULER_ENABLED=false)
+#           ทุกรอบสร้าง partition ของ transactions ปีนี้/ปีหน้าด้วย (ข้ามปีใหม่ได้โดยไม่ต้องรีสตาร์ต)
+# รันแบบ cron:  python -m app.scheduler
+import calendar
+import logging
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import config, partitions
+from app.database import frozen_users, shards
+from app.ledger import apply_transactions
+
+log = logging.getLogger(__name__)
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+MAX_OCCURRENCES_PER_RUN = 400  # กัน template ที่ค้างนานมากสร้างทีเดียวเยอะเกิน (ที่เหลือไปรอบถัดไป)
+
+
+def next_occurrence(d: date, frequency: str, interval: int, day_of_month: int | None) -> date:
+    if frequency == "daily":
+        return d + timedelta(days=interval)
+    if frequency == "weekly":
+        return d + timedelta(weeks=interval)
+    # monthly: ยึดวันที่ตาม day_of_month (ถ้าเดือนนั้นสั้นกว่าใช้วันสุดท้ายของเดือน)
+    m = d.month - 1 + interval
+    y, m = d.year + m // 12, m % 12 + 1
+    day = min(day_of_month or d.day, calendar.monthrange(y, m)[1])
+    return date(y, m, day)
+
+
+def run_due(db: Session, today: date | None = None, batch_size: int | None = None) -> tuple[int, int]:
+    """ประมวลผล template ที่ถึงกำหนด 1 batch; คืน (จำนวน template, จำนวน transaction ที่สร้าง)"""
+    today = today or date.today()
+    batch_size = batch_size or config.RECURRING_BATCH_SIZE
+    rows = db.execute(
+        text('''
+            SELECT r.id, r.user_id, r.tag_id, tg.type AS tag_type, r.value, r.frequency, r.interval_count,
+                   r.day_of_month, r.time, r.note, r.next_date, r.end_date
+            FROM "recurring_transactions" r
+            JOIN "tags" tg ON tg.id = r.tag_id AND tg.user_id = r.user_id
+            WHERE r.active AND r.next_date <= :today
+              AND NOT (r.user_id = ANY(CAST(:frozen AS bigint[])))   -- user ที่กำลังย้าย shard
+            ORDER BY r.next_date
+            LIMIT :n
+            FOR UPDATE OF r SKIP LOCKED
+        '''),
+        {"today": today, "n": batch_size, "frozen": frozen_users()}
+    ).fetchall()
+    if not rows:
+        db.rollback()
+        return 0, 0
+
+    items: list[dict] = []
+    upd_ids, upd_next, upd_active = [], [], []
+    for row in rows:
+        r = row._mapping
+        d = r["next_date"]
+        n = 0
+        while d <= today and (r["end_date"] is None or d <= r["end_date"]) and n < MAX_OCCURRENCES_PER_RUN:
+            items.append({
+                "user_id": r["user_id"], "tag_id": r["tag_id"], "tag_type": r["tag_type"],
+                "value": r["value"], "date": d, "time": r["time"], "note": r["note"],
+            })
+            d = next_occurrence(d, r["frequency"], r["interval_count"], r["day_of_month"])
+            n += 1
+        upd_ids.append(r["id"])
+        upd_next.append(d)
+        upd_active.append(r["end_date"] is None or d <= r["end_date"])
+
+    try:
+        apply_transactions(db, items)
+        db.execute(
+            text('''
+                UPDATE "recurring_transactions" r
+                SET next_date = u.next_date, active = u.active
+                FROM unnest(CAST(:ids AS bigint[]), CAST(:nexts AS date[]), CAST(:actives AS boolean[]))
+                     AS u(id, next_date, active)
+                WHERE r.id = u.id
+            '''),
+            {"ids": upd_ids, "nexts": upd_next, "actives": upd_active}
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows), len(items)
+
+
+def run_until_idle(today: date | None = None) -> int:
+    """วนทีละ batch จนไม่มี template ที่ถึงกำหนด (หรือที่เหลือถูก worker อื่นล็อกอยู่) ทีละ shard"""
+    total = 0
+    for sh in shards:
+        while True:
+            with sh.Session() as db:
+                templates, created = run_due(db, today)
+            total += created
+            if templates == 0:
+                break
+    return total
+
+
+class RecurringScheduler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="recurring-scheduler", daemon=True)
+        self._interval = interval
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                partitions.ensure_upcoming()
+            except Exception:
+                log.exception("ensure transactions partitions failed")
+            try:
+                created = run_until_idle()
+                if created:
+                    log.info("recurring scheduler created %d transactions", created)
+            except Exception:
+                log.exception("recurring scheduler run failed")
+
+
+_scheduler: RecurringScheduler | None = None
+
+
+def start():
+    global _scheduler
+    if config.RECURRING_SCHEDULER_ENABLED and _scheduler is None:
+        _scheduler = RecurringScheduler(config.RECURRING_INTERVAL_SECONDS)
+        _scheduler.start()
+
+
+def stop():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"created {run_until_idle()} transactions")
@@ -1,15 +1,14 @@
 # app/security.py
-import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+import multiprocessing
+import threading
 from jose import jwt, JWTError
 import bcrypt
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, HASH_WORKERS
 
-SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-prod")  # ใส่ env จริงในโปรดักชัน
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
@@ -22,3 +21,38 @@ def decode_token(token: str) -> dict:
 
 def verify_password(plain: str, hashed: str) -> bool:
     return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+
+def hash_password(plain: str) -> str:
+    return bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+# ----------------- hash ทีละหลายรหัส (bulk provisioning) -----------------
+# bcrypt ใช้ CPU ล้วน → กระจายไปหลาย process ให้ใช้ได้ทุก core
+# สร้าง pool ครั้งแรกที่ใช้ (หลัง gunicorn fork แล้ว) และใช้ spawn กัน fork process ที่มี thread อยู่
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_INLINE_BELOW = 4  # จำนวนน้อย hash ใน process เองเร็วกว่าส่งข้าม process
+
+
+def _hash_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """hash หลายรหัสพร้อมกัน คืนผลตามลำดับเดิม"""
+    if len(passwords) < _INLINE_BELOW or HASH_WORKERS <= 1:
+        return [hash_password(p) for p in passwords]
+    chunk = max(1, len(passwords) // (HASH_WORKERS * 4))
+    return list(_hash_pool().map(hash_password, passwords, chunksize=chunk))
+
+
+def shutdown_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
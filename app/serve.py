@@ -0,0 +1,58 @@
+# app/serve.py
+# entry point สำหรับรันหลาย worker process:  python -m app.serve
+#
+# - มี gunicorn (Linux): gunicorn + UvicornWorker ตาม gunicorn.conf.py
+#     reload โค้ด/config โดยไม่ตัด request:  kill -HUP <master pid>
+#       (worker ใหม่ขึ้นก่อน แล้ว worker เก่าปิดแบบ graceful ภายใน WEB_GRACEFUL_TIMEOUT)
+#     อย่าใช้ TTIN/TTOU เพิ่มลด worker: pool ต่อ worker คำนวณจาก WEB_CONCURRENCY → แก้ env แล้ว HUP แทน
+# - ไม่มี gunicorn (เช่น Windows): uvicorn --workers (spawn process ใหม่ → engine สร้างใน worker เองอยู่แล้ว)
+#
+# connection: DB_CONNECTION_BUDGET ถูกแบ่งให้ WEB_CONCURRENCY worker เท่า ๆ กัน (app/config.py)
+# ระหว่าง HUP worker เก่ากับใหม่ซ้อนกันชั่วครู่ → เผื่อ headroom ใน budget ของ pooler ไว้ด้วย
+# cache: WEB_CONCURRENCY > 1 ต้องตั้ง SHARED_CACHE_URL=redis://... ไม่งั้น read cache ใน process ถูกปิด
+#        (การล้าง cache และ read-your-writes ต้องเห็นร่วมกันทุก worker — ดู app/cache.py)
+import logging
+import sys
+from pathlib import Path
+
+from app import config
+
+log = logging.getLogger("app.serve")
+
+GUNICORN_CONF = Path(__file__).resolve().parent.parent / "gunicorn.conf.py"
+
+
+def pool_plan() -> str:
+    total = config.DB_POOL_SIZE * config.WEB_CONCURRENCY
+    msg = (f"db pool {config.DB_POOL_SIZE}/worker x {config.WEB_CONCURRENCY} workers = {total} connections"
+           f" (budget {config.DB_CONNECTION_BUDGET or 'unset'})")
+    if config.DB_CONNECTION_BUDGET and total > config.DB_CONNECTION_BUDGET:
+        msg += " -- exceeds budget, lower WEB_CONCURRENCY"
+    shared = config.SHARED_CACHE_URL and not config.SHARED_CACHE_URL.startswith("memory://")
+    if config.WEB_CONCURRENCY > 1 and not shared:
+        msg += "; read cache off (no SHARED_CACHE_URL shared across workers)"
+    return msg
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        import uvicorn
+
+        log.info("gunicorn not installed, using uvicorn workers; %s", pool_plan())
+        uvicorn.run(
+            "app.main:app",
+            host=config.HOST,
+            port=config.PORT,
+            workers=config.WEB_CONCURRENCY,
+            timeout_graceful_shutdown=config.WEB_GRACEFUL_TIMEOUT,
+        )
+        return
+    sys.argv = [sys.argv[0], "-c", str(GUNICORN_CONF), *sys.argv[1:], "app.main:app"]
+    run()
+
+
+if __name__ == "__main__":
+    main()
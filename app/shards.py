@@ -0,0 +1,226 @@
+# app/shards.py
+# เครื่องมือดูแล shard (ตั้ง DATABASE_SHARD_URLS แล้ว; ดู "shards" ใน app/database.py)
+#
+#   python -m app.shards init                    # migrate ทุก shard + ตั้ง sequence ให้ id ไม่ซ้ำข้าม shard
+#                                                # + จด user เดิมที่ไม่ตรงสูตร user_id % N ลง user_shards
+#   python -m app.shards status                  # จำนวน user ต่อ shard / user ที่ถูกย้าย
+#   python -m app.shards move USER_ID TARGET     # ย้ายข้อมูลทั้งหมดของ user ไป shard TARGET
+#
+# move:
+#   1) ตั้ง moving = true → ทุก process เห็นภายใน SHARD_MAP_REFRESH_SECONDS แล้ว request ของ user นี้ได้ 503
+#      (scheduler / job worker ข้าม user นี้) — รอให้ request ที่ค้างอยู่จบก่อนเริ่มคัดลอก
+#   2) คัดลอกทุกตารางของ user ไป shard ปลายทางใน transaction เดียว (id เดิม)
+#   3) ชี้ user_shards ไป shard ใหม่ (moving = false) แล้วลบข้อมูลจาก shard ต้นทาง
+#   พลาดระหว่างคัดลอก → ยกเลิก moving กลับไปใช้ shard เดิม; รันซ้ำได้ (ถ้าปลายทางมีข้อมูลครบแล้วจะข้ามการคัดลอก)
+import argparse
+import logging
+import time
+
+from psycopg2.extras import Json
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import refresh_shard_map, shards
+from app.migrate import migrate
+
+log = logging.getLogger(__name__)
+
+# ตารางที่เป็นของ user (ลำดับตอนคัดลอก; ลบย้อนลำดับ) → คอลัมน์ที่ระบุ user
+USER_TABLES = (
+    ("users", "id"),
+    ("tags", "user_id"),
+    ("transactions", "user_id"),
+    ("transactions_archive", "user_id"),
+    ("month_results", "user_id"),
+    ("tag_month_results", "user_id"),
+    ("recurring_transactions", "user_id"),
+    ("jobs", "user_id"),
+    ("change_log", "user_id"),
+)
+COPY_BATCH = 1000
+MOVE_GRACE_SECONDS = 5.0  # เผื่อ request ที่เริ่มก่อนเห็น moving ให้จบ
+
+
+def _current(user_id: int) -> int:
+    """shard ปัจจุบันตาม user_shards (รวมกรณี move รอบก่อนค้างที่ moving = true) หรือสูตร"""
+    with shards[0].Session() as db:
+        s = db.execute(text('SELECT shard FROM "user_shards" WHERE user_id = :uid'), {"uid": user_id}).scalar()
+    return s if s is not None else user_id % len(shards)
+
+
+def _set_override(user_id: int, shard: int, moving: bool):
+    with shards[0].Session() as db:
+        db.execute(
+            text('''
+                INSERT INTO "user_shards" (user_id, shard, moving, updated_at)
+                VALUES (:uid, :s, :m, clock_timestamp())
+                ON CONFLICT (user_id) DO UPDATE
+                SET shard = EXCLUDED.shard, moving = EXCLUDED.moving, updated_at = EXCLUDED.updated_at
+            '''),
+            {"uid": user_id, "s": shard, "m": moving}
+        )
+        db.commit()
+
+
+# ----------------- init -----------------
+def _align_sequences(db: Session, index: int, n: int) -> int:
+    """ทุก sequence ใน shard นี้: เพิ่มทีละ n และค่าถัดไป % n == index → id ที่สร้างใหม่ไม่ชนกับ shard อื่น"""
+    seqs = db.execute(
+        text("SELECT schemaname, sequencename, COALESCE(last_value, 0) FROM pg_sequences WHERE schemaname = 'public'")
+    ).fetchall()
+    for schema, name, last in seqs:
+        nxt = last + 1 + (index - (last + 1)) % n
+        qname = f'"{schema}"."{name}"'
+        db.execute(text(f"ALTER SEQUENCE {qname} INCREMENT BY {int(n)}"))
+        db.execute(text("SELECT setval(:s, :v, false)"), {"s": qname, "v": nxt})
+    return len(seqs)
+
+
+def init():
+    n = len(shards)
+    for sh in shards:
+        print(f"-- shard {sh.index}: migrate")
+        migrate(sh.engine)
+    if n == 1:
+        print("single database (DATABASE_SHARD_URLS not set); nothing else to do")
+        return
+    for sh in shards:
+        with sh.Session() as db:
+            count = _align_sequences(db, sh.index, n)
+            # user ที่มีอยู่แล้วใน shard นี้แต่สูตร user_id % n ชี้ไปที่อื่น → จดไว้ (ย้ายทีหลังด้วย move ได้)
+            ids = [r[0] for r in db.execute(
+                text('SELECT id FROM "users" WHERE id % :n <> :i'), {"n": n, "i": sh.index}
+            ).fetchall()]
+            db.commit()
+        if ids:
+            with shards[0].Session() as home:
+                home.execute(
+                    text('''
+                        INSERT INTO "user_shards" (user_id, shard, updated_at)
+                        SELECT u, :s, clock_timestamp() FROM unnest(CAST(:ids AS bigint[])) AS u
+                        ON CONFLICT (user_id) DO NOTHING
+                    '''),
+                    {"s": sh.index, "ids": ids}
+                )
+                home.commit()
+        print(f"-- shard {sh.index}: {count} sequences aligned, {len(ids)} existing users pinned")
+
+
+# ----------------- status -----------------
+def status() -> list[dict]:
+    refresh_shard_map(force=True)
+    out = []
+    for sh in shards:
+        with sh.Session() as db:
+            users = db.execute(text('SELECT COUNT(*) FROM "users"')).scalar()
+        out.append({"shard": sh.index, "users": users})
+    with shards[0].Session() as db:
+        moved = db.execute(
+            text('SELECT shard, COUNT(*) AS n, COUNT(*) FILTER (WHERE moving) AS moving FROM "user_shards" GROUP BY shard')
+        ).fetchall()
+    for r in moved:
+        out[r.shard]["pinned"] = r.n
+        out[r.shard]["moving"] = r.moving
+    return out
+
+
+# ----------------- move -----------------
+def _adapt(v):
+    return Json(v) if isinstance(v, (dict, list)) else v
+
+
+def _copy_table(src: Session, dst: Session, table: str, key: str, user_id: int) -> int:
+    result = src.execute(text(f'SELECT * FROM "{table}" WHERE {key} = :uid'), {"uid": user_id})
+    cols = list(result.keys())
+    names = ", ".join(f'"{c}"' for c in cols)
+    values = ", ".join(f":{c}" for c in cols)
+    sql = text(f'INSERT INTO "{table}" ({names}) OVERRIDING SYSTEM VALUE VALUES ({values})')
+    n = 0
+    while True:
+        rows = result.fetchmany(COPY_BATCH)
+        if not rows:
+            return n
+        dst.execute(sql, [{c: _adapt(v) for c, v in zip(cols, r)} for r in rows])
+        n += len(rows)
+
+
+def _advance_change_seq(dst: Session, user_id: int, target: int):
+    """
+    change_seq ของ shard ปลายทางต้องเดินหน้าเกิน seq ทุกแถวที่คัดลอกมา (client ถือ cursor จาก shard ต้นทางอยู่
+    ถ้า sequence ปลายทางตามหลัง change ใหม่ของ user จะได้ seq ต่ำกว่า cursor แล้ว GET /sync ไม่เห็น)
+    ค่าถัดไปยังคง % n == target เหมือนที่ init ตั้งไว้ (ไม่ชนกับ id ที่ shard อื่นออก)
+    """
+    dst.execute(
+        text('''
+            SELECT setval('change_seq', h + 1 + ((:i - (h + 1)) % :n + :n) % :n, false)
+            FROM (SELECT GREATEST(
+                (SELECT last_value FROM change_seq),
+                (SELECT COALESCE(MAX(seq), 0) FROM "change_log" WHERE user_id = :uid)
+            ) AS h) s
+        '''),
+        {"uid": user_id, "i": target, "n": len(shards)}
+    )
+
+
+def move_user(user_id: int, target: int, wait: float | None = None) -> dict:
+    if not 0 <= target < len(shards):
+        raise ValueError(f"target must be 0..{len(shards) - 1}")
+    source = _current(user_id)
+    if source == target:
+        return {"user_id": user_id, "shard": target, "moved": False}
+
+    with shards[source].Session() as db:
+        if db.execute(text('SELECT 1 FROM "users" WHERE id = :uid'), {"uid": user_id}).fetchone() is None:
+            raise ValueError(f"user {user_id} not found on shard {source}")
+        if db.execute(
+            text('''SELECT 1 FROM "jobs" WHERE user_id = :uid AND status = 'running' LIMIT 1'''), {"uid": user_id}
+        ).fetchone():
+            raise ValueError(f"user {user_id} has running jobs; retry when they finish")
+
+    _set_override(user_id, source, moving=True)
+    time.sleep(config.SHARD_MAP_REFRESH_SECONDS * 2 + MOVE_GRACE_SECONDS if wait is None else wait)
+
+    copied: dict[str, int] = {}
+    try:
+        with shards[source].Session() as src, shards[target].Session() as dst:
+            done = dst.execute(text('SELECT 1 FROM "users" WHERE id = :uid'), {"uid": user_id}).fetchone()
+            if done is None:
+                for table, key in USER_TABLES:
+                    copied[table] = _copy_table(src, dst, table, key, user_id)
+            else:
+                log.info("user %d already present on shard %d; skipping copy", user_id, target)
+            # รันซ้ำ (คัดลอกไปแล้ว) ก็ต้องเลื่อน sequence ด้วย
+            _advance_change_seq(dst, user_id, target)
+            dst.commit()
+    except Exception:
+        _set_override(user_id, source, moving=False)
+        raise
+
+    _set_override(user_id, target, moving=False)
+    with shards[source].Session() as src:
+        for table, key in reversed(USER_TABLES):
+            src.execute(text(f'DELETE FROM "{table}" WHERE {key} = :uid'), {"uid": user_id})
+        src.commit()
+    return {"user_id": user_id, "from": source, "to": target, "moved": True, "rows": copied}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="shard maintenance")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("init", help="migrate ทุก shard, ตั้ง sequence, จด user เดิม")
+    sub.add_parser("status", help="จำนวน user ต่อ shard")
+    m = sub.add_parser("move", help="ย้าย user ไป shard อื่น")
+    m.add_argument("user_id", type=int)
+    m.add_argument("target", type=int)
+    m.add_argument("--wait", type=float, default=None, help="วินาทีที่รอหลังตั้ง moving (ค่าเริ่มต้น 2×refresh + 5)")
+    args = p.parse_args()
+
+    if args.cmd == "init":
+        init()
+    elif args.cmd == "status":
+        for row in status():
+            print(row)
+    else:
+        print(move_user(args.user_id, args.target, args.wait))
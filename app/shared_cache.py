@@ -0,0 +1,430 @@
+# app/shared_cache.py
+# cache ชั้นที่ 2 ใช้ร่วมกันทุก worker ผ่าน Redis protocol
+#
+# - key มีเวอร์ชัน: mp:d:{uid}:{scope}:{ver}:{key}
+#   write handler เพิ่มเวอร์ชัน (INCR mp:v:{uid}:{scope}) หลัง commit → ค่าเก่าไม่มีใครอ่านอีก ปล่อยให้หมด TTL เอง
+# - แจ้ง worker อื่นให้ล้าง cache ใน process ผ่าน PUBLISH mp:inval
+# - ค่าเก็บเป็น msgpack แบบ columnar (ชื่อคอลัมน์ครั้งเดียว + แถวเป็น array) ไม่ใช่ JSON ของ dict
+#
+# SHARED_CACHE_URL:
+#   memory://<name>   → MemoryRedis ใน process (ใช้กับ test / benchmark ไม่ต้องมี Redis จริง)
+#   redis://host:port → redis-py (ต้องติดตั้ง redis)
+#
+# มี RESP server เล็ก ๆ ครอบ MemoryRedis ไว้ด้วย สำหรับให้หลาย process ทดสอบร่วมกันได้:
+#   python -m app.shared_cache --port 6380   แล้วตั้ง SHARED_CACHE_URL=redis://127.0.0.1:6380
+import asyncio
+import datetime as dt
+import decimal
+import fnmatch
+import logging
+import math
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "mp:inval"
+
+_EXT_DATE, _EXT_TIME, _EXT_DATETIME, _EXT_DECIMAL = 1, 2, 3, 4
+
+
+# ----------------- codec -----------------
+def _default(obj):
+    import msgpack
+    if isinstance(obj, dt.datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, dt.date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, dt.time):
+        return msgpack.ExtType(_EXT_TIME, obj.isoformat().encode())
+    if isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(obj).encode())
+    raise TypeError(f"cannot cache {type(obj).__name__}")
+
+
+def _ext_hook(code, data):
+    import msgpack
+    s = data.decode()
+    if code == _EXT_DATE:
+        return dt.date.fromisoformat(s)
+    if code == _EXT_TIME:
+        return dt.time.fromisoformat(s)
+    if code == _EXT_DATETIME:
+        return dt.datetime.fromisoformat(s)
+    if code == _EXT_DECIMAL:
+        return decimal.Decimal(s)
+    return msgpack.ExtType(code, data)
+
+
+def encode(value) -> bytes:
+    """
+    list[dict] ที่ key เหมือนกันทุกแถว → [0, cols, [row, ...]]
+    dict → [1, keys, values] ; อื่น ๆ → [2, value]
+    """
+    import msgpack
+    if isinstance(value, list) and value and all(isinstance(r, dict) for r in value):
+        cols = list(value[0].keys())
+        if all(list(r.keys()) == cols for r in value):
+            payload = [0, cols, [[r[c] for c in cols] for r in value]]
+            return msgpack.packb(payload, default=_default, use_bin_type=True)
+    if isinstance(value, dict):
+        payload = [1, list(value.keys()), list(value.values())]
+    else:
+        payload = [2, value]
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def decode(raw: bytes):
+    import msgpack
+    payload = msgpack.unpackb(raw, ext_hook=_ext_hook, raw=False)
+    kind = payload[0]
+    if kind == 0:
+        cols = payload[1]
+        return [dict(zip(cols, row)) for row in payload[2]]
+    if kind == 1:
+        return dict(zip(payload[1], payload[2]))
+    return payload[1]
+
+
+# ----------------- in-memory stand-in -----------------
+class MemoryRedis:
+    """
+    subset ของ redis.Redis ที่ shared cache ใช้ (get/set/incr/mget/delete/publish/pubsub)
+    thread-safe; instance เดียวกันแชร์ได้หลาย "worker" (thread) ใน process เดียว
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+        self._subs: dict[str, set["MemoryPubSub"]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _k(key) -> str:
+        return key.decode() if isinstance(key, bytes) else str(key)
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def ping(self) -> bool:
+        return True
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(self._k(key))
+            return item[0] if item else None
+
+    def mget(self, keys):
+        with self._lock:
+            out = []
+            for k in keys:
+                item = self._live(self._k(k))
+                out.append(item[0] if item else None)
+            return out
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        elif isinstance(value, int):
+            value = str(value).encode()
+        with self._lock:
+            self._data[self._k(key)] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def incr(self, key, amount: int = 1) -> int:
+        with self._lock:
+            k = self._k(key)
+            item = self._live(k)
+            n = int(item[0]) + amount if item else amount
+            self._data[k] = (str(n).encode(), item[1] if item else None)
+            return n
+
+    def delete(self, *keys) -> int:
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(self._k(k), None) is not None)
+
+    def keys(self, pattern="*"):
+        with self._lock:
+            return [k.encode() for k in list(self._data) if fnmatch.fnmatchcase(k, self._k(pattern)) and self._live(k)]
+
+    def publish(self, channel, message) -> int:
+        if isinstance(message, str):
+            message = message.encode()
+        ch = self._k(channel)
+        with self._lock:
+            subs = list(self._subs.get(ch, ()))
+        for ps in subs:
+            ps._q.put({"type": "message", "channel": ch.encode(), "data": message})
+        return len(subs)
+
+    def pubsub(self) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+
+class MemoryPubSub:
+    def __init__(self, server: MemoryRedis):
+        self._server = server
+        self._q: queue.Queue = queue.Queue()
+        self._channels: set[str] = set()
+
+    def subscribe(self, *channels):
+        with self._server._lock:
+            for ch in channels:
+                ch = MemoryRedis._k(ch)
+                self._server._subs.setdefault(ch, set()).add(self)
+                self._channels.add(ch)
+                self._q.put({"type": "subscribe", "channel": ch.encode(), "data": len(self._channels)})
+
+    def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0):
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            try:
+                msg = self._q.get(timeout=max(deadline - time.monotonic(), 0)) if timeout else self._q.get_nowait()
+            except queue.Empty:
+                return None
+            if ignore_subscribe_messages and msg["type"] != "message":
+                continue
+            return msg
+
+    def close(self):
+        with self._server._lock:
+            for ch in self._channels:
+                self._server._subs.get(ch, set()).discard(self)
+        self._channels.clear()
+
+
+_memory_servers: dict[str, MemoryRedis] = {}
+
+
+def connect(url: str):
+    """memory://name → MemoryRedis ที่แชร์ตามชื่อใน process, อย่างอื่นส่งต่อให้ redis-py"""
+    if url.startswith("memory://"):
+        name = url[len("memory://"):] or "default"
+        return _memory_servers.setdefault(name, MemoryRedis())
+    import redis  # optional dependency
+    return redis.Redis.from_url(url)
+
+
+# ----------------- shared cache tier -----------------
+class SharedCache:
+    def __init__(self, client, ttl: float, prefix: str = "mp"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.hits = self.misses = self.errors = 0
+
+    def _ver_key(self, uid: int, scope: str) -> str:
+        return f"{self.prefix}:v:{uid}:{scope}"
+
+    def _data_key(self, uid: int, scope: str, ver: int, key) -> str:
+        if isinstance(key, tuple):
+            key = ".".join(str(k) for k in key)
+        return f"{self.prefix}:d:{uid}:{scope}:{ver}:{key}"
+
+    def get_or_load(self, user_id: int, scope: str, key, loader):
+        """อ่านจาก Redis ตามเวอร์ชันล่าสุด; ถ้า Redis มีปัญหาให้ตกไปอ่าน DB ตรง ๆ"""
+        uid = int(user_id)
+        try:
+            raw_ver = self.client.get(self._ver_key(uid, scope))
+            ver = int(raw_ver) if raw_ver else 0
+            dkey = self._data_key(uid, scope, ver, key)
+            raw = self.client.get(dkey)
+        except Exception:
+            self.errors += 1
+            log.warning("shared cache unavailable", exc_info=True)
+            return loader()
+        if raw is not None:
+            self.hits += 1
+            return decode(raw)
+        self.misses += 1
+        value = loader()
+        try:
+            self.client.set(dkey, encode(value), ex=self.ttl)
+        except Exception:
+            self.errors += 1
+            log.warning("shared cache set failed", exc_info=True)
+        return value
+
+    def mark_write(self, user_id: int, seconds: float):
+        """marker read-your-writes ที่ทุก worker เห็น (หมดอายุเอง)"""
+        self.client.set(f"{self.prefix}:w:{int(user_id)}", 1, ex=max(1, math.ceil(seconds)))
+
+    def wrote_recently(self, user_id: int) -> bool:
+        try:
+            return self.client.get(f"{self.prefix}:w:{int(user_id)}") is not None
+        except Exception:
+            self.errors += 1
+            log.warning("shared cache unavailable", exc_info=True)
+            return True  # ไม่รู้ → อ่านจาก primary ไว้ก่อน
+
+    def bump(self, user_id: int, scopes, origin: str):
+        """เพิ่มเวอร์ชันของทุก scope แล้วประกาศให้ worker อื่นล้าง cache ใน process"""
+        uid = int(user_id)
+        for scope in scopes:
+            self.client.incr(self._ver_key(uid, scope))
+        self.client.publish(INVALIDATION_CHANNEL, f"{origin}|{uid}|{','.join(scopes)}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.client).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+class InvalidationListener(threading.Thread):
+    """ฟัง mp:inval แล้วเรียก on_invalidate(uid, scopes) สำหรับข้อความที่มาจาก worker อื่น"""
+
+    def __init__(self, client, origin: str, on_invalidate):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self._client = client
+        self._origin = origin
+        self._on_invalidate = on_invalidate
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            ps = None
+            try:
+                ps = self._client.pubsub()
+                ps.subscribe(INVALIDATION_CHANNEL)
+                backoff = 1.0
+                while not self._stop.is_set():
+                    msg = ps.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if msg is None:
+                        continue
+                    data = msg["data"].decode() if isinstance(msg["data"], bytes) else str(msg["data"])
+                    origin, uid, scopes = data.split("|", 2)
+                    if origin != self._origin:
+                        self._on_invalidate(int(uid), tuple(s for s in scopes.split(",") if s))
+            except Exception:
+                log.exception("cache invalidation listener failed; reconnecting in %.0fs", backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if ps is not None:
+                    try:
+                        ps.close()
+                    except Exception:
+                        pass
+
+
+# ----------------- RESP server (สำหรับทดสอบหลาย process) -----------------
+def _resp(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if value is True:
+        return b"+OK\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_resp(v) for v in value)
+    raise TypeError(type(value))
+
+
+async def _read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.strip().split()  # inline command (เช่นจาก redis-cli / telnet)
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+async def _handle_client(store: MemoryRedis, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    ps: MemoryPubSub | None = None
+    pump: asyncio.Task | None = None
+
+    async def pump_messages():
+        while True:
+            msg = await loop.run_in_executor(None, ps.get_message, True, 1.0)
+            if msg is not None:
+                writer.write(_resp([b"message", msg["channel"], msg["data"]]))
+                await writer.drain()
+
+    try:
+        while True:
+            args = await _read_command(reader)
+            if args is None:
+                break
+            cmd, rest = args[0].upper(), args[1:]
+            if cmd == b"PING":
+                reply = b"+PONG\r\n"
+            elif cmd == b"GET":
+                reply = _resp(store.get(rest[0]))
+            elif cmd == b"MGET":
+                reply = _resp(store.mget(rest))
+            elif cmd == b"SET":
+                opts = [a.upper() for a in rest[2:]]
+                ex = int(opts[opts.index(b"EX") + 1]) if b"EX" in opts else None
+                reply = _resp(store.set(rest[0], rest[1], ex=ex))
+            elif cmd == b"INCR":
+                reply = _resp(store.incr(rest[0]))
+            elif cmd == b"DEL":
+                reply = _resp(store.delete(*rest))
+            elif cmd == b"KEYS":
+                reply = _resp(store.keys(rest[0] if rest else "*"))
+            elif cmd == b"PUBLISH":
+                reply = _resp(store.publish(rest[0], rest[1]))
+            elif cmd == b"SUBSCRIBE":
+                ps = ps or store.pubsub()
+                ps.subscribe(*rest)
+                reply = b"".join(_resp([b"subscribe", ch, i + 1]) for i, ch in enumerate(rest))
+                for _ in rest:
+                    ps.get_message()  # ตอบ subscribe ไปแล้วด้านบน
+                pump = pump or asyncio.create_task(pump_messages())
+            elif cmd in (b"CLIENT", b"SELECT"):
+                reply = b"+OK\r\n"  # redis-py ส่งตอนเชื่อมต่อ; ไม่มีผลกับ stand-in
+            else:
+                reply = b"-ERR unknown command '%s'\r\n" % cmd
+            writer.write(reply)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        if pump is not None:
+            pump.cancel()
+        if ps is not None:
+            ps.close()
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6380, store: MemoryRedis | None = None):
+    store = store or MemoryRedis()
+    server = await asyncio.start_server(lambda r, w: _handle_client(store, r, w), host, port)
+    log.info("memory redis listening on %s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="in-memory Redis-protocol stand-in")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=6380)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,170 @@
+# app/slip_qr.py
+# อ่าน QR บนสลิปในเครื่อง (ไม่ต้องเรียก OCR.space) แล้วแปลง payload แบบ EMVCo TLV
+#
+# รูปแบบที่รองรับ:
+#   - "slip"  : QR ตรวจสอบสลิปของธนาคารไทย  00{00=000001, 01=รหัสธนาคารผู้โอน, 02=เลขอ้างอิง} 51=TH 91=CRC
+#   - "emvco" : Thai QR Payment / PromptPay  00=01 ... 29/30=PromptPay/bill, 53=สกุลเงิน, 54=จำนวนเงิน 63=CRC
+# ตรวจ CRC16-CCITT ทุกครั้ง (QR ที่อ่านเพี้ยน/ไม่ใช่ของธนาคารจะถูกทิ้ง)
+#
+# ตัวถอดรหัสภาพเป็น optional: zxing-cpp (แนะนำ) หรือ pyzbar (+ Pillow)
+# ไม่มีตัวใดเลย → decode_image() คืน [] และ /ocr/parse ใช้ OCR ตามเดิม
+import io
+import logging
+from datetime import datetime
+from functools import lru_cache
+
+log = logging.getLogger(__name__)
+
+SLIP_API_ID = "000001"
+PROMPTPAY_AIDS = ("A000000677010111", "A000000677010112", "A000000677010114")  # โอนเงิน / bill payment / e-wallet
+CURRENCY_THB = "764"
+
+
+# ----------------- TLV / CRC -----------------
+def parse_tlv(s: str) -> dict[str, str]:
+    """แยก ID(2) LEN(2) VALUE(LEN) ต่อกันไปจนจบ; รูปแบบผิด → ValueError"""
+    out: dict[str, str] = {}
+    i = 0
+    while i < len(s):
+        if i + 4 > len(s) or not s[i + 2:i + 4].isdigit():
+            raise ValueError(f"bad TLV header at {i}")
+        tag, n = s[i:i + 2], int(s[i + 2:i + 4])
+        val = s[i + 4:i + 4 + n]
+        if len(val) != n:
+            raise ValueError(f"truncated TLV value for tag {tag}")
+        out[tag] = val
+        i += 4 + n
+    return out
+
+
+def crc16(data: str) -> str:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) ตาม EMVCo"""
+    crc = 0xFFFF
+    for b in data.encode("utf-8"):
+        crc ^= b << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return f"{crc:04X}"
+
+
+def _crc_ok(payload: str) -> bool:
+    # CRC เป็น TLV ตัวสุดท้าย ("6304XXXX" หรือ "9104XXXX") คำนวณรวม ID+LEN ของตัวมันเอง
+    if len(payload) < 8 or payload[-8:-4] not in ("6304", "9104"):
+        return False
+    return crc16(payload[:-4]) == payload[-4:].upper()
+
+
+# ----------------- payload → fields -----------------
+def parse_payload(payload: str) -> dict | None:
+    """คืน dict ของข้อมูลที่อ่านได้ หรือ None ถ้าไม่ใช่ QR สลิป/PromptPay ที่ถูกต้อง"""
+    payload = payload.strip()
+    if not _crc_ok(payload):
+        return None
+    try:
+        tags = parse_tlv(payload)
+        if tags.get("00") == "01":
+            return _parse_emvco(tags)
+        sub = parse_tlv(tags.get("00", ""))
+    except ValueError:
+        return None
+    if sub.get("00") == SLIP_API_ID:
+        return {
+            "format": "slip",
+            "sending_bank": sub.get("01"),
+            "trans_ref": sub.get("02"),
+            "country": tags.get("51"),
+            "amount": None,
+            "date": None,
+            "time": None,
+        }
+    return None
+
+
+def _parse_emvco(tags: dict[str, str]) -> dict | None:
+    out = {
+        "format": "emvco",
+        "country": tags.get("58"),
+        "merchant": tags.get("59"),
+        "currency": tags.get("53"),
+        "amount": None,
+        "date": None,
+        "time": None,
+    }
+    for tid in ("29", "30"):
+        if tid not in tags:
+            continue
+        sub = parse_tlv(tags[tid])
+        if sub.get("00") not in PROMPTPAY_AIDS:
+            continue
+        if tid == "29":
+            out["promptpay_id"] = sub.get("01") or sub.get("02") or sub.get("03")
+        else:
+            out["biller_id"], out["ref1"], out["ref2"] = sub.get("01"), sub.get("02"), sub.get("03")
+    amount = tags.get("54")
+    if amount and out["currency"] in (None, CURRENCY_THB):
+        try:
+            out["amount"] = f"{float(amount):.2f}"
+        except ValueError:
+            pass
+    # วันเวลา: ไม่มีใน tag มาตรฐาน → ใช้ค่าใน Additional Data (62) ที่เป็น timestamp YYYYMMDDHHMMSS ถ้ามี
+    extra = tags.get("62")
+    if extra:
+        for v in parse_tlv(extra).values():
+            try:
+                ts = datetime.strptime(v, "%Y%m%d%H%M%S")
+            except ValueError:
+                continue
+            out["date"], out["time"] = ts.strftime("%Y-%m-%d"), ts.strftime("%H:%M")
+            break
+    return out
+
+
+# ----------------- image → payloads -----------------
+@lru_cache(maxsize=1)
+def _decoder():
+    """เลือกตัวถอด QR ที่ติดตั้งไว้ (โหลดครั้งแรกที่ใช้)"""
+    try:
+        import zxingcpp
+        from PIL import Image
+
+        def decode(fp) -> list[str]:
+            return [r.text for r in zxingcpp.read_barcodes(Image.open(fp)) if r.format == zxingcpp.BarcodeFormat.QRCode]
+        return decode
+    except ImportError:
+        pass
+    try:
+        from pyzbar import pyzbar
+        from PIL import Image
+
+        def decode(fp) -> list[str]:
+            return [r.data.decode("utf-8", "replace") for r in pyzbar.decode(Image.open(fp), symbols=[pyzbar.ZBarSymbol.QRCODE])]
+        return decode
+    except ImportError:
+        log.info("no QR decoder installed (zxing-cpp / pyzbar); slip QR fast path disabled")
+        return None
+
+
+def decode_image(fp) -> list[str]:
+    """fp: bytes หรือ file object ของรูป; คืน payload ของ QR ทั้งหมดที่อ่านได้"""
+    decode = _decoder()
+    if decode is None:
+        return []
+    if isinstance(fp, (bytes, bytearray)):
+        fp = io.BytesIO(fp)
+    try:
+        return decode(fp)
+    except Exception:
+        log.debug("QR decode failed", exc_info=True)
+        return []
+    finally:
+        if hasattr(fp, "seek"):
+            fp.seek(0)
+
+
+def read_slip(fp) -> dict | None:
+    """QR แรกในรูปที่เป็นสลิป/PromptPay ที่ถูกต้อง (เลือกอันที่มีจำนวนเงินก่อน)"""
+    found = [p for p in map(parse_payload, decode_image(fp)) if p]
+    if not found:
+        return None
+    return next((p for p in found if p["amount"]), found[0])
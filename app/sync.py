@@ -0,0 +1,135 @@
+# app/sync.py
+# change feed สำหรับ client แบบ offline-first (ตาราง change_log, อ่านผ่าน GET /sync/{user_id}?since=)
+#
+# - write handler เรียก record_change(db, user_id, entity, *ids) ก่อน commit (ลบ → deleted=True = tombstone)
+# - ตอน commit: ล็อก advisory ต่อ user แล้ว upsert change_log ด้วย seq ใหม่จาก change_seq
+#   → seq ของ user เดียวกันเรียงตามลำดับ commit จริง (client ที่อ่านถึง seq X จะไม่พลาดแถวที่ commit ทีหลังแต่ seq น้อยกว่า)
+# - ไม่บันทึก: รายการที่ถูก archive ออกจาก transactions (ปีที่ปิดแล้ว ดูยอดสรุปที่ /transactions/{user_id}/archive)
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.money import with_baht
+
+ENTITIES = ("transaction", "tag", "month")
+_LOCK_NAMESPACE = 4701  # key แรกของ pg_advisory_xact_lock(int, int) — กันชนกับ advisory lock อื่น
+
+
+def month_key(year: int, month: int) -> int:
+    """entity_id ของ month_results หนึ่งเดือน"""
+    return int(year) * 100 + int(month)
+
+
+def record_change(db: Session, user_id: int, entity: str, *ids: int, deleted: bool = False):
+    """จดว่า entity เหล่านี้ของ user เปลี่ยน (ครั้งหลังสุดใน transaction เดียวกันชนะ)"""
+    if entity not in ENTITIES:
+        raise ValueError(f"unknown entity {entity!r}")
+    pending = db.info.setdefault("changes", {})
+    for i in ids:
+        pending[(int(user_id), entity, int(i))] = deleted
+
+
+def record_user_changes(db: Session, user_id: int, *entities: str):
+    """จดทุกแถวของ entity เหล่านี้ของ user ว่าเปลี่ยน (ใช้หลังงานที่แก้ยอดทั้งก้อน เช่น reconcile)"""
+    for entity in entities:
+        if entity == "tag":
+            sql = 'SELECT id FROM "tags" WHERE user_id = :uid'
+        elif entity == "month":
+            sql = 'SELECT year * 100 + month FROM "month_results" WHERE user_id = :uid'
+        else:
+            sql = 'SELECT id FROM "transactions" WHERE user_id = :uid'
+        record_change(db, user_id, entity, *[r[0] for r in db.execute(text(sql), {"uid": user_id}).fetchall()])
+
+
+@event.listens_for(Session, "before_commit")
+def _flush_changes(session: Session):
+    pending = session.info.pop("changes", None)
+    if not pending:
+        return
+    by_user: dict[int, list] = {}
+    for (uid, entity, eid), deleted in pending.items():
+        by_user.setdefault(uid, []).append((entity, eid, deleted))
+    # ล็อกเรียงตาม user_id เสมอ → สอง commit ที่มีหลาย user ตรงกันไม่ deadlock กัน
+    for uid in sorted(by_user):
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:ns, CAST(:k AS int))"),
+            {"ns": _LOCK_NAMESPACE, "k": uid % 2147483647}
+        )
+    for uid in sorted(by_user):
+        rows = by_user[uid]
+        session.execute(
+            text('''
+                INSERT INTO "change_log" (user_id, entity, entity_id, deleted)
+                SELECT :uid, * FROM unnest(CAST(:entities AS text[]), CAST(:ids AS bigint[]), CAST(:deleted AS boolean[]))
+                ON CONFLICT (user_id, entity, entity_id) DO UPDATE
+                SET seq = EXCLUDED.seq, deleted = EXCLUDED.deleted, changed_at = EXCLUDED.changed_at
+            '''),
+            {
+                "uid": uid,
+                "entities": [r[0] for r in rows],
+                "ids": [r[1] for r in rows],
+                "deleted": [r[2] for r in rows],
+            }
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_changes(session: Session):
+    session.info.pop("changes", None)
+
+
+# ----------------- ฝั่งอ่าน -----------------
+_ROW_SQL = {
+    "transaction": 'SELECT id, user_id, tag_id, value, date, time, note FROM "transactions" '
+                   'WHERE user_id = :uid AND id = ANY(CAST(:ids AS bigint[]))',
+    "tag": 'SELECT id, user_id, tag, type, value FROM "tags" WHERE user_id = :uid AND id = ANY(CAST(:ids AS bigint[]))',
+    "month": 'SELECT year * 100 + month AS key, id, user_id, month, year, income, expense FROM "month_results" '
+             'WHERE user_id = :uid AND year * 100 + month = ANY(CAST(:ids AS bigint[]))',
+}
+_MONEY = {"transaction": ("value",), "tag": ("value",), "month": ("income", "expense")}
+
+
+def changes_since(db: Session, user_id: int, since: int, limit: int) -> dict:
+    """
+    change ของ user ที่ seq > since เรียงตาม seq ไม่เกิน limit แถว พร้อมข้อมูลปัจจุบันของแถวที่ยังอยู่
+    ไม่ว่า row จะถูกแก้กี่ครั้งก็คืนแค่ครั้งเดียว (สถานะล่าสุด)
+    """
+    entries = db.execute(
+        text('''
+            SELECT seq, entity, entity_id, deleted FROM "change_log"
+            WHERE user_id = :uid AND seq > :since
+            ORDER BY seq
+            LIMIT :n
+        '''),
+        {"uid": user_id, "since": since, "n": limit + 1}
+    ).fetchall()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    live: dict[str, dict[int, dict]] = {}
+    for entity in ENTITIES:
+        ids = [r.entity_id for r in entries if r.entity == entity and not r.deleted]
+        if not ids:
+            continue
+        rows = db.execute(text(_ROW_SQL[entity]), {"uid": user_id, "ids": ids}).fetchall()
+        if entity == "month":
+            live[entity] = {r.key: with_baht({k: v for k, v in r._mapping.items() if k != "key"}, *_MONEY[entity])
+                            for r in rows}
+        else:
+            live[entity] = {r.id: with_baht(r._mapping, *_MONEY[entity]) for r in rows}
+
+    changes = []
+    for r in entries:
+        data = None if r.deleted else live.get(r.entity, {}).get(r.entity_id)
+        # แถวหายไปแล้วแต่ tombstone ยังไม่ commit (หรือถูก archive) → ส่งเป็นลบ
+        changes.append({
+            "seq": r.seq,
+            "entity": r.entity,
+            "id": r.entity_id,
+            "op": "upsert" if data is not None else "delete",
+            "data": data,
+        })
+    return {
+        "changes": changes,
+        "next": entries[-1].seq if entries else since,
+        "has_more": has_more,
+    }
@@ -0,0 +1,69 @@
+# app/worker.py
+# process สำหรับทำงานในคิว jobs (แยกจาก web process)
+#
+#   python -m app.worker                    # 1 thread
+#   python -m app.worker --concurrency 2    # หลาย thread (ไม่ควรเกิน DB_POOL_SIZE)
+#   python -m app.worker --once             # ทำงานที่ค้างจนหมดแล้วออก (ใช้กับ cron / ทดสอบ)
+#
+# SIGTERM / Ctrl+C → หยุดหยิบงานใหม่ ทำงานที่ถืออยู่ให้จบแล้วออก
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import threading
+
+from app import config
+from app.jobs import run_one
+
+log = logging.getLogger("app.worker")
+
+# module ที่ลงทะเบียน handler ไว้ (import เพื่อให้ @handler ทำงาน)
+HANDLER_MODULES = ("app.jobs", "app.routers.ocr_space")
+
+
+def _loop(worker_id: str, stop: threading.Event, once: bool):
+    while not stop.is_set():
+        try:
+            ran = run_one(worker_id)
+        except Exception:
+            log.exception("worker %s: claim/finish failed", worker_id)
+            ran = False
+        if not ran:
+            if once:
+                return
+            stop.wait(config.JOBS_POLL_SECONDS)
+
+
+def main():
+    p = argparse.ArgumentParser(description="background job worker")
+    p.add_argument("--concurrency", type=int, default=1)
+    p.add_argument("--once", action="store_true", help="ทำงานที่พร้อมรันจนหมดแล้วออก")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    for m in HANDLER_MODULES:
+        importlib.import_module(m)
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=_loop, args=(f"{base}:{i}", stop, args.once), name=f"job-worker-{i}")
+        for i in range(args.concurrency)
+    ]
+    log.info("worker %s started (%d threads)", base, len(threads))
+    for t in threads:
+        t.start()
+    # join แบบมี timeout เพื่อให้ main thread ยังรับ signal ได้
+    while any(t.is_alive() for t in threads):
+        for t in threads:
+            t.join(timeout=0.5)
+    log.info("worker %s stopped", base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+#   gunicorn -c gunicorn.conf.py app.main:app      (หรือ python -m app.serve)
+# รายละเอียด reload / การแบ่ง connection ดู app/serve.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import config  # noqa: E402
+from app.serve import pool_plan  # noqa: E402
+
+bind = f"{config.HOST}:{config.PORT}"
+workers = config.WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = config.WEB_PRELOAD
+graceful_timeout = config.WEB_GRACEFUL_TIMEOUT
+timeout = 120  # heartbeat ของ worker (ไม่ใช่ต่อ request) — เผื่อ event loop ติดนาน ๆ
+keepalive = 5
+
+
+def on_starting(server):
+    server.log.info(pool_plan())
+
+
+def post_fork(server, worker):
+    # preload_app: engine / cache ถูกสร้างใน master แล้ว → ให้ worker เปิด connection ของตัวเอง
+    if "app.database" in sys.modules:
+        from app.database import reset_after_fork
+        reset_after_fork()
+    if "app.cache" in sys.modules:
+        from app import cache
+        cache.reset_after_fork()
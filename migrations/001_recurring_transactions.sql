@@ -0,0 +1,48 @@
+-- รายการประจำ (ค่าเช่า / เงินเดือน / subscription) ที่ scheduler สร้าง transaction ให้อัตโนมัติ
+
+-- month_results ต้องไม่ซ้ำต่อ (user, year, month) เพื่อใช้ INSERT ... ON CONFLICT แบบ batch ได้
+-- รวมแถวซ้ำที่อาจเกิดจาก create_transaction พร้อมกันก่อน
+WITH dup AS (
+    SELECT user_id, year, month, MIN(id) AS keep_id,
+           SUM(income) AS income, SUM(expense) AS expense
+    FROM "month_results"
+    GROUP BY user_id, year, month
+    HAVING COUNT(*) > 1
+)
+UPDATE "month_results" m
+SET income = dup.income, expense = dup.expense
+FROM dup
+WHERE m.id = dup.keep_id;
+
+DELETE FROM "month_results" m
+USING (
+    SELECT user_id, year, month, MIN(id) AS keep_id
+    FROM "month_results"
+    GROUP BY user_id, year, month
+    HAVING COUNT(*) > 1
+) dup
+WHERE m.user_id = dup.user_id AND m.year = dup.year AND m.month = dup.month AND m.id <> dup.keep_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS "month_results_user_year_month_uq"
+    ON "month_results" (user_id, year, month);
+
+CREATE TABLE IF NOT EXISTS "recurring_transactions" (
+    id             BIGSERIAL PRIMARY KEY,
+    user_id        BIGINT   NOT NULL,
+    tag_id         BIGINT   NOT NULL,
+    value          NUMERIC  NOT NULL CHECK (value > 0),
+    frequency      TEXT     NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly')),
+    interval_count INT      NOT NULL DEFAULT 1 CHECK (interval_count >= 1),
+    day_of_month   SMALLINT CHECK (day_of_month BETWEEN 1 AND 31),  -- ใช้กับ monthly (ถ้าเดือนสั้นกว่าใช้วันสุดท้าย)
+    time           TIME     NOT NULL DEFAULT '00:00',
+    note           TEXT     NOT NULL DEFAULT '',
+    next_date      DATE     NOT NULL,
+    end_date       DATE,
+    active         BOOLEAN  NOT NULL DEFAULT TRUE,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS "recurring_transactions_due_idx"
+    ON "recurring_transactions" (next_date) WHERE active;
+CREATE INDEX IF NOT EXISTS "recurring_transactions_user_idx"
+    ON "recurring_transactions" (user_id);
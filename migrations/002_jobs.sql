@@ -0,0 +1,29 @@
+-- คิวงานเบื้องหลัง (OCR / import / reconcile) ที่ app.worker หยิบไปทำด้วย FOR UPDATE SKIP LOCKED
+
+CREATE TABLE IF NOT EXISTS "jobs" (
+    id           BIGSERIAL PRIMARY KEY,
+    user_id      BIGINT,
+    kind         TEXT        NOT NULL,
+    status       TEXT        NOT NULL DEFAULT 'queued'
+                 CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    payload      JSONB       NOT NULL DEFAULT '{}'::jsonb,
+    input        BYTEA,                                   -- ไฟล์แนบ (เช่นรูปสลิป) ลบทิ้งเมื่องานจบ
+    result       JSONB,
+    error        TEXT,
+    progress     JSONB,                                   -- {"done": n, "total": m}
+    attempts     INT         NOT NULL DEFAULT 0,
+    max_attempts INT         NOT NULL DEFAULT 5,
+    run_after    TIMESTAMPTZ NOT NULL DEFAULT now(),      -- ใช้เลื่อนเวลาตอน retry (backoff)
+    locked_by    TEXT,
+    locked_at    TIMESTAMPTZ,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at   TIMESTAMPTZ,                             -- เริ่ม attempt ล่าสุด
+    finished_at  TIMESTAMPTZ,
+    queued_ms    DOUBLE PRECISION,                        -- created_at → เริ่ม attempt แรก
+    run_ms       DOUBLE PRECISION                         -- เวลาทำงานของ attempt ล่าสุด
+);
+
+-- หยิบงานที่พร้อมรัน (queued) และงาน running ที่ lease หมดอายุ (worker ตาย)
+CREATE INDEX IF NOT EXISTS "jobs_ready_idx" ON "jobs" (run_after) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS "jobs_running_idx" ON "jobs" (locked_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS "jobs_user_idx" ON "jobs" (user_id, created_at DESC);
@@ -0,0 +1,40 @@
+-- เงินเป็นจำนวนเต็มหน่วยสตางค์ (BIGINT) ทุกคอลัมน์ — ดู app/money.py
+-- แปลงค่าเดิม (บาท ทศนิยม) → round(x * 100)
+
+ALTER TABLE "transactions"
+    ALTER COLUMN value TYPE BIGINT USING round(value * 100)::bigint;
+
+ALTER TABLE "tags"
+    ALTER COLUMN value TYPE BIGINT USING round(value * 100)::bigint,
+    ALTER COLUMN value SET DEFAULT 0;
+
+ALTER TABLE "month_results"
+    ALTER COLUMN income  TYPE BIGINT USING round(income * 100)::bigint,
+    ALTER COLUMN expense TYPE BIGINT USING round(expense * 100)::bigint,
+    ALTER COLUMN income  SET DEFAULT 0,
+    ALTER COLUMN expense SET DEFAULT 0;
+
+ALTER TABLE "recurring_transactions"
+    ALTER COLUMN value TYPE BIGINT USING round(value * 100)::bigint;
+
+-- ยอดสะสมเดิมอาจเพี้ยนจาก float และการ clamp ที่ 0 → คำนวณใหม่จาก transactions ให้ตรงเป๊ะ
+UPDATE "tags" t
+SET value = s.total
+FROM (
+    SELECT tg.id, COALESCE(SUM(tr.value), 0)::bigint AS total
+    FROM "tags" tg
+    LEFT JOIN "transactions" tr ON tr.tag_id = tg.id AND tr.user_id = tg.user_id
+    GROUP BY tg.id
+) s
+WHERE t.id = s.id AND t.value IS DISTINCT FROM s.total;
+
+UPDATE "month_results" SET income = 0, expense = 0;
+
+INSERT INTO "month_results" (user_id, month, year, income, expense)
+SELECT tr.user_id, EXTRACT(MONTH FROM tr.date)::int, EXTRACT(YEAR FROM tr.date)::int,
+       SUM(CASE WHEN tg.type = 'income' THEN tr.value ELSE 0 END)::bigint,
+       SUM(CASE WHEN tg.type = 'expense' THEN tr.value ELSE 0 END)::bigint
+FROM "transactions" tr JOIN "tags" tg ON tg.id = tr.tag_id
+GROUP BY 1, 2, 3
+ON CONFLICT (user_id, year, month) DO UPDATE
+SET income = EXCLUDED.income, expense = EXCLUDED.expense;
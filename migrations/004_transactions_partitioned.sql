@@ -0,0 +1,90 @@
+-- "transactions" แบ่ง partition ตามปี (RANGE ของ date) + partition default สำหรับปีที่ยังไม่มี partition
+-- ข้อมูลปีที่ปิดแล้วย้ายไปเก็บเป็นยอดสรุปใน "transactions_archive" ได้ (python -m app.partitions archive <ปี>)
+-- หมายเหตุ: คัดลอกทั้งตารางใน transaction เดียว — ควรรันช่วงที่ไม่มีผู้ใช้
+
+ALTER TABLE "transactions" RENAME TO "transactions_old";
+
+CREATE TABLE "transactions" (
+    LIKE "transactions_old" INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS
+) PARTITION BY RANGE (date);
+
+-- partition key ต้องอยู่ใน primary key
+ALTER TABLE "transactions" ADD CONSTRAINT "transactions_id_date_pkey" PRIMARY KEY (id, date);
+
+-- sequence ของ id (serial) ย้ายไปเป็นของตารางใหม่ ไม่งั้นจะถูกลบไปพร้อมตารางเก่า
+-- foreign key ขาออกของตารางเก่าสร้างซ้ำบนตารางใหม่
+DO $$
+DECLARE
+    seq text := pg_get_serial_sequence('"transactions_old"', 'id');
+    fk record;
+BEGIN
+    IF seq IS NOT NULL AND pg_get_serial_sequence('"transactions"', 'id') IS NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY "transactions".id', seq);
+    END IF;
+    FOR fk IN
+        SELECT conname, pg_get_constraintdef(oid) AS def
+        FROM pg_constraint
+        WHERE conrelid = '"transactions_old"'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE "transactions_old" DROP CONSTRAINT %I', fk.conname);
+        EXECUTE format('ALTER TABLE "transactions" ADD CONSTRAINT %I %s', fk.conname, fk.def);
+    END LOOP;
+END $$;
+
+CREATE INDEX "transactions_user_date_idx" ON "transactions" (user_id, date DESC, time DESC);
+CREATE INDEX "transactions_user_tag_idx" ON "transactions" (user_id, tag_id);
+
+CREATE TABLE "transactions_default" PARTITION OF "transactions" DEFAULT;
+
+-- สร้าง partition ของปี y (ถ้ายังไม่มี) แล้วย้ายแถวของปีนั้นที่ค้างอยู่ใน default เข้าไป
+CREATE OR REPLACE FUNCTION ensure_transactions_partition(y int) RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+    part text := format('transactions_y%s', y);
+    lo date := make_date(y, 1, 1);
+    hi date := make_date(y + 1, 1, 1);
+BEGIN
+    IF to_regclass(format('%I', part)) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE "transactions" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM "transactions_default" WHERE date >= %L AND date < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved', lo, hi, part);
+    EXECUTE format('ALTER TABLE "transactions" ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    RETURN part;
+END $$;
+
+SELECT ensure_transactions_partition(y::int)
+FROM generate_series(
+    LEAST(COALESCE((SELECT EXTRACT(YEAR FROM MIN(date)) FROM "transactions_old"), EXTRACT(YEAR FROM now())),
+          EXTRACT(YEAR FROM now())),
+    EXTRACT(YEAR FROM now()) + 1
+) AS y;
+
+INSERT INTO "transactions" SELECT * FROM "transactions_old";
+
+DROP TABLE "transactions_old";
+
+-- id ใหม่ต้องต่อจากของเดิม (กรณี identity จะได้ sequence ใหม่)
+SELECT setval(pg_get_serial_sequence('"transactions"', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM "transactions";
+
+-- ----------------- archive ของปีที่ปิดแล้ว -----------------
+-- ยอดรวมต่อ (user, แท็ก, ปี, เดือน) ของ transactions ที่ถูก archive (รายการจริงถูกลบ)
+-- month_results ยังเป็นแหล่งข้อมูลหลักของยอดรายเดือน (ไม่ถูกแตะตอน archive)
+CREATE TABLE IF NOT EXISTS "transactions_archive" (
+    user_id  BIGINT   NOT NULL,
+    tag_id   BIGINT   NOT NULL,
+    year     INT      NOT NULL,
+    month    SMALLINT NOT NULL,
+    total    BIGINT   NOT NULL,   -- สตางค์
+    tx_count INT      NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "transactions_archive_user_idx" ON "transactions_archive" (user_id, year, month);
+CREATE INDEX IF NOT EXISTS "transactions_archive_tag_idx" ON "transactions_archive" (tag_id);
+
+CREATE TABLE IF NOT EXISTS "transactions_archive_years" (
+    year        INT PRIMARY KEY,
+    rows        BIGINT      NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,26 @@
+-- ยอดรวมต่อ (user, แท็ก, ปี, เดือน) ที่อัปเดตไปพร้อมกับ transactions ในทุกเส้นทางเขียน
+-- ใช้ตอบกราฟวงกลมรายเดือน (GET /tags/{user_id}/breakdown/{year}/{month}) ด้วยการอ่าน index ช่วงเดียว
+CREATE TABLE IF NOT EXISTS "tag_month_results" (
+    user_id  BIGINT   NOT NULL,
+    tag_id   BIGINT   NOT NULL,
+    year     INT      NOT NULL,
+    month    SMALLINT NOT NULL,
+    total    BIGINT   NOT NULL DEFAULT 0,   -- สตางค์
+    tx_count INT      NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, year, month, tag_id)
+);
+CREATE INDEX IF NOT EXISTS "tag_month_results_tag_idx" ON "tag_month_results" (tag_id);
+
+-- backfill จากรายการจริง + ยอดสรุปของปีที่ archive แล้ว
+INSERT INTO "tag_month_results" (user_id, tag_id, year, month, total, tx_count)
+SELECT user_id, tag_id, year, month, SUM(total), SUM(tx_count)
+FROM (
+    SELECT user_id, tag_id, EXTRACT(YEAR FROM date)::int AS year, EXTRACT(MONTH FROM date)::int AS month,
+           value AS total, 1 AS tx_count
+    FROM "transactions"
+    UNION ALL
+    SELECT user_id, tag_id, year, month, total, tx_count FROM "transactions_archive"
+) s
+GROUP BY user_id, tag_id, year, month
+ON CONFLICT (user_id, year, month, tag_id) DO UPDATE
+SET total = EXCLUDED.total, tx_count = EXCLUDED.tx_count;
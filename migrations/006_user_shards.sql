@@ -0,0 +1,9 @@
+-- ผู้ใช้ที่ไม่ได้อยู่ใน shard ตามสูตร user_id % จำนวน shard (ถูกย้ายด้วย python -m app.shards move
+-- หรือมีอยู่ก่อนเปิด sharding) — ใช้จริงเฉพาะที่ shard 0 แต่สร้างทุก shard ให้ schema เหมือนกัน
+CREATE TABLE IF NOT EXISTS "user_shards" (
+    user_id    BIGINT PRIMARY KEY,
+    shard      INT         NOT NULL,
+    moving     BOOLEAN     NOT NULL DEFAULT false,   -- true = กำลังย้าย → request ของ user นี้ได้ 503 ชั่วคราว
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS "user_shards_updated_idx" ON "user_shards" (updated_at);
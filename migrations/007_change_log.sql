@@ -0,0 +1,29 @@
+-- change feed สำหรับ delta sync (GET /sync/{user_id}?since=)
+-- หนึ่งแถวต่อ entity ที่เคยเปลี่ยน: เขียนซ้ำ → ได้ seq ใหม่ (ตารางไม่โตตามจำนวนครั้งที่แก้)
+--   entity    : 'transaction' | 'tag' | 'month' (entity_id ของ month = year * 100 + month)
+--   deleted   : true = tombstone (ลบแล้ว; client ลบสำเนาในเครื่อง)
+CREATE SEQUENCE IF NOT EXISTS "change_seq";
+
+CREATE TABLE IF NOT EXISTS "change_log" (
+    user_id    BIGINT      NOT NULL,
+    entity     TEXT        NOT NULL,
+    entity_id  BIGINT      NOT NULL,
+    seq        BIGINT      NOT NULL DEFAULT nextval('change_seq'),
+    deleted    BOOLEAN     NOT NULL DEFAULT false,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, entity, entity_id)
+);
+CREATE INDEX IF NOT EXISTS "change_log_user_seq_idx" ON "change_log" (user_id, seq);
+
+-- backfill: ข้อมูลที่มีอยู่แล้วทั้งหมดเป็น change ตั้งต้น → since=0 ได้ข้อมูลครบ (sync ครั้งแรก)
+INSERT INTO "change_log" (user_id, entity, entity_id)
+SELECT user_id, 'tag', id FROM "tags"
+ON CONFLICT DO NOTHING;
+
+INSERT INTO "change_log" (user_id, entity, entity_id)
+SELECT user_id, 'month', year * 100 + month FROM "month_results"
+ON CONFLICT DO NOTHING;
+
+INSERT INTO "change_log" (user_id, entity, entity_id)
+SELECT user_id, 'transaction', id FROM "transactions"
+ON CONFLICT DO NOTHING;
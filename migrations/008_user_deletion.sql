@@ -0,0 +1,3 @@
+-- ลบบัญชีแบบทยอย (job "account.delete"): ตั้ง deleted_at ทันทีที่ขอลบ → login / token ใช้ไม่ได้อีก
+-- ข้อมูลถูกลบทีละ chunk ภายหลัง แถว users ถูกลบเป็นอย่างสุดท้าย
+ALTER TABLE "users" ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
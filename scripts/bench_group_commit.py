@@ -0,0 +1,137 @@
+"""
+วัด throughput เทียบกับ latency ที่เพิ่มขึ้นของ group commit (app/group_commit.py)
+
+- แบบเดิม: ทุกรายการเปิด session → ledger.apply_transactions([item]) → commit เอง
+- group commit: ส่งเข้า GroupWriter ที่ window ต่าง ๆ (0 = รวมเฉพาะที่รอคิวอยู่แล้ว ไม่รอเพิ่ม)
+ทั้งสองแบบใช้ pool ขนาด DB_POOL_SIZE เดียวกับแอป และ thread จำนวน --clients ยิงพร้อมกัน (เหมือน threadpool ของ FastAPI)
+รายงาน ops/s, latency p50/p95/p99 ต่อรายการ และขนาดก้อนเฉลี่ย
+
+ต้องมี DB จริงที่ migrate แล้ว (DATABASE_URL) — สร้าง user ชั่วคราวแล้วลบทิ้งตอนจบ
+
+    python scripts/bench_group_commit.py --clients 32 --ops 4000 --windows 0 2 5 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.group_commit import GroupWriter  # noqa: E402
+from app.ledger import apply_transactions  # noqa: E402
+
+USER_TABLES = ("change_log", "tag_month_results", "month_results", "transactions", "tags")
+
+
+def setup() -> tuple[int, int]:
+    name = f"gc{uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        uid = db.execute(
+            text('INSERT INTO "users" (username, password, email) VALUES (:u, :p, :e) RETURNING id'),
+            {"u": name, "p": "x", "e": f"{name}@bench.local"}
+        ).scalar()
+        tag_id = db.execute(
+            text('''INSERT INTO "tags" (user_id, tag, type, value) VALUES (:uid, 'bench', 'expense', 0) RETURNING id'''),
+            {"uid": uid}
+        ).scalar()
+        db.commit()
+    return uid, tag_id
+
+
+def cleanup(uid: int):
+    with SessionLocal() as db:
+        for t in USER_TABLES:
+            db.execute(text(f'DELETE FROM "{t}" WHERE user_id = :uid'), {"uid": uid})
+        db.execute(text('DELETE FROM "users" WHERE id = :uid'), {"uid": uid})
+        db.commit()
+
+
+def _item(uid: int, tag_id: int, i: int) -> dict:
+    return {
+        "user_id": uid, "tag_id": tag_id, "tag_type": "expense", "value": 100 + i % 900,
+        "date": date(2024, 1 + i % 12, 1 + i % 28), "time": datetime.now().time().replace(microsecond=0),
+        "note": "bench",
+    }
+
+
+def _direct(item: dict):
+    with SessionLocal() as db:
+        apply_transactions(db, [item])
+        db.commit()
+
+
+def run(label: str, write, uid: int, tag_id: int, clients: int, ops: int) -> dict:
+    lat: list[float] = []
+    lock = threading.Lock()
+    counter = iter(range(ops))
+
+    def client():
+        mine = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            write(_item(uid, tag_id, i))
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    q = statistics.quantiles(lat, n=100)
+    return {
+        "mode": label,
+        "ops_s": ops / elapsed,
+        "p50_ms": q[49] * 1000,
+        "p95_ms": q[94] * 1000,
+        "p99_ms": q[98] * 1000,
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--clients", type=int, default=32)
+    p.add_argument("--ops", type=int, default=4000)
+    p.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5, 10], help="ms")
+    p.add_argument("--max-batch", type=int, default=64)
+    args = p.parse_args()
+
+    uid, tag_id = setup()
+    rows = []
+    try:
+        rows.append(run("direct", _direct, uid, tag_id, args.clients, args.ops))
+        for w in args.windows:
+            writer = GroupWriter(0, w / 1000.0, args.max_batch)
+            writer.start()
+            r = run(f"group {w:g}ms", lambda it: writer.submit(it).result(), uid, tag_id, args.clients, args.ops)
+            writer.stop()
+            writer.join()
+            r["avg_batch"] = writer.items / writer.batches if writer.batches else 0
+            rows.append(r)
+    finally:
+        cleanup(uid)
+
+    base = rows[0]
+    print(f"clients={args.clients} ops={args.ops} max_batch={args.max_batch}")
+    print(f"{'mode':<14}{'ops/s':>10}{'x':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'batch':>8}")
+    for r in rows:
+        print(f"{r['mode']:<14}{r['ops_s']:>10.0f}{r['ops_s'] / base['ops_s']:>7.2f}"
+              f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r.get('avg_batch', 1):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+จำลองหลาย worker (thread ละ 1 worker มี cache ใน process ของตัวเอง) ใช้ shared cache ร่วมกัน
+
+- วัด hit rate ของแต่ละชั้น, จำนวนครั้งที่ต้องไป "DB", throughput
+- หลังจบ ตรวจว่าทุก worker เห็นค่าล่าสุด (ไม่มี stale หลัง invalidation ส่งถึง)
+- เทียบขนาด payload: msgpack columnar vs JSON ของ dict
+
+ไม่ต้องมี Redis จริง (ใช้ memory:// เป็นค่าเริ่มต้น) หรือชี้ไปที่ RESP stand-in / Redis จริงด้วย --url
+
+    python scripts/bench_shared_cache.py --workers 4 --users 200 --ops 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.cache import app.database ซึ่งสร้าง engine ตอน import (ไม่ได้ต่อ DB จริงใน benchmark นี้)
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/bench")
+
+from app.cache import UserCache  # noqa: E402
+from app.shared_cache import SharedCache, InvalidationListener, connect, encode  # noqa: E402
+
+SCOPES = ("tags", "month_results")
+
+
+class FakeDB:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.version: dict[tuple, int] = {}
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def rows(self, uid: int, scope: str) -> list[dict]:
+        with self._lock:
+            self.loads += 1
+            v = self.version.get((uid, scope), 0)
+        time.sleep(self.latency)
+        if scope == "tags":
+            return [{"id": uid * 10 + i, "user_id": uid, "tag": f"tag{i}", "type": "expense", "value": v * 100 + i}
+                    for i in range(8)]
+        return [{"id": uid * 100 + m, "user_id": uid, "month": m, "year": 2025, "income": v * 1000, "expense": v * 10}
+                for m in range(1, 13)]
+
+    def write(self, uid: int, scopes):
+        with self._lock:
+            for s in scopes:
+                self.version[(uid, s)] = self.version.get((uid, s), 0) + 1
+
+
+class Worker:
+    def __init__(self, wid: str, db: FakeDB, client, ttl: float):
+        self.id = wid
+        self.db = db
+        self.local = UserCache(100_000, ttl)
+        self.shared = SharedCache(client, ttl, prefix=f"bench{os.getpid()}")
+        self.listener = InvalidationListener(client, wid, self.local.invalidate)
+        self.listener.start()
+
+    def read(self, uid: int, scope: str):
+        return self.local.get_or_load(
+            uid, scope, "all",
+            lambda: self.shared.get_or_load(uid, scope, "all", lambda: self.db.rows(uid, scope)),
+        )
+
+    def write(self, uid: int, scopes):
+        self.db.write(uid, scopes)
+        self.local.invalidate(uid, scopes)
+        self.shared.bump(uid, scopes, self.id)
+        self.local.invalidate(uid, scopes)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--url", default="memory://bench")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--ops", type=int, default=20000, help="ต่อ worker")
+    p.add_argument("--write-ratio", type=float, default=0.05)
+    p.add_argument("--db-latency-ms", type=float, default=1.0)
+    p.add_argument("--ttl", type=float, default=300)
+    args = p.parse_args()
+
+    client = connect(args.url)
+    db = FakeDB(args.db_latency_ms / 1000)
+    workers = [Worker(f"w{i}", db, client, args.ttl) for i in range(args.workers)]
+
+    def run(w: Worker, seed: int):
+        rng = random.Random(seed)
+        for _ in range(args.ops):
+            uid = rng.randrange(args.users)
+            if rng.random() < args.write_ratio:
+                w.write(uid, SCOPES if rng.random() < 0.7 else ("tags",))
+            else:
+                w.read(uid, rng.choice(SCOPES))
+
+    threads = [threading.Thread(target=run, args=(w, i)) for i, w in enumerate(workers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    db_loads = db.loads
+
+    time.sleep(1.5)  # รอ invalidation ที่ค้างใน pub/sub
+    stale = 0
+    for w in workers:
+        for uid in range(args.users):
+            for scope in SCOPES:
+                if w.read(uid, scope) != db.rows(uid, scope):
+                    stale += 1
+    for w in workers:
+        w.listener.stop()
+
+    total_ops = args.ops * args.workers
+    local_hits = sum(w.local.hits for w in workers)
+    local_lookups = local_hits + sum(w.local.misses for w in workers)
+    shared_hits = sum(w.shared.hits for w in workers)
+    shared_lookups = shared_hits + sum(w.shared.misses for w in workers)
+    print(f"workers={args.workers} users={args.users} ops={total_ops} write_ratio={args.write_ratio}")
+    print(f"elapsed={elapsed:.2f}s throughput={total_ops / elapsed:.0f} ops/s")
+    print(f"local hit rate  {local_hits / max(local_lookups, 1):.3f}")
+    print(f"shared hit rate {shared_hits / max(shared_lookups, 1):.3f}")
+    print(f"db loads        {db_loads}")
+    print(f"stale entries after settle: {stale}")
+
+    sample = db.rows(1, "month_results")
+    print(f"payload bytes: msgpack-columnar={len(encode(sample))} "
+          f"json-of-dicts={len(json.dumps(sample).encode())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+วัดเวลา cold start ของแอป
+
+- import time: เวลา `import app.main` ใน process ใหม่ (วัดหลายรอบเอา median)
+- ready time: เวลารัน lifespan (warm-up pool) จนพร้อมรับ request
+- first request: latency ของ request แรกที่แตะ DB (POST /auth/login ด้วย user ที่ไม่มีจริง → 401)
+  เทียบกับ request ที่สอง
+
+    python scripts/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_PROBE = """
+import time
+t0 = time.perf_counter()
+import app.main
+print(time.perf_counter() - t0)
+"""
+
+_REQUEST_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app.main
+from fastapi.testclient import TestClient
+t_import = time.perf_counter() - t0
+
+client = TestClient(app.main.app)
+t1 = time.perf_counter()
+client.__enter__()  # รัน lifespan (warm-up)
+t_ready = time.perf_counter() - t1
+
+body = {"username": "__bench_no_such_user__", "password": "x"}
+t2 = time.perf_counter()
+r1 = client.post("/auth/login", json=body)
+t_first = time.perf_counter() - t2
+t3 = time.perf_counter()
+r2 = client.post("/auth/login", json=body)
+t_second = time.perf_counter() - t3
+client.__exit__(None, None, None)
+print(json.dumps({"import": t_import, "ready": t_ready, "first": t_first, "second": t_second,
+                  "status": [r1.status_code, r2.status_code]}))
+"""
+
+
+def _run(code: str, env: dict) -> str:
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def _ms(xs: list[float]) -> str:
+    return f"median={statistics.median(xs) * 1000:.1f}ms min={min(xs) * 1000:.1f}ms max={max(xs) * 1000:.1f}ms"
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--no-warmup", action="store_true", help="ตั้ง DB_WARMUP=false เพื่อเทียบ")
+    p.add_argument("--skip-requests", action="store_true", help="วัดแค่ import time (ไม่ต้องมี DB)")
+    args = p.parse_args()
+
+    env = dict(os.environ)
+    if args.no_warmup:
+        env["DB_WARMUP"] = "false"
+
+    imports = [float(_run(_IMPORT_PROBE, env)) for _ in range(args.runs)]
+    print(f"import app.main      {_ms(imports)}")
+    if args.skip_requests:
+        return
+
+    runs = [json.loads(_run(_REQUEST_PROBE, env)) for _ in range(args.runs)]
+    print(f"lifespan ready       {_ms([r['ready'] for r in runs])}")
+    print(f"first DB request     {_ms([r['first'] for r in runs])}")
+    print(f"second DB request    {_ms([r['second'] for r in runs])}")
+    print(f"statuses             {runs[0]['status']}")
+
+
+if __name__ == "__main__":
+    main()
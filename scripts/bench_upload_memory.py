@@ -0,0 +1,141 @@
+"""
+วัดหน่วยความจำสูงสุดต่อ request ของ POST /ocr/parse (tracemalloc) และตรวจการจำกัดขนาด upload
+
+- end-to-end: ยิง multipart ขนาดต่าง ๆ เข้า ASGI app ตรง ๆ (ส่ง body ทีละ 64 KB เหมือน client จริง)
+  upstream OCR.space ถูกแทนด้วย httpx.MockTransport ที่อ่าน body แบบ stream (ไม่เก็บทั้งก้อน)
+- เปรียบเทียบการสร้าง multipart ไป upstream: bytes ทั้งไฟล์ (แบบเดิม) vs file object ที่พักบนดิสก์ (แบบใหม่)
+- เกิน OCR_MAX_UPLOAD_BYTES → ต้องได้ 413 และหยุดรับ body ก่อนรับครบ
+
+    python scripts/bench_upload_memory.py --sizes-mb 1 4 9
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/bench")  # app.main สร้าง engine ตอน import (ไม่ต่อ DB)
+os.environ.setdefault("OCR_SPACE_API_KEY", "bench")
+os.environ.setdefault("DB_WARMUP", "false")
+
+import httpx  # noqa: E402
+
+CHUNK = 64 * 1024
+BOUNDARY = b"benchboundary"
+OCR_TEXT = "จำนวนเงิน 1,250.00 บาท\n16 ก.ย. 2568 เวลา 12:30"
+
+
+# ----------------- upstream ปลอม -----------------
+async def _upstream(request: httpx.Request) -> httpx.Response:
+    n = 0
+    async for chunk in request.stream:
+        n += len(chunk)
+    return httpx.Response(200, json={"ParsedResults": [{"ParsedText": OCR_TEXT}], "bytes": n})
+
+
+class _MockedAsyncClient(httpx.AsyncClient):
+    def __init__(self, *a, **kw):
+        kw["transport"] = httpx.MockTransport(_upstream)
+        super().__init__(*a, **kw)
+
+
+# ----------------- ASGI client แบบ stream -----------------
+def _multipart_chunks(size: int):
+    yield (b"--" + BOUNDARY + b"\r\nContent-Disposition: form-data; name=\"file\"; filename=\"slip.jpg\"\r\n"
+           b"Content-Type: image/jpeg\r\n\r\n")
+    block = os.urandom(CHUNK)
+    sent = 0
+    while sent < size:
+        n = min(CHUNK, size - sent)
+        yield block[:n]
+        sent += n
+    yield b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+async def _call(app, size: int, send_length: bool) -> tuple[int, int]:
+    """คืน (status, จำนวน byte ที่แอปรับไปก่อนตอบ)"""
+    chunks = _multipart_chunks(size)
+    consumed = 0
+    status = None
+    total = sum(len(c) for c in _multipart_chunks(size)) if send_length else None
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)]
+    if total is not None:
+        headers.append((b"content-length", str(total).encode()))
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/ocr/parse", "raw_path": b"/ocr/parse", "root_path": "",
+             "query_string": b"", "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+
+    async def receive():
+        nonlocal consumed
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        consumed += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status, consumed
+
+
+def _peak(coro_fn) -> tuple[object, int]:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        result = asyncio.run(coro_fn())
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# ----------------- multipart ไป upstream: แบบเดิม vs แบบใหม่ -----------------
+def _upstream_body_peak(size: int, as_file: bool) -> int:
+    with tempfile.TemporaryFile() as f:
+        block = os.urandom(CHUNK)
+        for _ in range(0, size, CHUNK):
+            f.write(block)
+        f.seek(0)
+
+        async def run():
+            content = f if as_file else f.read()
+            req = httpx.Request("POST", "https://upstream.invalid/", files={"file": ("slip.jpg", content, "image/jpeg")})
+            async for _ in req.stream:
+                pass
+
+        return _peak(run)[1]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 9])
+    args = p.parse_args()
+
+    httpx.AsyncClient = _MockedAsyncClient  # ocr_image import httpx ตอนเรียก → ได้ client ที่ชี้ upstream ปลอม
+    from app import config
+    from app.main import app
+
+    mb = 1024 * 1024
+    print(f"OCR_MAX_UPLOAD_BYTES={config.OCR_MAX_UPLOAD_BYTES / mb:.1f} MB  UPLOAD_SPOOL_BYTES={config.UPLOAD_SPOOL_BYTES / mb:.1f} MB")
+    print(f"{'size MB':>8} {'status':>6} {'peak MB (request)':>18} {'upstream bytes-copy':>20} {'upstream file':>14}")
+    for s in args.sizes_mb:
+        size = int(s * mb)
+        (status, _), peak = _peak(lambda: _call(app, size, send_length=True))
+        old = _upstream_body_peak(size, as_file=False)
+        new = _upstream_body_peak(size, as_file=True)
+        print(f"{s:>8.1f} {status:>6} {peak / mb:>18.2f} {old / mb:>20.2f} {new / mb:>14.2f}")
+
+    over = config.OCR_MAX_UPLOAD_BYTES + 4 * mb
+    for send_length in (True, False):
+        status, consumed = asyncio.run(_call(app, over, send_length))
+        label = "with Content-Length" if send_length else "chunked"
+        print(f"oversize {over / mb:.1f} MB {label}: status={status} received={consumed / mb:.2f} MB before reject")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Stress test ความถูกต้องของยอดสะสม (tags.value / month_results) ภายใต้ write พร้อมกัน
+
+ยิง add / update / delete transaction และลบแท็ก พร้อมกันหลายพัน request ต่อชุด user
+ที่สร้างขึ้นใหม่ แล้วคำนวณยอดจาก "transactions" ใหม่ทั้งหมดเทียบกับค่าที่เก็บไว้
+
+ต้องมี server รันอยู่ (uvicorn app.main:app) และ DB ที่ server ใช้ (ควรเป็น DB local)
+
+    python scripts/stress_aggregates.py --users 20 --ops 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import time
+import uuid
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+load_dotenv()
+
+OPS = ("add", "update", "delete", "tag_delete")
+OP_WEIGHTS = (55, 20, 20, 5)
+EPS = 0  # เงินเป็นจำนวนเต็มสตางค์ → ต้องตรงเป๊ะ
+
+
+class User:
+    def __init__(self, uid: int, token: str):
+        self.id = uid
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.tag_ids: dict[str, list[int]] = {"income": [], "expense": []}
+        self.extra_tags: list[int] = []  # แท็กที่ลบได้
+
+
+async def setup_users(client: httpx.AsyncClient, n: int, extra_tags: int) -> list[User]:
+    prefix = f"st{uuid.uuid4().hex[:6]}_"
+    users = []
+    for i in range(n):
+        name = f"{prefix}{i}"
+        password = "stress-password"
+        r = await client.post("/users/add/", json={"username": name, "password": password, "email": f"{name}@stress.local"})
+        r.raise_for_status()
+        uid = r.json()["user_id"]
+        r = await client.post("/auth/login", json={"username": name, "password": password})
+        r.raise_for_status()
+        user = User(uid, r.json()["access_token"])
+        for k in range(extra_tags):
+            ty = "income" if k % 2 == 0 else "expense"
+            r = await client.post("/tags/add/", json={"user_id": uid, "tag": f"stress-{k}", "type": ty}, headers=user.headers)
+            r.raise_for_status()
+        r = await client.get(f"/tags/{uid}", headers=user.headers)
+        r.raise_for_status()
+        for t in r.json():
+            user.tag_ids[t["type"]].append(t["id"])
+            if t["tag"].startswith("stress-"):
+                user.extra_tags.append(t["id"])
+        users.append(user)
+    return users
+
+
+def _random_tx(rng: random.Random, user: User) -> dict:
+    ty = rng.choice(("income", "expense"))
+    return {
+        "user_id": user.id,
+        "tag_id": rng.choice(user.tag_ids[ty]),
+        "value_satang": rng.randint(100, 500_000),
+        "time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+        "date": f"{rng.choice((2024, 2025))}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "note": "stress",
+    }
+
+
+async def _pick_transaction(client: httpx.AsyncClient, rng: random.Random, user: User):
+    r = await client.get(f"/transactions/{user.id}", headers=user.headers)
+    rows = r.json().get("transactions", []) if r.status_code == 200 else []
+    return rng.choice(rows)["id"] if rows else None
+
+
+async def run_op(client: httpx.AsyncClient, rng: random.Random, user: User, op: str) -> str:
+    if op == "add":
+        r = await client.post("/transactions/add/", json=_random_tx(rng, user), headers=user.headers)
+    elif op in ("update", "delete"):
+        tid = await _pick_transaction(client, rng, user)
+        if tid is None:
+            return f"{op}:skip"
+        if op == "update":
+            body = _random_tx(rng, user)
+            body.pop("user_id")
+            r = await client.put(f"/transactions/update/{tid}", json=body, headers=user.headers)
+        else:
+            r = await client.delete(f"/transactions/delete/{tid}", headers=user.headers)
+    else:  # tag_delete
+        if not user.extra_tags:
+            return f"{op}:skip"
+        tid = user.extra_tags.pop(rng.randrange(len(user.extra_tags)))
+        for ids in user.tag_ids.values():
+            if tid in ids:
+                ids.remove(tid)
+        r = await client.delete(f"/tags/delete/{user.id}/{tid}", headers=user.headers)
+    return f"{op}:{r.status_code}"
+
+
+async def fire(client: httpx.AsyncClient, users: list[User], n_ops: int, concurrency: int, seed: int):
+    rng = random.Random(seed)
+    sem = asyncio.Semaphore(concurrency)
+    counts: collections.Counter = collections.Counter()
+
+    async def one():
+        async with sem:
+            user = rng.choice(users)
+            op = rng.choices(OPS, OP_WEIGHTS)[0]
+            try:
+                counts[await run_op(client, rng, user, op)] += 1
+            except httpx.HTTPError as e:
+                counts[f"{op}:{type(e).__name__}"] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_ops)))
+    return counts, time.perf_counter() - t0
+
+
+def verify(dsn: str, user_ids: list[int]) -> tuple[int, int, int]:
+    """คืน (จำนวนแท็กที่ยอดไม่ตรง, จำนวน month bucket ที่ยอดไม่ตรง, จำนวน (แท็ก, เดือน) ที่ยอดไม่ตรง)"""
+    engine = create_engine(dsn)
+    with engine.connect() as conn:
+        bad_tags = conn.execute(text('''
+            SELECT tg.id, tg.value, COALESCE(SUM(t.value), 0) AS expected
+            FROM "tags" tg
+            LEFT JOIN "transactions" t ON t.tag_id = tg.id AND t.user_id = tg.user_id
+            WHERE tg.user_id = ANY(:uids)
+            GROUP BY tg.id, tg.value
+            HAVING ABS(tg.value - COALESCE(SUM(t.value), 0)) > :eps
+        '''), {"uids": user_ids, "eps": EPS}).fetchall()
+
+        bad_months = conn.execute(text('''
+            WITH expected AS (
+                SELECT t.user_id,
+                       EXTRACT(YEAR FROM t.date)::int AS year,
+                       EXTRACT(MONTH FROM t.date)::int AS month,
+                       SUM(CASE WHEN tg.type = 'income' THEN t.value ELSE 0 END) AS income,
+                       SUM(CASE WHEN tg.type = 'expense' THEN t.value ELSE 0 END) AS expense
+                FROM "transactions" t JOIN "tags" tg ON tg.id = t.tag_id
+                WHERE t.user_id = ANY(:uids)
+                GROUP BY 1, 2, 3
+            )
+            SELECT COALESCE(e.user_id, m.user_id), COALESCE(e.year, m.year), COALESCE(e.month, m.month)
+            FROM expected e
+            FULL OUTER JOIN (SELECT * FROM "month_results" WHERE user_id = ANY(:uids)) m
+              ON m.user_id = e.user_id AND m.year = e.year AND m.month = e.month
+            WHERE ABS(COALESCE(m.income, 0) - COALESCE(e.income, 0)) > :eps
+               OR ABS(COALESCE(m.expense, 0) - COALESCE(e.expense, 0)) > :eps
+        '''), {"uids": user_ids, "eps": EPS}).fetchall()
+
+        bad_tag_months = conn.execute(text('''
+            WITH expected AS (
+                SELECT user_id, tag_id,
+                       EXTRACT(YEAR FROM date)::int AS year,
+                       EXTRACT(MONTH FROM date)::int AS month,
+                       SUM(value) AS total, COUNT(*) AS tx_count
+                FROM "transactions"
+                WHERE user_id = ANY(:uids)
+                GROUP BY 1, 2, 3, 4
+            )
+            SELECT COALESCE(e.user_id, m.user_id), COALESCE(e.tag_id, m.tag_id)
+            FROM expected e
+            FULL OUTER JOIN (SELECT * FROM "tag_month_results" WHERE user_id = ANY(:uids)) m
+              ON m.user_id = e.user_id AND m.tag_id = e.tag_id AND m.year = e.year AND m.month = e.month
+            WHERE ABS(COALESCE(m.total, 0) - COALESCE(e.total, 0)) > :eps
+               OR COALESCE(m.tx_count, 0) <> COALESCE(e.tx_count, 0)
+        '''), {"uids": user_ids, "eps": EPS}).fetchall()
+    engine.dispose()
+    return len(bad_tags), len(bad_months), len(bad_tag_months)
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        users = await setup_users(client, args.users, args.extra_tags)
+        counts, elapsed = await fire(client, users, args.ops, args.concurrency, args.seed)
+
+    bad_tags, bad_months, bad_tag_months = verify(args.dsn, [u.id for u in users])
+
+    print(f"users={args.users} ops={args.ops} concurrency={args.concurrency}")
+    print(f"elapsed={elapsed:.2f}s throughput={args.ops / elapsed:.1f} ops/s")
+    for key, n in sorted(counts.items()):
+        print(f"  {key:<24} {n}")
+    print(f"inconsistent tags={bad_tags} inconsistent month_results={bad_months} "
+          f"inconsistent tag_month_results={bad_tag_months}")
+    return 1 if (bad_tags or bad_months or bad_tag_months) else 0
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--base-url", default=os.getenv("STRESS_BASE_URL", "http://127.0.0.1:8000"))
+    p.add_argument("--dsn", default=os.getenv("STRESS_DATABASE_URL") or os.getenv("DATABASE_URL"))
+    p.add_argument("--users", type=int, default=10)
+    p.add_argument("--extra-tags", type=int, default=4)
+    p.add_argument("--ops", type=int, default=2000)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    if not args.dsn:
+        p.error("--dsn or DATABASE_URL is required")
+    raise SystemExit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()